@@ -0,0 +1,263 @@
+""" Offline matches between agents, played in process without spacetime, networking or a tick rate.
+
+The arena drives a BaseEnvironment the same way match_server does: every acting player gets their observation and
+valid actions, invalid actions are replaced by the empty string, and the final rankings come from
+compute_ranking. Games of a tournament are independent, so they are spread over a process pool.
+
+Run `python -m colosseumrl.Arena -h` to measure the throughput of random agents in any environment.
+"""
+
+import argparse
+import multiprocessing as mp
+import random
+import time
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple, Type, Union
+
+import numpy as np
+
+from .BaseEnvironment import BaseEnvironment
+from .config import get_environment, available_environments
+from .rl_logging import get_logger
+
+logger = get_logger()
+
+# Takes the observation and the valid actions of the player to move, returns an action string or integer action
+Agent = Callable[[Dict[str, np.ndarray], List[str]], Union[str, int]]
+
+
+def random_agent(observation: Dict[str, np.ndarray], valid_actions: List[str]) -> str:
+    """ Agent playing uniformly random valid actions. """
+    return random.choice(valid_actions) if len(valid_actions) > 0 else ""
+
+
+class GameResult(NamedTuple):
+    """ Outcome of one game. Every tuple has one entry per player. """
+    seed: int
+    seats: Tuple[int, ...]            # Index of the agent playing as every player
+    rankings: Tuple[int, ...]         # Final ranking of every player, same as compute_ranking
+    rewards: Tuple[float, ...]        # Sum of the rewards of every player
+    invalid_actions: Tuple[int, ...]  # Number of invalid actions of every player, replaced by the empty string
+    winners: Tuple[int, ...]
+    steps: int
+
+
+class Arena:
+    """ Plays games between agents of one environment, spread over a pool of worker processes. """
+
+    def __init__(self, environment: Type[BaseEnvironment], agents: Sequence[Agent], config: str = None,
+                 num_players: int = None, num_workers: int = 1, batch_size: int = 16, rotate_seats: bool = True,
+                 max_steps: int = None, start_method: str = None):
+        """ Set up a tournament.
+
+        Parameters
+        ----------
+        environment : Type[BaseEnvironment]
+            The environment class, every worker creates its own instance.
+        agents : Sequence[Agent]
+            One or more agents. Seats are filled by cycling through the agents.
+            With more than one worker, agents must be picklable, for example functions defined at module level.
+        config : str
+            Config string passed to the environment constructor. None uses the environment's default config.
+        num_players : int
+            Number of players of every game, defaults to the environment's min_players.
+        num_workers : int
+            Number of worker processes, 1 plays every game in the current process.
+        batch_size : int
+            Number of games every worker plays before sending them back.
+        rotate_seats : bool
+            Shift the seat assignment by one for every consecutive seed, so that each agent plays every seat.
+        max_steps : int
+            Optional number of steps after which a game is stopped without winners.
+        start_method : str
+            Multiprocessing start method of the worker pool.
+        """
+        self.environment = environment
+        self.agents = list(agents)
+        self.config = config
+        self.num_players = _create_environment(environment, config).min_players if num_players is None else num_players
+        self.num_workers = num_workers
+        self.batch_size = batch_size
+        self.rotate_seats = rotate_seats
+        self.max_steps = max_steps
+        self.context = mp.get_context(start_method)
+
+        self.results: List[GameResult] = []
+        self.elapsed_time = 0.0
+
+    @property
+    def games_played(self) -> int:
+        return len(self.results)
+
+    @property
+    def games_per_second(self) -> float:
+        return self.games_played / self.elapsed_time if self.elapsed_time > 0 else 0.0
+
+    def run(self, num_games: int, first_seed: int = 0) -> Iterator[GameResult]:
+        """ Plays num_games games, yielding every result as soon as a worker finishes it.
+        Results may arrive out of order, use GameResult.seed to identify games.
+        """
+        seeds = list(range(first_seed, first_seed + num_games))
+        chunks = [seeds[i:i + self.batch_size] for i in range(0, num_games, self.batch_size)]
+        settings = (self.environment, self.config, self.agents, self.num_players, self.rotate_seats, self.max_steps)
+
+        start_time = time.time() - self.elapsed_time
+        if self.num_workers <= 1:
+            _init_worker(*settings)
+            for chunk in chunks:
+                yield from self._record(_play_games_worker(chunk), start_time)
+            return
+
+        with self.context.Pool(self.num_workers, initializer=_init_worker, initargs=settings) as pool:
+            for results in pool.imap_unordered(_play_games_worker, chunks):
+                yield from self._record(results, start_time)
+
+    def _record(self, results: List[GameResult], start_time: float) -> List[GameResult]:
+        self.elapsed_time = time.time() - start_time
+        self.results.extend(results)
+        return results
+
+    def run_all(self, num_games: int, first_seed: int = 0) -> List[GameResult]:
+        """ Plays num_games games and returns their results, sorted by seed. """
+        results = sorted(self.run(num_games, first_seed), key=lambda result: result.seed)
+        logger.info("Played {} games in {:.2f}s ({:.1f} games/sec)".format(
+            len(results), self.elapsed_time, self.games_per_second))
+        return results
+
+    def summary(self) -> List[Dict[str, float]]:
+        """ Statistics of every agent over all games played so far.
+
+        Returns
+        -------
+        List[Dict[str, float]]
+            One dictionary per agent with the number of seats played, wins (ranking 0), mean ranking,
+            mean total reward and number of invalid actions.
+        """
+        summary = []
+        for agent in range(len(self.agents)):
+            seats = [(result, player) for result in self.results for player, seat in enumerate(result.seats)
+                     if seat == agent]
+            summary.append({
+                "seats": len(seats),
+                "wins": sum(result.rankings[player] == 0 for result, player in seats),
+                "mean_ranking": float(np.mean([result.rankings[player] for result, player in seats])) if seats else 0.0,
+                "mean_reward": float(np.mean([result.rewards[player] for result, player in seats])) if seats else 0.0,
+                "invalid_actions": sum(result.invalid_actions[player] for result, player in seats)
+            })
+        return summary
+
+
+def play_game(environment: BaseEnvironment, agents: Sequence[Agent], num_players: int, seed: int = 0,
+              max_steps: int = None) -> Tuple[Dict[int, int], List[float], List[int], List[int], int]:
+    """ Plays one game between agents, agents[i] playing as player i, with the rules of match_server.
+
+    Returns
+    -------
+    rankings : Dict[int, int]
+        Final ranking of every player, from compute_ranking.
+    rewards : List[float]
+        Sum of the rewards of every player.
+    invalid_actions : List[int]
+        Number of invalid actions of every player.
+    winners : List[int]
+        The winners of the game.
+    steps : int
+        Number of steps played.
+    """
+    random.seed(seed)
+    np.random.seed(seed % (2 ** 32))
+
+    state, players = environment.new_state(num_players=num_players)
+    rewards = [0.0] * num_players
+    invalid_actions = [0] * num_players
+    terminal = False
+    winners = None
+    steps = 0
+
+    while not terminal and (max_steps is None or steps < max_steps):
+        actions = []
+        for player in players:
+            observation = environment.state_to_observation(state, player)
+            action = agents[player](observation, environment.valid_actions(state, player))
+
+            # Same as match_server, invalid actions are replaced by the empty string
+            if not (action == '' or environment.is_valid_action(state, player, action)):
+                invalid_actions[player] += 1
+                action = ''
+            actions.append(action)
+
+        acting_players = players
+        state, players, step_rewards, terminal, winners = environment.next_state(state, players, actions)
+        for player, reward in zip(acting_players, step_rewards):
+            rewards[player] += float(reward)
+        steps += 1
+
+    winners = [] if winners is None or not terminal else [int(winner) for winner in winners]
+    rankings = environment.compute_ranking(state, list(range(num_players)), winners)
+    return rankings, rewards, invalid_actions, winners, steps
+
+
+def _create_environment(environment: Type[BaseEnvironment], config: Optional[str]) -> BaseEnvironment:
+    # Environments differ in their default config (None or ""), so it is left to the constructor
+    return environment() if config is None else environment(config)
+
+
+# The environment and agents are sent to every worker once with the pool initializer instead of with every task
+_worker_environment: Optional[BaseEnvironment] = None
+_worker_agents: List[Agent] = []
+_worker_settings: tuple = ()
+
+
+def _init_worker(environment: Type[BaseEnvironment], config: Optional[str], agents: Sequence[Agent], num_players: int,
+                 rotate_seats: bool, max_steps: Optional[int]):
+    global _worker_environment, _worker_agents, _worker_settings
+    _worker_environment = _create_environment(environment, config)
+    _worker_agents = list(agents)
+    _worker_settings = (num_players, rotate_seats, max_steps)
+
+
+def _play_games_worker(seeds: Sequence[int]) -> List[GameResult]:
+    num_players, rotate_seats, max_steps = _worker_settings
+
+    results = []
+    for seed in seeds:
+        rotation = seed if rotate_seats else 0
+        seats = tuple((player + rotation) % len(_worker_agents) for player in range(num_players))
+
+        rankings, rewards, invalid_actions, winners, steps = play_game(
+            _worker_environment, [_worker_agents[seat] for seat in seats], num_players, seed, max_steps)
+
+        results.append(GameResult(seed=seed,
+                                  seats=seats,
+                                  rankings=tuple(rankings[player] for player in range(num_players)),
+                                  rewards=tuple(rewards),
+                                  invalid_actions=tuple(invalid_actions),
+                                  winners=tuple(winners),
+                                  steps=steps))
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter, description="""
+    Play games between random agents in process and report the throughput.
+    """)
+    parser.add_argument("--environment", '-e', type=str, default='tictactoe',
+                        help="The name of the environment. Choices are: {}".format(available_environments()))
+    parser.add_argument("--config", '-c', type=str, default="",
+                        help="Config string that will be passed into the environment constructor. "
+                             "Leave it empty for the environment's default config.")
+    parser.add_argument("--games", '-g', type=int, default=1000,
+                        help="Number of games to play.")
+    parser.add_argument("--workers", '-w', type=int, default=mp.cpu_count(),
+                        help="Number of worker processes.")
+    parser.add_argument("--batch-size", '-b', type=int, default=16,
+                        help="Number of games every worker plays before sending them back.")
+
+    args = parser.parse_args()
+
+    arena = Arena(get_environment(args.environment), [random_agent], args.config if args.config else None,
+                  num_workers=args.workers, batch_size=args.batch_size)
+    results = arena.run_all(args.games)
+
+    steps = sum(result.steps for result in results)
+    print("Played {} games ({} steps) in {:.2f}s: {:.1f} games/sec, {:.1f} steps/sec".format(
+        len(results), steps, arena.elapsed_time, arena.games_per_second, steps / max(arena.elapsed_time, 1e-9)))
@@ -3,6 +3,8 @@ this to have all of the correct functions. """
 
 import numpy as np
 
+from copy import deepcopy
+
 from abc import ABC, abstractmethod
 from typing import Tuple, List, Union, Dict
 
@@ -52,7 +54,8 @@ class BaseEnvironment(ABC):
     def observation_names() -> List[str]:
         """ Static method for returning the names of the observation objects.
 
-        This needs to be static to setup spacetime dataframes.
+        This is usually static. Environments whose observations depend on their config may override it with an
+        instance method, so the servers read it from an environment instance.
 
         Returns
         -------
@@ -232,6 +235,94 @@ class BaseEnvironment(ABC):
         """
         raise NotImplementedError
 
+    def state_hash(self, state: object) -> Union[int, None]:
+        """ OPTIONAL Hash of a game state, equal for states with the same valid actions for every player.
+
+        Used as a cache key for move generation and as a transposition key by search agents, see CachedEnvironment.
+        Grid games use Zobrist hashing, see colosseumrl.zobrist.
+
+        Parameters
+        ----------
+        state : object
+            The current state of the game.
+
+        Returns
+        -------
+        Union[int, None]
+            The hash of the state, or None if this environment does not hash its states.
+        """
+        return None
+
+    # Discrete Action Methods
+    # Environments with a fixed, finite set of actions can number them 0, 1, ..., action_space_size - 1.
+    # Such environments accept these integers anywhere an action string is accepted (next_state, is_valid_action),
+    # so agents and servers can skip formatting and parsing action strings.
+    @property
+    def action_space_size(self) -> Union[int, None]:
+        """ OPTIONAL Number of discrete actions of the game.
+
+        Returns
+        -------
+        Union[int, None]
+            The number of integer actions, or None if this environment does not support integer actions.
+        """
+        return None
+
+    def action_to_index(self, action: Union[str, int]) -> int:
+        """ OPTIONAL Convert an action string into its integer action. Integer actions are returned unchanged.
+
+        Parameters
+        ----------
+        action : Union[str, int]
+            The action string or integer action.
+
+        Returns
+        -------
+        int
+            The integer action, in [0, action_space_size).
+        """
+        raise NotImplementedError("{} does not support integer actions.".format(type(self).__name__))
+
+    def index_to_action(self, index: int) -> str:
+        """ OPTIONAL Convert an integer action into its action string.
+
+        Parameters
+        ----------
+        index : int
+            The integer action, in [0, action_space_size).
+
+        Returns
+        -------
+        str
+            The action string.
+        """
+        raise NotImplementedError("{} does not support integer actions.".format(type(self).__name__))
+
+    def legal_action_mask(self, state: object, player: int) -> np.ndarray:
+        """ OPTIONAL Valid actions for a specific state, as a mask over the integer actions.
+
+        The default implementation converts valid_actions with action_to_index.
+
+        Parameters
+        ----------
+        state : object
+            The current state of the game.
+        player : int
+            The player who is executing this action.
+
+        Returns
+        -------
+        np.ndarray
+            (action_space_size,) bool, True for every valid integer action.
+        """
+        if self.action_space_size is None:
+            raise NotImplementedError("{} does not support integer actions.".format(type(self).__name__))
+
+        mask = np.zeros(self.action_space_size, np.bool_)
+        indices = [self.action_to_index(action) for action in self.valid_actions(state, player) if action != ""]
+        mask[indices] = True
+        return mask
+
     @abstractmethod
     def state_to_observation(self, state: object, player: int) -> Dict[str, np.ndarray]:
         """ Convert the raw game state to the observation for the agent. Maps each observation name into an observation.
@@ -239,6 +330,224 @@ class BaseEnvironment(ABC):
         This can return different values for the different players. Default implementation is just the identity."""
         raise NotImplementedError
 
+    def write_observation(self, state: object, player: int, buffers: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """ OPTIONAL Write the observation for the agent into caller owned arrays instead of allocating new ones.
+
+        Training loops can pass views into their rollout storage, so the observation is written straight where it
+        is kept. The default implementation copies the result of state_to_observation, environments override it to
+        skip the intermediate arrays.
+
+        Parameters
+        ----------
+        state : object
+            The current state of the game.
+        player : int
+            Which player is getting the observation.
+        buffers : Dict[str, np.ndarray]
+            An array of shape observation_shape[name] for every observation name, see observation_buffers.
+            Values are cast to the dtype of the arrays.
+
+        Returns
+        -------
+        Dict[str, np.ndarray]
+            The buffers, filled with the observation.
+        """
+        for name, value in self.state_to_observation(state, player).items():
+            buffers[name][...] = value
+        return buffers
+
+    def observation_buffers(self, batch_shape: Tuple[int, ...] = (), dtype: np.dtype = np.float32) \
+            -> Dict[str, np.ndarray]:
+        """ Allocate arrays that write_observation can fill, one per observation name.
+
+        Parameters
+        ----------
+        batch_shape : Tuple[int, ...]
+            Leading dimensions added before every observation shape, for example (steps, batch_size) for a rollout.
+            Index the leading dimensions to get the buffers of a single observation.
+        dtype : np.dtype
+            Data type of every array.
+
+        Returns
+        -------
+        Dict[str, np.ndarray]
+            Zero-filled arrays of shape batch_shape + observation_shape[name].
+        """
+        return {name: np.zeros(tuple(batch_shape) + tuple(shape), dtype)
+                for name, shape in self.observation_shape.items()}
+
+    # Batch Methods
+    # Environments can override these with vectorized versions that step many games at once.
+    # The default implementations loop over the single game methods: the batched state is a list of states,
+    # the batched players a list of player lists, and actions a list of action lists.
+    def new_state_batch(self, batch_size: int, num_players: int = None) -> Tuple[object, object]:
+        """ OPTIONAL Create several fresh states at once.
+
+        Parameters
+        ----------
+        batch_size : int
+            Number of games B.
+        num_players : int
+            Total number of players in every game.
+
+        Returns
+        -------
+        new_state : object
+            The batched initial state of the B games.
+        new_players : object
+            The players who's turn it is in every game.
+        """
+        states, players = [], []
+        for _ in range(batch_size):
+            state, new_players = self.new_state(num_players)
+            states.append(state)
+            players.append(new_players)
+        return states, players
+
+    def next_state_batch(self, state: object, players: object, actions: object) \
+            -> Tuple[object, object, object, np.ndarray, object]:
+        """ OPTIONAL Compute a single step in several games at once, same rules as next_state.
+
+        Parameters
+        ----------
+        state : object
+            The batched state of the games.
+        players : object
+            The players which are taking the given actions in every game.
+        actions : object
+            The actions of each player in every game.
+
+        Returns
+        -------
+        new_state : object
+            The batched new state of the games.
+        new_players: object
+            The players who's turn it is in every game now.
+        rewards : object
+            The reward for each player that acted in every game.
+        terminal : np.ndarray
+            (B,) whether or not every game has ended.
+        winners: object
+            The winners of every game that has ended.
+        """
+        new_states, new_players, rewards, terminal, winners = [], [], [], [], []
+        for game_state, game_players, game_actions in zip(state, players, actions):
+            step = self.next_state(game_state, game_players, game_actions)
+            for output, value in zip((new_states, new_players, rewards, terminal, winners), step):
+                output.append(value)
+        return new_states, new_players, rewards, np.array(terminal, np.bool_), winners
+
+    def reset_state_batch(self, state: object, players: object, mask: np.ndarray, num_players: int = None) \
+            -> Tuple[object, object]:
+        """ OPTIONAL Replace some games of a batch with fresh ones.
+
+        Parameters
+        ----------
+        state : object
+            The batched state of the games.
+        players : object
+            The players who's turn it is in every game.
+        mask : np.ndarray
+            (B,) bool, True for the games to restart.
+        num_players : int
+            Total number of players in every game.
+
+        Returns
+        -------
+        new_state : object
+            The batched state, with new games where mask is True.
+        new_players : object
+            The players who's turn it is in every game.
+        """
+        state, players = list(state), list(players)
+        for game in np.flatnonzero(mask):
+            state[game], players[game] = self.new_state(num_players)
+        return state, players
+
+    def state_to_observation_batch(self, state: object, players: object) -> Dict[str, np.ndarray]:
+        """ OPTIONAL Observations of several games at once, same as state_to_observation.
+
+        Parameters
+        ----------
+        state : object
+            The batched state of the games.
+        players : object
+            (B,) the observing player of every game.
+
+        Returns
+        -------
+        Dict[str, np.ndarray]
+            Every observation stacked along a new leading batch dimension.
+        """
+        state, players = list(state), list(players)
+
+        # The first observation gives the dtype of every array, the others are written in place
+        first = self.state_to_observation(state[0], players[0])
+        batch = {name: np.empty((len(players),) + np.shape(value), np.asarray(value).dtype)
+                 for name, value in first.items()}
+
+        for game, (game_state, player) in enumerate(zip(state, players)):
+            self.write_observation(game_state, player, {name: array[game] for name, array in batch.items()})
+        return batch
+
+    # Search Methods
+    # Tree search (see colosseumrl.MCTS) only needs next_state and valid_actions, which copy the state on every step.
+    # Environments with mutable states can override make_move and unmake_move to step and revert a state in place.
+    def clone_state(self, state: object) -> object:
+        """ OPTIONAL Independent copy of a state, that make_move can modify without changing the original.
+
+        Parameters
+        ----------
+        state : object
+            The state to copy.
+
+        Returns
+        -------
+        object
+            The copy.
+        """
+        return deepcopy(state)
+
+    def make_move(self, state: object, players: [int], actions: [str]) \
+            -> Tuple[List[int], List[float], bool, Union[List[int], None], object]:
+        """ OPTIONAL Same as next_state, but modifies the state in place instead of returning a new one.
+
+        Parameters
+        ----------
+        state : object
+            The state to modify.
+        players: [int]
+            The players which are taking the given actions.
+        actions : [str]
+            The actions of each player.
+
+        Returns
+        -------
+        new_players: List[int]
+            List of players who's turn it is in the new state now.
+        rewards : List[float]
+            The reward for each player that acted.
+        terminal : bool
+            Whether or not the game has ended.
+        winners: List[int]
+            If the game has ended, who are the winners.
+        undo : object
+            Everything unmake_move needs to revert this step.
+        """
+        raise NotImplementedError
+
+    def unmake_move(self, state: object, undo: object):
+        """ OPTIONAL Revert the last make_move applied to a state.
+
+        Parameters
+        ----------
+        state : object
+            The state to modify.
+        undo : object
+            The undo information returned by make_move.
+        """
+        raise NotImplementedError
+
     # Serialization Methods
     @staticmethod
     def serializable() -> bool:
@@ -270,6 +579,8 @@ class BaseEnvironment(ABC):
     def deserialize_state(serialized_state: bytearray) -> object:
         """ Convert a serialized bytearray back into a game state.
 
+        The returned state is independent of read-only input such as bytes, so it can be modified with make_move.
+
         Parameters
         ----------
         serialized_state : bytearray
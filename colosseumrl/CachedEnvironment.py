@@ -0,0 +1,148 @@
+""" Opt-in caching of move generation, for environments where valid_actions is expensive.
+
+The same positions are asked for their valid actions many times: by the server checking every move, by clients and
+by search agents reaching a position through different move orders. CachedEnvironment wraps any environment that
+implements BaseEnvironment.state_hash, and remembers the results of valid_actions, legal_action_mask and
+is_valid_action for the most recently used (state hash, player) pairs.
+"""
+
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, List, Union
+
+import numpy as np
+
+from .BaseEnvironment import BaseEnvironment
+
+
+class LRUCache:
+    """ Bounded mapping that evicts the least recently used entry, with hit and miss counters. """
+
+    def __init__(self, max_size: int = 4096):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def get(self, key: Hashable, compute: Callable[[], object]) -> object:
+        """ The value stored for key, computed with compute() and stored if it is missing. """
+        try:
+            value = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            value = self._entries[key] = compute()
+            if len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            return value
+
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return value
+
+    def peek(self, key: Hashable, default: object = None) -> object:
+        """ The value stored for key, without counting a hit or a miss or changing the eviction order. """
+        return self._entries.get(key, default)
+
+    @property
+    def hit_rate(self) -> float:
+        """ Fraction of lookups that were found in the cache, 0 before the first lookup. """
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups > 0 else 0.0
+
+    def clear(self):
+        """ Remove every entry and reset the counters. """
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+class CachedEnvironment:
+    """ Wrapper around an environment that caches valid_actions, legal_action_mask and is_valid_action.
+
+    Every other attribute is forwarded to the wrapped environment, so the wrapper can be used in place of it.
+    States for which the environment's state_hash returns None are never cached.
+    """
+
+    def __init__(self, environment: BaseEnvironment, max_size: int = 4096):
+        """ Wrap an environment.
+
+        Parameters
+        ----------
+        environment : BaseEnvironment
+            The environment to cache.
+        max_size : int
+            Maximum number of (state hash, player) entries kept by each cache.
+        """
+        self.environment = environment
+        self.valid_actions_cache = LRUCache(max_size)
+        self.legal_action_mask_cache = LRUCache(max_size)
+        self.is_valid_action_cache = LRUCache(max_size)
+
+    def __getattr__(self, name: str):
+        if name == "environment":
+            raise AttributeError(name)
+        return getattr(self.environment, name)
+
+    def valid_actions(self, state: object, player: int) -> List[str]:
+        state_hash = self.environment.state_hash(state)
+        if state_hash is None:
+            return self.environment.valid_actions(state, player)
+
+        # Stored as the keys of a dict, which keeps their order and makes is_valid_action a single lookup
+        valid_actions = self.valid_actions_cache.get(
+            (state_hash, player), lambda: dict.fromkeys(self.environment.valid_actions(state, player)))
+        return list(valid_actions)
+
+    def legal_action_mask(self, state: object, player: int) -> np.ndarray:
+        """ Same as the environment's legal_action_mask. The returned array is shared, copy it before modifying it. """
+        state_hash = self.environment.state_hash(state)
+        if state_hash is None:
+            return self.environment.legal_action_mask(state, player)
+
+        mask = self.legal_action_mask_cache.get(
+            (state_hash, player), lambda: self.environment.legal_action_mask(state, player).copy())
+        mask.flags.writeable = False
+        return mask
+
+    def is_valid_action(self, state: object, player: int, action: Union[str, int]) -> bool:
+        """ Answered from the cached valid actions or legal action mask of the state when they are known,
+        otherwise from a cache of single action checks. """
+        state_hash = self.environment.state_hash(state)
+        if state_hash is None:
+            return self.environment.is_valid_action(state, player, action)
+
+        key = (state_hash, player)
+        if isinstance(action, (int, np.integer)):
+            mask = self.legal_action_mask_cache.peek(key)
+            if mask is not None:
+                self.is_valid_action_cache.hits += 1
+                return 0 <= action < len(mask) and bool(mask[action])
+        else:
+            # Actions listed by valid_actions are valid, other spellings are checked by the environment
+            valid_actions = self.valid_actions_cache.peek(key)
+            if valid_actions is not None and action != "" and action in valid_actions:
+                self.is_valid_action_cache.hits += 1
+                return True
+
+        return self.is_valid_action_cache.get(
+            key + (action,), lambda: bool(self.environment.is_valid_action(state, player, action)))
+
+    def cache_info(self) -> Dict[str, Dict[str, float]]:
+        """ Size, hits, misses and hit rate of every cache. """
+        caches = {"valid_actions": self.valid_actions_cache,
+                  "legal_action_mask": self.legal_action_mask_cache,
+                  "is_valid_action": self.is_valid_action_cache}
+
+        return {name: {"size": len(cache), "hits": cache.hits, "misses": cache.misses, "hit_rate": cache.hit_rate}
+                for name, cache in caches.items()}
+
+    def clear_cache(self):
+        """ Empty every cache and reset the counters. """
+        self.valid_actions_cache.clear()
+        self.legal_action_mask_cache.clear()
+        self.is_valid_action_cache.clear()
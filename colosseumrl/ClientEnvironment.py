@@ -1,12 +1,13 @@
 import dill
 import numpy as np
 
-from typing import List, Type, Optional, Dict, Tuple
+from typing import List, Type, Optional, Dict, Tuple, Union
 from spacetime import Dataframe
 
 from .data_model import Observation, ServerState, Player
 from .FrameRateKeeper import FrameRateKeeper
 from .BaseEnvironment import BaseEnvironment
+from .CachedEnvironment import LRUCache
 
 import logging
 logger = logging.getLogger(__name__)
@@ -24,7 +25,8 @@ class ClientEnvironment:
                  observation_class: Type[Observation],
                  host: str,
                  server_environment: Optional[Type[BaseEnvironment]] = None,
-                 auth_key: str = ''):
+                 auth_key: str = '',
+                 action_cache_size: int = 0):
         """ The primary class for interacting with the environment as a remote client.
 
         Parameters
@@ -41,6 +43,9 @@ class ClientEnvironment:
             The full server environment if we have access to it.
         auth_key : str
             Your authorization key for entering the game if the server has a whitelist.
+        action_cache_size : int
+            Number of server states for which valid_actions is cached, 0 disables the cache.
+            A cached state is neither deserialized nor searched for moves again.
         """
 
         self.player_df: Dataframe = dataframe
@@ -63,6 +68,8 @@ class ClientEnvironment:
         if server_environment is not None:
             self._server_environment = server_environment(self._server_state.env_config)
 
+        self.valid_actions_cache: Optional[LRUCache] = LRUCache(action_cache_size) if action_cache_size > 0 else None
+
         self.fr: FrameRateKeeper = FrameRateKeeper(self._TickRate)
         self.connected: bool = False
 
@@ -324,19 +331,44 @@ class ClientEnvironment:
         -------
         moves: list[str]
         """
-        if self._server_environment is not None:
+        if self._server_environment is not None and self.valid_actions_cache is not None:
+            # Keyed by the serialized state, so that a hit skips deserializing it
+            self.check_connection()
+            key = (hash(bytes(self._server_state.serialized_state)), self._player.number)
+            return list(self.valid_actions_cache.get(
+                key, lambda: self._server_environment.valid_actions(self.full_state, self._player.number)))
+        elif self._server_environment is not None:
             return self._server_environment.valid_actions(self.full_state, self._player.number)
         else:
             raise NotImplementedError("No valid_action is implemented in this client and "
                                       "we do not have access to the full server environment")
 
-    def step(self, action: str) -> Tuple[Dict[str, np.ndarray], float, bool, Optional[List[int]]]:
+    def legal_action_mask(self) -> np.ndarray:
+        """ Get a mask of all valid integer actions for the current state.
+
+        Raises
+        ------
+        NotImplementedError
+            If we do not have access to the full server environment, or it does not support integer actions.
+
+        Returns
+        -------
+        mask: np.ndarray
+            (action_space_size,) bool, True for every valid integer action.
+        """
+        if self._server_environment is not None:
+            return self._server_environment.legal_action_mask(self.full_state, self._player.number)
+        else:
+            raise NotImplementedError("No legal_action_mask is implemented in this client and "
+                                      "we do not have access to the full server environment")
+
+    def step(self, action: Union[str, int]) -> Tuple[Dict[str, np.ndarray], float, bool, Optional[List[int]]]:
         """ Perform an action and send it to the server. This wil block until it is your turn again.
 
         Parameters
         ----------
-        action: str
-            Your action string.
+        action: Union[str, int]
+            Your action string, or your integer action if the environment supports integer actions.
 
         Returns
         -------
@@ -351,7 +383,12 @@ class ClientEnvironment:
             If terminal is false, this will be None
         """
         if not self.terminal:
-            self._player.action = action
+            if isinstance(action, (int, np.integer)):
+                self._player.action = ""
+                self._player.action_index = int(action)
+            else:
+                self._player.action = action
+                self._player.action_index = -1
             self._player.ready_for_action_to_be_taken = True
             self.push_dataframe()
 
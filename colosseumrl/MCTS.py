@@ -0,0 +1,511 @@
+""" Monte Carlo tree search for any turn based BaseEnvironment.
+
+The search only uses next_state and valid_actions, so it works with every environment where one player acts at a
+time. Environments that implement BaseEnvironment.make_move and unmake_move are searched in place instead: the tree
+stores actions only, and a single working state is stepped down to every leaf and reverted on the way back.
+
+Every iteration selects a leaf with UCT, evaluates it and adds the values of every player along the path. Leaves are
+selected in batches: every selected path gets a virtual loss until its value arrives, which steers the rest of the
+batch towards other leaves. A batch is then evaluated at once, either by random rollouts spread over a process pool
+or by a user supplied evaluator, for example a neural network. Without either, leaves are rolled out one at a time
+in the current process.
+
+Values are from the perspective of every player: 1 for a win, 0 for a loss and 0.5 for a draw or a rollout that
+hit the depth limit. The tree is kept between moves, see MCTS.search and MCTS.advance.
+"""
+
+import multiprocessing as mp
+import random
+from math import log, sqrt
+from time import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from .BaseEnvironment import BaseEnvironment
+
+# match_server gives every player 5 seconds per move (Timeout.move), this leaves a margin for the network round trip
+DEFAULT_TIME_LIMIT = 4.0
+
+# Takes a list of K states and the list of the K players to move in them, returns (K, num_players) values
+Evaluator = Callable[[List[object], List[int]], np.ndarray]
+
+
+def terminal_values(winners: Union[Sequence[int], None], num_players: int) -> np.ndarray:
+    """ Value of a finished game for every player: 1 for the winners and 0 for everyone else, 0.5 for a draw. """
+    if winners is None or len(winners) == 0:
+        return np.full(num_players, 0.5)
+
+    values = np.zeros(num_players)
+    values[list(winners)] = 1.0
+    return values
+
+
+def random_action(environment: BaseEnvironment, state: object, player: int, rng: random.Random) -> Union[str, int]:
+    """ Uniformly random valid action, an integer action when the environment supports them. """
+    if environment.action_space_size is not None:
+        legal_actions = np.flatnonzero(environment.legal_action_mask(state, player))
+        if len(legal_actions) > 0:
+            return int(legal_actions[rng.randrange(len(legal_actions))])
+
+    valid_actions = environment.valid_actions(state, player)
+    return valid_actions[rng.randrange(len(valid_actions))] if len(valid_actions) > 0 else ""
+
+
+def rollout(environment: BaseEnvironment, state: object, players: Sequence[int], num_players: int,
+            rng: random.Random, max_depth: int = 1000, in_place: bool = False) -> np.ndarray:
+    """ Play uniformly random moves from a state until the game ends.
+
+    Parameters
+    ----------
+    environment : BaseEnvironment
+        The environment of the game.
+    state : object
+        The state to start from. It is left unchanged.
+    players : Sequence[int]
+        The players to move in state.
+    num_players : int
+        Total number of players.
+    rng : random.Random
+        Source of the random moves.
+    max_depth : int
+        Number of moves after which the game is stopped and counted as a draw.
+    in_place : bool
+        Step the state with make_move and revert it with unmake_move instead of copying it with next_state.
+
+    Returns
+    -------
+    np.ndarray
+        (num_players,) the value of the game for every player.
+    """
+    undos = []
+    values = None
+    for _ in range(max_depth):
+        action = random_action(environment, state, players[0], rng)
+        if in_place:
+            players, rewards, terminal, winners, undo = environment.make_move(state, players, [action])
+            undos.append(undo)
+        else:
+            state, players, rewards, terminal, winners = environment.next_state(state, players, [action])
+
+        if terminal:
+            values = terminal_values(winners, num_players)
+            break
+
+    for undo in reversed(undos):
+        environment.unmake_move(state, undo)
+
+    return np.full(num_players, 0.5) if values is None else values
+
+
+class Node:
+    """ A position in the search tree, reached from its parent by playing action. """
+    __slots__ = ["parent", "action", "state", "players", "terminal", "values", "hash", "children", "untried",
+                 "visits", "virtual_visits", "value_sums"]
+
+    def __init__(self, parent: Optional["Node"], action: Union[str, int], state: object, players: Sequence[int],
+                 terminal: bool, winners: Union[Sequence[int], None], num_players: int):
+        self.parent = parent
+        self.action = action
+
+        # None when searching in place, only the root then holds its state
+        self.state = state
+        self.players = players
+        self.terminal = terminal
+        self.values = terminal_values(winners, num_players) if terminal else None
+        self.hash = None
+
+        self.children: List[Node] = []
+        self.untried: List[Union[str, int]] = []
+
+        self.visits = 0
+        self.virtual_visits = 0.0
+        self.value_sums = [0.0] * num_players
+
+    @property
+    def player(self) -> int:
+        """ The player to move. """
+        return self.players[0]
+
+    def mean_values(self) -> np.ndarray:
+        """ Average value of every player over the visits of this node. """
+        return np.array(self.value_sums) / max(self.visits, 1)
+
+
+# Rollout workers get the environment and settings once, with the pool initializer
+_worker_environment: Optional[BaseEnvironment] = None
+_worker_settings: tuple = ()
+
+
+def _init_worker(environment: BaseEnvironment, num_players: int, rollouts_per_leaf: int, max_depth: int,
+                 in_place: bool):
+    global _worker_environment, _worker_settings
+    _worker_environment = environment
+    _worker_settings = (num_players, rollouts_per_leaf, max_depth, in_place)
+
+
+def _rollout_worker(task: tuple) -> np.ndarray:
+    payload, players, seed = task
+    num_players, rollouts_per_leaf, max_depth, in_place = _worker_settings
+
+    state = payload
+    if _worker_environment.serializable():
+        state = _worker_environment.deserialize_state(payload)
+    if in_place:
+        state = _worker_environment.clone_state(state)
+
+    rng = random.Random(seed)
+    values = [rollout(_worker_environment, state, players, num_players, rng, max_depth, in_place)
+              for _ in range(rollouts_per_leaf)]
+    return np.mean(values, axis=0)
+
+
+class MCTS:
+    """ UCT search with batched, virtual loss leaf selection and tree reuse between moves. """
+
+    def __init__(self, environment: BaseEnvironment,
+                 num_players: int = None,
+                 exploration: float = sqrt(2),
+                 evaluator: Evaluator = None,
+                 batch_size: int = 16,
+                 virtual_loss: float = 1.0,
+                 rollouts_per_leaf: int = 1,
+                 max_rollout_depth: int = 1000,
+                 num_workers: int = 1,
+                 reuse_depth: int = None,
+                 seed: int = None,
+                 start_method: str = None):
+        """ Create a search engine for an environment.
+
+        Parameters
+        ----------
+        environment : BaseEnvironment
+            The environment to search. One player must act at a time.
+        num_players : int
+            Total number of players, defaults to environment.max_players.
+        exploration : float
+            UCT exploration constant.
+        evaluator : Evaluator
+            Optional callable that evaluates a batch of leaves instead of rollouts.
+            It takes a list of K states and the list of the players to move in them,
+            and returns a (K, num_players) array of values between 0 and 1.
+        batch_size : int
+            Number of leaves selected with virtual loss before the evaluator or the rollout workers are called.
+            Leaves rolled out in the current process are evaluated one at a time.
+        virtual_loss : float
+            Number of lost visits temporarily added to every node of a selected path, must be positive.
+        rollouts_per_leaf : int
+            Number of random rollouts averaged for every leaf, when there is no evaluator.
+        max_rollout_depth : int
+            Number of moves after which a rollout counts as a draw.
+        num_workers : int
+            Number of worker processes for the rollouts. 1 rolls out in the current process.
+        reuse_depth : int
+            How many moves below the previous root search looks for the new position, to keep its subtree.
+            Defaults to num_players, a whole round. Positions are matched by BaseEnvironment.state_hash,
+            environments without state hashes only reuse the tree through advance.
+        seed : int
+            Seed of the random rollouts and of the move ordering.
+        start_method : str
+            Multiprocessing start method of the worker pool.
+        """
+        if virtual_loss <= 0:
+            raise ValueError("virtual_loss must be positive, got {}".format(virtual_loss))
+
+        self.environment = environment
+        self.num_players = environment.max_players if num_players is None else num_players
+        self.exploration = exploration
+        self.evaluator = evaluator
+        self.batch_size = batch_size
+        self.virtual_loss = virtual_loss
+        self.rollouts_per_leaf = rollouts_per_leaf
+        self.max_rollout_depth = max_rollout_depth
+        self.num_workers = num_workers
+        self.reuse_depth = self.num_players if reuse_depth is None else reuse_depth
+        self.rng = random.Random(seed)
+        self.context = mp.get_context(start_method)
+
+        environment_class = type(environment)
+        self.in_place = (environment_class.make_move is not BaseEnvironment.make_move and
+                         environment_class.unmake_move is not BaseEnvironment.unmake_move)
+
+        self.root: Optional[Node] = None
+        self.simulations = 0
+
+        self._working_state = None
+        self._hashed = False
+        self._pool = None
+
+    # Pool management
+    # -----------------------------------------------
+    def __enter__(self) -> "MCTS":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """ Stop the rollout workers. """
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+
+    @property
+    def pool(self):
+        """ The rollout worker pool, None when rolling out in the current process. Started on first use. """
+        if self.num_workers <= 1 or self.evaluator is not None:
+            return None
+
+        if self._pool is None:
+            self._pool = self.context.Pool(self.num_workers, initializer=_init_worker,
+                                           initargs=(self.environment, self.num_players, self.rollouts_per_leaf,
+                                                     self.max_rollout_depth, self.in_place))
+        return self._pool
+
+    # Tree management
+    # -----------------------------------------------
+    def _actions(self, state: object, player: int) -> List[Union[str, int]]:
+        actions = list(self.environment.valid_actions(state, player))
+        self.rng.shuffle(actions)
+        return actions
+
+    def _new_root(self, state: object, players: Sequence[int]):
+        self.root = Node(None, None, state, players, False, None, self.num_players)
+        self.root.untried = self._actions(state, players[0])
+        self.root.hash = self.environment.state_hash(state)
+        self._hashed = self.root.hash is not None
+
+    def _set_root(self, node: Node, state: object):
+        node.parent = None
+        node.state = state
+        self.root = node
+
+    def _find(self, state_hash: int, player: int) -> Optional[Node]:
+        """ The node of a position below the current root, looking reuse_depth moves deep. """
+        level = [self.root]
+        for _ in range(self.reuse_depth + 1):
+            for node in level:
+                if node.hash == state_hash and not node.terminal and node.player == player:
+                    return node
+            level = [child for node in level for child in node.children]
+        return None
+
+    def set_position(self, state: object, player: int):
+        """ Make a position the root of the search, keeping its subtree if it is already in the tree.
+
+        Parameters
+        ----------
+        state : object
+            The state to search from.
+        player : int
+            The player to move.
+        """
+        node = None
+        if self.root is not None and self._hashed:
+            node = self._find(self.environment.state_hash(state), player)
+
+        if node is None:
+            self._new_root(state, [player])
+        else:
+            self._set_root(node, state)
+
+        if self.in_place:
+            self._working_state = self.environment.clone_state(state)
+
+    def advance(self, action: Union[str, int]):
+        """ Play an action from the root, keeping the subtree of the new position.
+
+        Parameters
+        ----------
+        action : Union[str, int]
+            The action of the player to move at the root.
+        """
+        root = self.root
+        state, players, rewards, terminal, winners = self.environment.next_state(root.state, root.players, [action])
+
+        child = next((child for child in root.children if child.action == action), None)
+        if terminal:
+            self.root = Node(None, action, state, players, terminal, winners, self.num_players)
+        elif child is None:
+            self._new_root(state, players)
+        else:
+            self._set_root(child, state)
+
+        if self.in_place:
+            self._working_state = self.environment.clone_state(state)
+
+    # Search
+    # -----------------------------------------------
+    def _expand(self, node: Node, undos: list) -> Node:
+        action = node.untried.pop()
+        if self.in_place:
+            state = self._working_state
+            players, rewards, terminal, winners, undo = self.environment.make_move(state, node.players, [action])
+            undos.append(undo)
+            child = Node(node, action, None, players, terminal, winners, self.num_players)
+        else:
+            state, players, rewards, terminal, winners = self.environment.next_state(node.state, node.players,
+                                                                                     [action])
+            child = Node(node, action, state, players, terminal, winners, self.num_players)
+
+        if not terminal:
+            if len(players) != 1:
+                raise ValueError("MCTS only supports games where one player acts at a time")
+            child.untried = self._actions(state, players[0])
+            if self._hashed:
+                child.hash = self.environment.state_hash(state)
+
+        node.children.append(child)
+        return child
+
+    def _best_child(self, node: Node) -> Node:
+        player = node.player
+        log_visits = log(node.visits + node.virtual_visits)
+        exploration = self.exploration
+
+        best_child, best_score = None, -float('inf')
+        for child in node.children:
+            visits = child.visits + child.virtual_visits
+            score = child.value_sums[player] / visits + exploration * sqrt(log_visits / visits)
+            if score > best_score:
+                best_child, best_score = child, score
+        return best_child
+
+    def _select(self) -> Tuple[List[Node], list]:
+        """ Walk down to a leaf, expanding it if it has untried actions, and add virtual loss along the path. """
+        node = self.root
+        path = [node]
+        undos = []
+        while not node.terminal:
+            if len(node.untried) > 0:
+                path.append(self._expand(node, undos))
+                break
+
+            node = self._best_child(node)
+            if self.in_place:
+                undos.append(self.environment.make_move(self._working_state, node.parent.players, [node.action])[-1])
+            path.append(node)
+
+        for node in path:
+            node.virtual_visits += self.virtual_loss
+        return path, undos
+
+    def _backup(self, path: List[Node], values: Sequence[float]):
+        for node in path:
+            node.visits += 1
+            node.virtual_visits -= self.virtual_loss
+            value_sums = node.value_sums
+            for player in range(self.num_players):
+                value_sums[player] += values[player]
+        self.simulations += 1
+
+    def _rollout(self, state: object, players: Sequence[int]) -> np.ndarray:
+        values = [rollout(self.environment, state, players, self.num_players, self.rng, self.max_rollout_depth,
+                          self.in_place)
+                  for _ in range(self.rollouts_per_leaf)]
+        return np.mean(values, axis=0)
+
+    def _evaluate(self, states: List[object], players: List[Sequence[int]]) -> np.ndarray:
+        if self.evaluator is not None:
+            return np.asarray(self.evaluator(states, [leaf_players[0] for leaf_players in players]), np.float64)
+
+        if self.environment.serializable():
+            states = [self.environment.serialize_state(state) for state in states]
+
+        tasks = [(state, leaf_players, self.rng.getrandbits(32)) for state, leaf_players in zip(states, players)]
+        chunk_size = max(1, len(tasks) // self.num_workers)
+        return np.array(self.pool.map(_rollout_worker, tasks, chunksize=chunk_size))
+
+    def _run_batch(self):
+        batched = self.evaluator is not None or self.pool is not None
+        pending_paths, pending_states, pending_players = [], [], []
+
+        # Leaves rolled out in the current process are done one at a time, so that the time limit is checked often
+        for _ in range(self.batch_size if batched else 1):
+            path, undos = self._select()
+            leaf = path[-1]
+
+            state = self._working_state if self.in_place else leaf.state
+            if leaf.terminal:
+                self._backup(path, leaf.values)
+            elif batched:
+                pending_paths.append(path)
+                pending_states.append(self.environment.clone_state(state) if self.in_place else state)
+                pending_players.append(leaf.players)
+            else:
+                self._backup(path, self._rollout(state, leaf.players))
+
+            for undo in reversed(undos):
+                self.environment.unmake_move(self._working_state, undo)
+
+        if len(pending_paths) > 0:
+            for path, values in zip(pending_paths, self._evaluate(pending_states, pending_players)):
+                self._backup(path, values)
+
+    def run(self, time_limit: float = DEFAULT_TIME_LIMIT, iterations: int = None):
+        """ Grow the tree of the current root.
+
+        Parameters
+        ----------
+        time_limit : float
+            Seconds to search for. A new batch is only started if it is expected to finish in time.
+        iterations : int
+            Optional maximum number of leaves to evaluate.
+        """
+        deadline = time() + (float('inf') if time_limit is None else time_limit)
+        target = None if iterations is None else self.simulations + iterations
+
+        batch_time = 0.0
+        while len(self.root.untried) > 0 or len(self.root.children) > 0:
+            start = time()
+            if start + batch_time > deadline or (target is not None and self.simulations >= target):
+                break
+
+            self._run_batch()
+            batch_time = time() - start
+
+    def search(self, state: object, player: int, time_limit: float = DEFAULT_TIME_LIMIT,
+               iterations: int = None) -> Union[str, int]:
+        """ Search a position and return the best action for the player to move.
+
+        The tree of the previous search is reused if the position is in it.
+
+        Parameters
+        ----------
+        state : object
+            The state to search from.
+        player : int
+            The player to move.
+        time_limit : float
+            Seconds to search for. The default fits in the move timeout of match_server.
+        iterations : int
+            Optional maximum number of leaves to evaluate.
+
+        Returns
+        -------
+        Union[str, int]
+            The most visited action, one of the environment's valid_actions.
+        """
+        start = time()
+        self.set_position(state, player)
+        if time_limit is not None:
+            time_limit -= time() - start
+
+        self.run(time_limit, iterations)
+        return self.best_action()
+
+    def best_action(self) -> Union[str, int]:
+        """ The most visited action at the root, ties broken by the mean value of the player to move. """
+        root = self.root
+        if len(root.children) == 0:
+            return root.untried[-1] if len(root.untried) > 0 else ""
+
+        player = root.player
+        best_child = max(root.children, key=lambda child: (child.visits, child.mean_values()[player]))
+        return best_child.action
+
+    def statistics(self) -> Dict[Union[str, int], Tuple[int, float]]:
+        """ Number of visits and mean value for the player to move of every expanded action at the root. """
+        player = self.root.player
+        return {child.action: (child.visits, float(child.mean_values()[player])) for child in self.root.children}
@@ -0,0 +1,202 @@
+""" Run a batch of games of any environment through one interface, for high throughput self-play and training.
+
+Environments with native batch methods (new_state_batch, next_state_batch, reset_state_batch and
+state_to_observation_batch) are stepped with them, every other environment falls back to the loop based defaults
+of BaseEnvironment. Either way the runner has the same array interface:
+
+    players    (B,) the player to act in every game when one player acts per step,
+               (B, K) when several players act at once. Slots without an acting player hold -1.
+    actions    integer actions with the same shape as players.
+    rewards    (B, P) float, the reward of every player in every game for this step.
+    terminal   (B,) bool, whether every game ended with this step.
+    winners    (B, P) bool, the winners of every game that ended with this step.
+
+Environments without integer actions take arrays of action strings instead.
+"""
+
+from typing import Dict, List, NamedTuple, Sequence
+
+import numpy as np
+
+from .BaseEnvironment import BaseEnvironment
+
+NO_PLAYER = -1
+
+
+class VectorStep(NamedTuple):
+    """ Result of one step of every game in a batch. """
+    observations: Dict[str, np.ndarray]  # (B, ...) observation of the next player to act in every game
+    rewards: np.ndarray                  # (B, P) float: reward of every player in every game
+    terminal: np.ndarray                 # (B,) bool: whether every game ended with this step
+    winners: np.ndarray                  # (B, P) bool: winners of every game that ended with this step
+    players: np.ndarray                  # (B,) or (B, K): players to act next in every game, -1 for none
+
+
+class VectorEnvironment:
+    """ B games of one environment, stepped together. """
+
+    def __init__(self, environment: BaseEnvironment, batch_size: int, num_players: int = None,
+                 auto_reset: bool = True):
+        """ Create a batch of new games.
+
+        Parameters
+        ----------
+        environment : BaseEnvironment
+            The environment to play.
+        batch_size : int
+            Number of games B.
+        num_players : int
+            Total number of players P in every game, defaults to the environment's min_players.
+        auto_reset : bool
+            Restart every game as soon as it ends. Otherwise finished games must be restarted with reset(mask)
+            before the next step, since the loop based batch methods step every game of the batch.
+        """
+        self.environment = environment
+        self.batch_size = batch_size
+        self.num_players = num_players
+        self.total_players = environment.min_players if num_players is None else num_players
+        self.auto_reset = auto_reset
+
+        #: Number of games that have ended since creation
+        self.episodes = 0
+
+        self.state = None
+        self.players: np.ndarray = None
+        self.terminal = np.zeros(batch_size, np.bool_)
+
+        # The players in the format of the environment's batch methods
+        self._players = None
+        self._integer_actions = environment.action_space_size is not None
+
+        self.reset()
+
+    @property
+    def native(self) -> bool:
+        """ Whether the environment steps the batch with its own vectorized next_state_batch. """
+        return type(self.environment).next_state_batch is not BaseEnvironment.next_state_batch
+
+    def reset(self, mask: np.ndarray = None) -> Dict[str, np.ndarray]:
+        """ Start new games, either in every slot or only where mask is True, and return the new observations. """
+        if mask is None:
+            self.state, self._players = self.environment.new_state_batch(self.batch_size, self.num_players)
+            self.terminal[:] = False
+        else:
+            self.state, self._players = self.environment.reset_state_batch(self.state, self._players, mask,
+                                                                           self.num_players)
+            self.terminal[mask] = False
+
+        self.players = self._player_array(self._players)
+        return self.observation()
+
+    def observers(self) -> np.ndarray:
+        """ (B,) the first player to act in every game, who observes the game by default. """
+        players = self.players if self.players.ndim == 1 else self.players[:, 0]
+        return np.maximum(players, 0)
+
+    def observation(self, players: np.ndarray = None) -> Dict[str, np.ndarray]:
+        """ Stacked observations of every game.
+
+        Parameters
+        ----------
+        players : np.ndarray
+            (B,) the observing player of every game. Defaults to the first player to act in every game.
+
+        Returns
+        -------
+        Dict[str, np.ndarray]
+            (B, ...) arrays for every observation name.
+        """
+        players = self.observers() if players is None else players
+        return self.environment.state_to_observation_batch(self.state, players)
+
+    def step(self, actions: np.ndarray) -> VectorStep:
+        """ Play one step in every game.
+
+        Parameters
+        ----------
+        actions : np.ndarray
+            Integer actions with the same shape as players, (B,) or (B, K).
+            Entries of slots without an acting player are ignored.
+
+        Returns
+        -------
+        VectorStep
+            Rewards, terminal flags and winners of this step, then the observations and players of the next one.
+        """
+        if self.native:
+            self.state, self._players, rewards, terminal, winners = self.environment.next_state_batch(
+                self.state, self._players, actions)
+            rewards = np.asarray(rewards, np.float64)
+            winners = self._winner_mask(winners, terminal)
+        else:
+            acting_players = self._players
+            self.state, self._players, rewards, terminal, winners = self.environment.next_state_batch(
+                self.state, acting_players, self._action_lists(actions))
+            rewards = self._reward_array(acting_players, rewards)
+            winners = self._winner_mask(winners, terminal)
+
+        terminal = np.asarray(terminal, np.bool_)
+        ended = terminal & ~self.terminal
+        self.episodes += int(np.count_nonzero(ended))
+        self.terminal = terminal.copy()
+        self.players = self._player_array(self._players)
+
+        if self.auto_reset and np.any(terminal):
+            self.reset(terminal)
+
+        return VectorStep(self.observation(), rewards, terminal, winners, self.players)
+
+    # Conversion between the array interface and the formats of the batch methods
+    def _player_array(self, players: object) -> np.ndarray:
+        if isinstance(players, np.ndarray):
+            return players
+
+        # The loop based default: a list of player lists, one per game
+        players = [list(game_players) for game_players in players]
+        width = max((len(game_players) for game_players in players), default=0)
+
+        array = np.full((len(players), max(width, 1)), NO_PLAYER, np.int64)
+        for game, game_players in enumerate(players):
+            array[game, :len(game_players)] = game_players
+        return array[:, 0] if width <= 1 else array
+
+    def _action_lists(self, actions: np.ndarray) -> List[List[str]]:
+        actions = np.asarray(actions)
+        if actions.ndim == 1:
+            actions = actions[:, None]
+
+        action_lists = []
+        for game_players, game_actions in zip(self._players, actions):
+            game_actions = game_actions[:len(game_players)]
+            if self._integer_actions:
+                game_actions = [self.environment.index_to_action(int(action)) for action in game_actions]
+            action_lists.append(list(game_actions))
+        return action_lists
+
+    def _reward_array(self, acting_players: Sequence[Sequence[int]], rewards: Sequence[Sequence[float]]) \
+            -> np.ndarray:
+        # Environments give a reward either to every acting player, or to every player
+        array = np.zeros((self.batch_size, self.total_players), np.float64)
+        for game, (game_players, game_rewards) in enumerate(zip(acting_players, rewards)):
+            if len(game_rewards) == len(game_players):
+                array[game, list(game_players)] = game_rewards
+            else:
+                array[game, :len(game_rewards)] = game_rewards
+        return array
+
+    def _winner_mask(self, winners: object, terminal: np.ndarray) -> np.ndarray:
+        terminal = np.asarray(terminal, np.bool_)
+        if isinstance(winners, np.ndarray) and winners.dtype == np.bool_:
+            return winners & terminal[:, None]
+
+        mask = np.zeros((self.batch_size, self.total_players), np.bool_)
+        if isinstance(winners, np.ndarray) and winners.ndim == 1:
+            # One winner per game, -1 for games that did not end
+            games = np.flatnonzero(terminal & (winners >= 0))
+            mask[games, winners[games]] = True
+            return mask
+
+        for game, game_winners in enumerate(winners):
+            if terminal[game] and game_winners is not None:
+                mask[game, list(game_winners)] = True
+        return mask
@@ -1,6 +1,17 @@
 name = "colosseumrl"
-
+from .lazy import lazy_attributes
+from .Arena import Arena, GameResult
 from .BaseEnvironment import BaseEnvironment
-from .ClientEnvironment import ClientEnvironment
+from .CachedEnvironment import CachedEnvironment, LRUCache
+from .MCTS import MCTS
+from .VectorEnvironment import VectorEnvironment, VectorStep
 from .config import get_environment, available_environments
-from .RLApp import RLApp, create_rl_agent, launch_rl_agent
+from .trajectories import RecordingEnvironment, TrajectoryDataset, TrajectoryWriter
+
+# The client side needs spacetime, it is only imported when used
+lazy_attributes(__name__, {
+    "ClientEnvironment": ".ClientEnvironment",
+    "RLApp": ".RLApp",
+    "create_rl_agent": ".RLApp",
+    "launch_rl_agent": ".RLApp"
+})
@@ -0,0 +1,480 @@
+""" Micro benchmarks of the environment engines, with a regression report between two runs.
+
+Every environment of config.ENVIRONMENT_CLASSES is timed on a canonical mid-game position: a fixed number of
+random valid moves from a new game, with a fixed seed, so that every run measures the same position.
+Environments that cannot be imported, such as Tron without its compiled module, are reported as skipped.
+
+    python -m colosseumrl.bench -o before.json
+    python -m colosseumrl.bench -o after.json --compare before.json
+    python -m colosseumrl.bench --compare before.json after.json --threshold 0.2
+
+With --imports, the import time of the engine packages is measured instead, each in a fresh interpreter, and checked
+against IMPORT_BUDGETS. Importing an engine must also not load any of the optional dependencies in
+HEAVY_DEPENDENCIES, which are only needed by the clients, the RLlib wrappers and the renderers.
+
+    python -m colosseumrl.bench --imports
+
+The exit status is 1 when the report contains a regression, so the benchmark can gate a CI job.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import timeit
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .BaseEnvironment import BaseEnvironment
+from .config import ENVIRONMENT_CLASSES
+
+FORMAT_VERSION = 1
+
+OPERATIONS = ("new_state", "next_state", "valid_actions", "is_valid_action", "state_to_observation",
+              "serialize_state", "deserialize_state")
+
+# Number of random moves played from a new game to reach the canonical mid-game position of every environment
+MID_GAME_STEPS = {
+    'blokus': 16,
+    'tron': 20,
+    'test': 0,
+    'tictactoe': 4,
+    'tictactoe_3p': 6,
+    'tictactoe_4p': 8,
+    'mnk': 24
+}
+DEFAULT_MID_GAME_STEPS = 8
+
+# Maximum import time in seconds of the engine packages, in a fresh interpreter, numpy included
+IMPORT_BUDGETS = {
+    'colosseumrl': 0.5,
+    'colosseumrl.envs.blokus': 0.5,
+    'colosseumrl.envs.mnk': 0.5,
+    'colosseumrl.envs.tictactoe': 0.5,
+    'colosseumrl.envs.tron': 0.5
+}
+
+# Optional dependencies that importing an engine package must not load
+HEAVY_DEPENDENCIES = ("spacetime", "dill", "gym", "ray", "matplotlib", "pygame", "numba")
+
+_IMPORT_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "loaded": [name for name in {dependencies!r} if name in sys.modules]}}))
+"""
+
+
+class Comparison(NamedTuple):
+    """ One line of a regression report. Times are in nanoseconds per call, None if missing from a run. """
+    environment: str
+    operation: str
+    baseline: Optional[float]
+    current: Optional[float]
+    ratio: Optional[float]
+    status: str  # "ok", "regression", "improvement" or "missing"
+
+
+def mid_game_position(environment: BaseEnvironment, num_players: int, steps: int, seed: int = 0) \
+        -> Tuple[object, List[int], List[str]]:
+    """ Reach a reproducible position by playing random valid moves from a new game.
+
+    The game stops one move early if it would end before the given number of steps.
+
+    Returns
+    -------
+    state : object
+        The position.
+    players : List[int]
+        The players to move.
+    actions : List[str]
+        A random valid action of every player to move, used to time next_state and is_valid_action.
+    """
+    random.seed(seed)
+    np.random.seed(seed)
+
+    def choose_actions(state, players):
+        actions = []
+        for player in players:
+            valid_actions = list(environment.valid_actions(state, player))
+            actions.append(random.choice(valid_actions) if len(valid_actions) > 0 else "")
+        return actions
+
+    state, players = environment.new_state(num_players=num_players)
+    actions = choose_actions(state, players)
+    for _ in range(steps):
+        next_state, next_players, _, terminal, _ = environment.next_state(state, players, actions)
+        if terminal:
+            break
+        state, players = next_state, next_players
+        actions = choose_actions(state, players)
+
+    return state, players, actions
+
+
+def time_call(function: Callable[[], object], min_time: float = 0.2, repeat: int = 5) -> Dict[str, float]:
+    """ Time a function the way timeit does: the number of calls per run is scaled until a run takes at least
+    min_time seconds, and the fastest of repeat runs is kept.
+
+    Returns
+    -------
+    Dict[str, float]
+        Nanoseconds per call of the fastest and of the median run, and the number of calls per run.
+    """
+    timer = timeit.Timer(function)
+
+    number = 1
+    while True:
+        if timer.timeit(number) >= min_time:
+            break
+        number *= 10 if number < 1000 else 2
+
+    times = sorted(run / number * 1e9 for run in timer.repeat(repeat, number))
+    return {"ns": times[0], "median_ns": times[len(times) // 2], "number": number}
+
+
+def benchmark_environment(environment: BaseEnvironment, steps: int, seed: int = 0, min_time: float = 0.2,
+                          repeat: int = 5, operations: Sequence[str] = OPERATIONS) -> Dict[str, Dict[str, float]]:
+    """ Time the engine methods of one environment on its mid-game position.
+
+    Parameters
+    ----------
+    environment : BaseEnvironment
+        The environment to measure.
+    steps : int
+        Number of random moves to the mid-game position.
+    seed : int
+        Seed of the random moves, and of the random number generators before every timed operation.
+    min_time : float
+        Minimum duration of one timing run, in seconds.
+    repeat : int
+        Number of timing runs, the fastest is reported.
+    operations : Sequence[str]
+        The operations to time, a subset of OPERATIONS.
+
+    Returns
+    -------
+    Dict[str, Dict[str, float]]
+        Result of time_call for every operation. Operations the environment does not implement are left out.
+    """
+    num_players = environment.min_players
+    state, players, actions = mid_game_position(environment, num_players, steps, seed)
+    player = players[0]
+
+    try:
+        serialized_state = environment.serialize_state(state)
+    except NotImplementedError:
+        serialized_state = None
+
+    calls = {
+        "new_state": lambda: environment.new_state(num_players=num_players),
+        "next_state": lambda: environment.next_state(state, players, actions),
+        "valid_actions": lambda: list(environment.valid_actions(state, player)),
+        "is_valid_action": lambda: environment.is_valid_action(state, player, actions[0]),
+        "state_to_observation": lambda: environment.state_to_observation(state, player),
+        "serialize_state": lambda: environment.serialize_state(state),
+        "deserialize_state": lambda: environment.deserialize_state(serialized_state)
+    }
+
+    results = {}
+    for operation in operations:
+        random.seed(seed)
+        np.random.seed(seed)
+        try:
+            calls[operation]()
+        except NotImplementedError:
+            continue
+        results[operation] = time_call(calls[operation], min_time, repeat)
+    return results
+
+
+def time_import(module: str, repeat: int = 5) -> Dict[str, object]:
+    """ Time the import of a module, each time in a fresh interpreter.
+
+    Returns
+    -------
+    Dict[str, object]
+        The fastest import time in seconds, and the heavy dependencies it loaded.
+
+    Raises
+    ------
+    ImportError
+        If the module cannot be imported.
+    """
+    script = _IMPORT_SCRIPT.format(module=module, dependencies=HEAVY_DEPENDENCIES)
+
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, "-c", script], capture_output=True)
+        if output.returncode != 0:
+            error = output.stderr.decode().strip().splitlines()
+            raise ImportError(error[-1] if error else "Importing {} failed".format(module))
+        runs.append(json.loads(output.stdout.decode().strip().splitlines()[-1]))
+
+    return {"seconds": min(run["seconds"] for run in runs), "loaded": runs[0]["loaded"]}
+
+
+def check_imports(budgets: Dict[str, float] = None, repeat: int = 5) -> Dict[str, Dict[str, object]]:
+    """ Time the import of every package of budgets, and check it against its budget in seconds.
+
+    Returns
+    -------
+    Dict[str, Dict[str, object]]
+        The result of time_import of every package with its budget and status: "ok", "over budget",
+        "heavy dependency" if it loaded one of HEAVY_DEPENDENCIES, or "skipped" if it could not be imported.
+    """
+    budgets = IMPORT_BUDGETS if budgets is None else budgets
+
+    results = {}
+    for module, budget in budgets.items():
+        try:
+            result = time_import(module, repeat)
+        except ImportError as error:
+            results[module] = {"budget": budget, "status": "skipped", "reason": str(error)}
+            continue
+
+        if len(result["loaded"]) > 0:
+            status = "heavy dependency"
+        elif result["seconds"] > budget:
+            status = "over budget"
+        else:
+            status = "ok"
+        results[module] = dict(result, budget=budget, status=status)
+    return results
+
+
+def format_imports(results: Dict[str, Dict[str, object]]) -> str:
+    """ Human readable table of check_imports. """
+    lines = ["{:<28} {:>10} {:>10}  {}".format("module", "time", "budget", "status")]
+    for module, result in results.items():
+        if result["status"] == "skipped":
+            lines.append("{:<28} {:>10} {:>10}  skipped ({})".format(
+                module, "-", _format_time(result["budget"] * 1e9), result["reason"]))
+            continue
+        status = result["status"]
+        if len(result["loaded"]) > 0:
+            status += " ({})".format(", ".join(result["loaded"]))
+        lines.append("{:<28} {:>10} {:>10}  {}".format(
+            module, _format_time(result["seconds"] * 1e9), _format_time(result["budget"] * 1e9), status))
+    return "\n".join(lines)
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        directory = os.path.dirname(os.path.abspath(__file__))
+        output = subprocess.run(["git", "rev-parse", "HEAD"], cwd=directory, capture_output=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return output.stdout.decode().strip() if output.returncode == 0 else None
+
+
+def run_benchmarks(environments: Sequence[str] = None, seed: int = 0, min_time: float = 0.2, repeat: int = 5,
+                   operations: Sequence[str] = OPERATIONS) -> dict:
+    """ Benchmark several environments.
+
+    Parameters
+    ----------
+    environments : Sequence[str]
+        Names from config.ENVIRONMENT_CLASSES, defaults to all of them.
+    seed : int
+        Seed of the mid-game positions.
+    min_time : float
+        Minimum duration of one timing run, in seconds.
+    repeat : int
+        Number of timing runs per operation.
+    operations : Sequence[str]
+        The operations to time, a subset of OPERATIONS.
+
+    Returns
+    -------
+    dict
+        JSON serializable results: run metadata, the timings of every environment, and the reason every
+        skipped environment could not be measured.
+    """
+    environments = list(ENVIRONMENT_CLASSES) if environments is None else list(environments)
+
+    results = {
+        "version": FORMAT_VERSION,
+        "metadata": {
+            "commit": _git_commit(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "seed": seed,
+            "min_time": min_time,
+            "repeat": repeat
+        },
+        "environments": {},
+        "skipped": {}
+    }
+
+    for name in environments:
+        try:
+            environment = ENVIRONMENT_CLASSES[name]()()
+        except Exception as error:
+            results["skipped"][name] = "{}: {}".format(type(error).__name__, error)
+            continue
+
+        steps = MID_GAME_STEPS.get(name, DEFAULT_MID_GAME_STEPS)
+
+        # Some environments print on every move, keep it out of the report
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            timings = benchmark_environment(environment, steps, seed, min_time, repeat, operations)
+
+        results["environments"][name] = {
+            "num_players": environment.min_players,
+            "mid_game_steps": steps,
+            "operations": timings
+        }
+
+    return results
+
+
+def compare(baseline: dict, current: dict, threshold: float = 0.1) -> List[Comparison]:
+    """ Compare two benchmark results.
+
+    An operation is a regression when it got slower by more than threshold, for example 0.1 for 10%,
+    and an improvement when it got faster by the same factor.
+    """
+    comparisons = []
+    baseline_environments = baseline["environments"]
+    current_environments = current["environments"]
+
+    for environment in sorted(set(baseline_environments) | set(current_environments)):
+        baseline_operations = baseline_environments.get(environment, {}).get("operations", {})
+        current_operations = current_environments.get(environment, {}).get("operations", {})
+
+        for operation in OPERATIONS:
+            if operation not in baseline_operations and operation not in current_operations:
+                continue
+            old = baseline_operations[operation]["ns"] if operation in baseline_operations else None
+            new = current_operations[operation]["ns"] if operation in current_operations else None
+
+            if old is None or new is None:
+                comparisons.append(Comparison(environment, operation, old, new, None, "missing"))
+                continue
+
+            ratio = new / old
+            if ratio > 1 + threshold:
+                status = "regression"
+            elif ratio < 1 / (1 + threshold):
+                status = "improvement"
+            else:
+                status = "ok"
+            comparisons.append(Comparison(environment, operation, old, new, ratio, status))
+
+    return comparisons
+
+
+def _format_time(nanoseconds: Optional[float]) -> str:
+    if nanoseconds is None:
+        return "-"
+    for unit, scale in (("s", 1e9), ("ms", 1e6), ("us", 1e3)):
+        if nanoseconds >= scale:
+            return "{:.2f} {}".format(nanoseconds / scale, unit)
+    return "{:.0f} ns".format(nanoseconds)
+
+
+def format_results(results: dict) -> str:
+    """ Human readable table of a benchmark run. """
+    lines = ["{:<14} {:<22} {:>12} {:>12}".format("environment", "operation", "best", "median")]
+    for environment, result in results["environments"].items():
+        for operation, timing in result["operations"].items():
+            lines.append("{:<14} {:<22} {:>12} {:>12}".format(
+                environment, operation, _format_time(timing["ns"]), _format_time(timing["median_ns"])))
+    for environment, reason in results["skipped"].items():
+        lines.append("{:<14} skipped ({})".format(environment, reason))
+    return "\n".join(lines)
+
+
+def format_comparison(comparisons: Sequence[Comparison]) -> str:
+    """ Human readable regression report. """
+    lines = ["{:<14} {:<22} {:>12} {:>12} {:>8}  {}".format(
+        "environment", "operation", "baseline", "current", "ratio", "status")]
+    for comparison in comparisons:
+        lines.append("{:<14} {:<22} {:>12} {:>12} {:>8}  {}".format(
+            comparison.environment, comparison.operation,
+            _format_time(comparison.baseline), _format_time(comparison.current),
+            "-" if comparison.ratio is None else "{:.2f}x".format(comparison.ratio), comparison.status))
+
+    regressions = sum(comparison.status == "regression" for comparison in comparisons)
+    lines.append("{} regression(s) out of {} operations".format(regressions, len(comparisons)))
+    return "\n".join(lines)
+
+
+def _load(path: str) -> dict:
+    with open(path) as file:
+        results = json.load(file)
+    if results.get("version") != FORMAT_VERSION:
+        raise ValueError("{} is not a benchmark result of version {}".format(path, FORMAT_VERSION))
+    return results
+
+
+def main(argv: Sequence[str] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m colosseumrl.bench",
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter, description="""
+    Benchmark the environment engines on fixed mid-game positions, and compare the results with an earlier run.
+    """)
+    parser.add_argument("--environments", '-e', type=str, nargs='+', default=None,
+                        help="Environments to benchmark. Choices are: {}".format(list(ENVIRONMENT_CLASSES)))
+    parser.add_argument("--operations", type=str, nargs='+', default=list(OPERATIONS), choices=OPERATIONS,
+                        help="Operations to benchmark.")
+    parser.add_argument("--output", '-o', type=str, default=None,
+                        help="Write the results as JSON to this file.")
+    parser.add_argument("--seed", '-s', type=int, default=0,
+                        help="Seed of the mid-game positions.")
+    parser.add_argument("--min-time", type=float, default=0.2,
+                        help="Minimum duration of one timing run in seconds.")
+    parser.add_argument("--repeat", '-r', type=int, default=5,
+                        help="Number of timing runs per operation, the fastest is reported.")
+    parser.add_argument("--compare", '-c', type=str, nargs='+', default=None, metavar="RESULTS",
+                        help="Baseline JSON file to compare this run against. "
+                             "With a second file, compare the two files without running the benchmarks.")
+    parser.add_argument("--threshold", '-t', type=float, default=0.1,
+                        help="Relative slowdown reported as a regression.")
+    parser.add_argument("--imports", action="store_true",
+                        help="Check the import time of the engine packages against their budgets instead.")
+
+    args = parser.parse_args(argv)
+
+    if args.imports:
+        results = check_imports(repeat=args.repeat)
+        print(format_imports(results))
+
+        if args.output is not None:
+            with open(args.output, "w") as file:
+                json.dump({"version": FORMAT_VERSION, "imports": results}, file, indent=2)
+
+        return 1 if any(result["status"] not in ("ok", "skipped") for result in results.values()) else 0
+
+    if args.compare is not None and len(args.compare) > 2:
+        parser.error("--compare takes a baseline and an optional second result file")
+
+    if args.compare is not None and len(args.compare) == 2:
+        current = _load(args.compare[1])
+    else:
+        current = run_benchmarks(args.environments, args.seed, args.min_time, args.repeat, args.operations)
+        print(format_results(current))
+
+        if args.output is not None:
+            with open(args.output, "w") as file:
+                json.dump(current, file, indent=2)
+
+    if args.compare is None:
+        return 0
+
+    comparisons = compare(_load(args.compare[0]), current, args.threshold)
+    print(format_comparison(comparisons))
+    return 1 if any(comparison.status == "regression" for comparison in comparisons) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -18,6 +18,11 @@ def test_game() -> Type[BaseEnvironment]:
     return TestGame
 
 
+def mnk() -> Type[BaseEnvironment]:
+    from colosseumrl.envs.mnk import MNKEnvironment
+    return MNKEnvironment
+
+
 def tic_tac_toe(n) -> Callable[[], Type[BaseEnvironment]]:
     def ttt() -> Type[BaseEnvironment]:
         if n == 2:
@@ -40,7 +45,8 @@ ENVIRONMENT_CLASSES: Dict[str, Callable[[], Type[BaseEnvironment]]] = {
     'test': test_game,
     'tictactoe': tic_tac_toe(2),
     'tictactoe_3p': tic_tac_toe(3),
-    'tictactoe_4p': tic_tac_toe(4)
+    'tictactoe_4p': tic_tac_toe(4),
+    'mnk': mnk
 }
 
 
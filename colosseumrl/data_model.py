@@ -42,6 +42,7 @@ class Player(object):
     observation_port = dimension(int)
 
     action = dimension(str)
+    action_index = dimension(int)
     reward_from_last_turn = dimension(float)
 
     turn = dimension(bool)
@@ -57,6 +58,7 @@ class Player(object):
         self.name = name
         self.number = -1
         self.action = ""
+        self.action_index = -1  # integer action, used instead of the action string when non-negative
         self.turn = False  # server is waiting for player to make their action
         self.ready_for_action_to_be_taken = False  # player is ready for their current action to executed, unset when server executes action
         self.reward_from_last_turn = -1.0
@@ -3,6 +3,7 @@ from typing import Tuple, List, Dict
 from .ai import AI
 from .BlokusEnvironment import start_gui, terminate_gui, display_board
 from .board import Board
+from .bots import BlokusBot
 from colosseumrl.ClientEnvironment import ClientEnvironment
 
 
@@ -50,4 +51,8 @@ class BlokusClientEnvironment(ClientEnvironment):
 
     def valid_actions_dict(self) -> Dict[str, Dict[Tuple[int], List[str]]]:
         """ Valid actions for a specific state in the dictionary form {piece_type: {index: [orientation]}}"""
-        return self._server_environment.valid_actions_dict(state=self.full_state, player=self._player.number)
\ No newline at end of file
+        return self._server_environment.valid_actions_dict(state=self.full_state, player=self._player.number)
+
+    def bot_action(self, bot: BlokusBot) -> str:
+        """ Action chosen by one of the baseline bots for the current state, see colosseumrl.envs.blokus.bots."""
+        return bot(self.full_state, self._player.number)
@@ -1,12 +1,13 @@
 from copy import deepcopy
 from typing import Tuple, List, Union, Dict
 
-import dill
 import numpy as np
-from . import gui
 from .ai import AI
 from .board import Board, PIECE_TYPES, ORIENTATIONS, BOARD_TO_PLAYER_OBSERVATION_ROTATION_MATRICES, PLAYER_OBSERVATION_TO_BOARD_ROTATION_MATRICES
+from .search import BlokusSearchState
 from colosseumrl.BaseEnvironment import BaseEnvironment
+from colosseumrl.serialization import serialize, deserialize
+from colosseumrl.zobrist import ZobristTable
 
 PLAYER_TO_COLOR = {
     0: 1,
@@ -52,6 +53,22 @@ def _relative_player_id(current_player: int, absolute_player_num) -> int:
     return (absolute_player_num - current_player) % 4
 
 
+def _as_state(state: object) -> object:
+    """ The (board, round_count, players) state of a state or of a BlokusSearchState. """
+    return state.to_state() if isinstance(state, BlokusSearchState) else state
+
+
+# Row p maps every board color to its player id relative to player p, -1 for empty cells
+RELATIVE_COLOR_TABLE = np.array([[_relative_player_id(player, COLOR_TO_PLAYER[color]) for color in range(5)]
+                                 for player in range(4)])
+
+# Zobrist keys of the board colors, of every piece still owned by every player and of the first round,
+# the only part of the round count that changes the valid moves
+ZOBRIST = ZobristTable((20, 20), 5)
+ZOBRIST_PIECE_KEYS = ZobristTable.extra_keys((4, len(PIECE_NAME_TO_INDEX)), seed=1)
+ZOBRIST_FIRST_ROUND_KEY = int(ZobristTable.extra_keys(1, seed=2)[0])
+
+
 def action_to_string(piece_type: str, index: Tuple[int, int], orientation: str) -> str:
     """Convert a piece_type, index, and orientation into a formatted action string.
 
@@ -116,6 +133,7 @@ def start_gui():
     blokus.blokus_env.terminate_gui
 
     """
+    from . import gui
     gui.start_gui()
 
 
@@ -128,6 +146,7 @@ def terminate_gui():
     blokus.blokus_env.display_board
 
     """
+    from . import gui
     gui.terminate_gui()
 
 
@@ -156,6 +175,8 @@ def display_board(state: object, player_num: int, winners: Union[List[int], None
 
     """
 
+    from . import gui
+
     board, round_count, players = state
     current_player = players[player_num]
     gui.display_board(board_contents=board.board_contents, current_player=current_player, players=players,
@@ -317,7 +338,7 @@ class BlokusEnvironment(BaseEnvironment):
             serialized state
 
         """
-        return dill.dumps(state)
+        return serialize(state)
 
     @staticmethod
     def deserialize_state(serialized_state: bytearray) -> State:
@@ -334,7 +355,7 @@ class BlokusEnvironment(BaseEnvironment):
             deserialized state
 
         """
-        return dill.loads(serialized_state)
+        return deserialize(serialized_state)
 
     def current_rewards(self, state: object) -> List[float]:
         """Returns current reward for each player (in absolute order, not reltive to any specific player
@@ -350,7 +371,7 @@ class BlokusEnvironment(BaseEnvironment):
             A vector containing the current rewards for each player
 
         """
-        board, round_count, players = state
+        board, round_count, players = _as_state(state)
 
         return [p.player_score for p in players]
 
@@ -407,7 +428,7 @@ class BlokusEnvironment(BaseEnvironment):
         player_num = players[0]
         action = actions[0]
 
-        board, round_count, players = state
+        board, round_count, players = _as_state(state)
 
         players = deepcopy(players)
         new_board = Board(board)
@@ -485,7 +506,14 @@ class BlokusEnvironment(BaseEnvironment):
 
         This method does not keep track of who's turn it is. That is up to the user.
         If the specified player can physically place a piece at a location, it will be returned as a valid action.
+
+        Every distinct placement of a piece is listed exactly once, even if a symmetric piece could cover the same
+        cells with several orientations or from several corner indexes.
         """
+        if isinstance(state, BlokusSearchState):
+            valid_moves = BlokusSearchState.moves_to_actions(state.legal_moves(player))
+            return valid_moves if len(valid_moves) > 0 else [""]
+
         actions_dict = self.valid_actions_dict(state=state, player=player)
 
         valid_moves = []
@@ -658,12 +686,82 @@ class BlokusEnvironment(BaseEnvironment):
         If the specified player can physically place a piece at a location, it will be returned as a valid action.
 
         """
-        board, round_count, players = state
+        board, round_count, players = _as_state(state)
         current_player_object = players[player]
         return board.get_all_valid_moves(round_count=round_count,
                                          player_color=PLAYER_TO_COLOR[player],
                                          player_pieces=current_player_object.current_pieces)
 
+    def state_hash(self, state: object) -> int:
+        """ Zobrist hash of the board, the pieces left to every player and whether it is the first round. """
+        if isinstance(state, BlokusSearchState):
+            state_hash = ZOBRIST.hash(state.board_contents)
+            if state.round_count == 0:
+                state_hash ^= ZOBRIST_FIRST_ROUND_KEY
+
+            for p, inventory in enumerate(state.inventories):
+                for piece_id in range(len(PIECE_NAME_TO_INDEX)):
+                    if (inventory >> piece_id) & 1:
+                        state_hash ^= int(ZOBRIST_PIECE_KEYS[p, piece_id])
+            return state_hash
+
+        board, round_count, players = state
+        state_hash = ZOBRIST.hash(board.board_contents)
+        if round_count == 0:
+            state_hash ^= ZOBRIST_FIRST_ROUND_KEY
+
+        for p in players:
+            piece_keys = ZOBRIST_PIECE_KEYS[p.player_color - 1]
+            for piece in p.current_pieces:
+                state_hash ^= int(piece_keys[PIECE_NAME_TO_INDEX[piece]])
+
+        return state_hash
+
+    # Search Methods
+    # make_move and unmake_move step a BlokusSearchState in place, which clone_state creates from any state.
+    # Every other method accepts a BlokusSearchState as well, so tree search never copies the board and players.
+    def clone_state(self, state: object) -> BlokusSearchState:
+        """ Independent BlokusSearchState copy of a state, that make_move can modify.
+
+        The turn is set by the players passed to make_move, since states do not record the player to move.
+        """
+        if isinstance(state, BlokusSearchState):
+            return state.copy()
+        return BlokusSearchState.from_state(state, 0)
+
+    def make_move(self, state: BlokusSearchState, players: List[int], actions: List[str]) \
+            -> Tuple[List[int], List[float], bool, Union[List[int], None], int]:
+        """ Same as next_state, played in place on a BlokusSearchState created by clone_state.
+
+        Only the cells of the placed piece change, the board and the players are not copied.
+        The undo information is the player whose turn it was in the state before the move.
+        """
+        player_num = players[0]
+        previous_player = state.player
+        if player_num != previous_player:
+            state.set_player(player_num)
+
+        move = BlokusSearchState.action_to_move(actions[0])
+        terminal = state.ends_game(move)
+        state.apply_move(move)
+
+        winners = None
+        reward = 0
+        if terminal:
+            # Same as next_state: the rank of the player's score in ascending order, and every player with the top score
+            scores = state.scores
+            sorted_scores = sorted(enumerate(scores), key=lambda x: x[1])
+            reward = sorted_scores.index((player_num, scores[player_num]))
+            winners = [p for p, score in enumerate(scores) if score == max(scores)]
+
+        return [(player_num + 1) % 4], [reward], terminal, winners, previous_player
+
+    def unmake_move(self, state: BlokusSearchState, undo: int):
+        """ Revert the last make_move applied to a BlokusSearchState. """
+        state.undo_move()
+        if state.player != undo:
+            state.set_player(undo)
+
     def is_valid_action(self, state: object, player: int, action: str) -> bool:
         """ Returns True if an action is valid for a specific player and state.
 
@@ -698,25 +796,20 @@ class BlokusEnvironment(BaseEnvironment):
         This method does not keep track of who's turn it is. That is up to the user.
         If a piece may be physically placed at the location suggest by the action,
         this method returns true, regardless of who just executed their turn or who should be going now.
+
+        Symmetric pieces can describe the same placement with several orientations.
+        :py:func:`valid_actions` only lists one of them, but every one of them is accepted here.
         """
 
         if len(action) == 0:
             return False
 
-        board, round_count, players = state
+        board, round_count, players = _as_state(state)
         piece_type, index, orientation = string_to_action(action)
         current_player = players[player]
-        all_valid_moves = current_player.collect_moves(board, round_count)
 
-        is_valid_move = False
-        try:
-            # print(all_valid_moves[piece_type][index])
-            if orientation in all_valid_moves[piece_type][index]:
-                is_valid_move = True
-        except KeyError:
-            pass
-
-        return is_valid_move
+        return board.is_valid_move(round_count, current_player.player_color, current_player.current_pieces,
+                                   piece_type, index, orientation)
 
     def state_to_observation(self, state: object, player: int) -> Dict[str, np.ndarray]:
         """ Convert the raw game state to a consumable observation for a specific player agent.
@@ -748,21 +841,36 @@ class BlokusEnvironment(BaseEnvironment):
         This is done so that an RL agent only has to learn to perform moves that make player 0 win
         and other players lose.
         """
+        state = _as_state(state)
+        buffers = {'board': np.empty((20, 20), dtype=np.int64),
+                   'pieces': np.empty((4, 21), dtype=np.uint8),
+                   'score': np.empty(len(state[2]), dtype=np.int64),
+                   'player': np.empty(1, dtype=np.int64)}
 
-        pieces = np.zeros((4, 21), dtype=np.uint8)
-        board, round_count, players = state
-        board = [[_relative_player_id(player, COLOR_TO_PLAYER[pos]) for pos in row] for row in board.board_contents]
-        rotated_board = _rotate_board_for_player_perspective(board=np.asarray(board), player=player)
+        return self.write_observation(state, player, buffers)
 
-        for p in players:
+    def write_observation(self, state: object, player: int, buffers: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """ Same as state_to_observation, written into the caller owned buffers.
+
+        The board is converted to relative player ids and rotated with a single table lookup.
+        """
+        board, round_count, players = _as_state(state)
 
-            color = p.player_color
-            rel_player_id = _relative_player_id(current_player=player,
-                                                absolute_player_num=COLOR_TO_PLAYER[color])
+        board_output = buffers['board']
+        rotated_board = _rotate_board_for_player_perspective(board=board.board_contents, player=player)
+        np.take(RELATIVE_COLOR_TABLE[player].astype(board_output.dtype), rotated_board, out=board_output, mode='clip')
 
+        pieces = buffers['pieces']
+        pieces[...] = 0
+        for p in players:
+            rel_player_id = RELATIVE_COLOR_TABLE[player, p.player_color]
             for piece in p.current_pieces:
                 pieces[rel_player_id, PIECE_NAME_TO_INDEX[piece]] = 1
 
-        score = np.roll(np.array([p.player_score for p in players]), -player)
+        # Scores are rolled so that the observing player comes first
+        score = buffers['score']
+        for i, p in enumerate(players):
+            score[(i - player) % len(players)] = p.player_score
 
-        return {'board': rotated_board, 'pieces': pieces, 'score': score, 'player': np.array([player])}
+        buffers['player'][0] = player
+        return buffers
@@ -1,2 +1,7 @@
+from colosseumrl.lazy import lazy_attributes
 from .BlokusEnvironment import *
-from .BlokusClientEnvironment import *
+from .search import BlokusSearchState
+from .bots import BlokusBot, RandomBot, LargestPieceBot, GreedyCornerBot, get_bot
+
+# The client environment needs spacetime, it is only imported when used
+lazy_attributes(__name__, {"BlokusClientEnvironment": ".BlokusClientEnvironment"})
@@ -43,8 +43,35 @@ PIECE_TYPES = {"monomino1": np.array([(0, 0)], dtype=np.int64),
                "pentominoe11": np.array([(0, 0), (-1, 0), (1, 0), (0, -1), (0, 1)], dtype=np.int64),
                "pentominoe12": np.array([(0, 0), (1, 0), (1, -1), (2, 0), (3, 0)], dtype=np.int64)}
 
+# Piece names in a fixed order, used to index the precomputed tables below
+PIECE_NAMES = list(PIECE_TYPES.keys())
+PIECE_NAME_TO_ID = {piece_name: piece_id for piece_id, piece_name in enumerate(PIECE_NAMES)}
+
 # All possible piece orientations, listed in clockwise order
 ORIENTATIONS = ["north", "northeast", "east", "southeast", "south", "southwest", "west", "northwest"]
+ORIENTATION_TO_ID = {orientation: orientation_id for orientation_id, orientation in enumerate(ORIENTATIONS)}
+
+# Integer transform applied to an (x, y) offset for each orientation (same order as ORIENTATIONS).
+# These are the exact results of the rotations and flips performed by computation.rotate_piece.
+ORIENTATION_MATRICES = np.array([
+    [[0, 1], [-1, 0]],   # north: rotate 270 degrees
+    [[1, 0], [0, -1]],   # northeast: flip y
+    [[1, 0], [0, 1]],    # east: default orientation
+    [[0, 1], [1, 0]],    # southeast: rotate 90 degrees, flip x
+    [[0, -1], [1, 0]],   # south: rotate 90 degrees
+    [[-1, 0], [0, 1]],   # southwest: rotate 180 degrees, flip y
+    [[-1, 0], [0, -1]],  # west: rotate 180 degrees
+    [[0, -1], [-1, 0]]   # northwest: rotate 270 degrees, flip x
+], dtype=np.int64)
+
+# Offsets of every cell for every (piece, orientation, shift), computed once at import.
+# SHIFTED_OFFSET_TABLE[piece_id, orientation_id, shifted_id, :PIECE_SIZES[piece_id]] are the cell offsets from the index.
+SHIFTED_OFFSET_TABLE, PIECE_SIZES = comp.build_shifted_offset_table([PIECE_TYPES[name] for name in PIECE_NAMES],
+                                                                   ORIENTATION_MATRICES)
+
+# Symmetric pieces cover the same cells under several (orientation, shift) pairs.
+# CANONICAL_PLACEMENTS marks the single pair that represents each distinct set of covered cells.
+CANONICAL_PLACEMENTS = comp.build_canonical_table(SHIFTED_OFFSET_TABLE, PIECE_SIZES)
 
 # Default starting corners for each player (0 to 3)
 PLAYER_DEFAULT_CORNERS = [(0, 0), (19, 0), (0, 19), (19, 19)]
@@ -90,12 +117,11 @@ class Board:
             index[1] = y coord
         '''
         self.player_color = player_color
-        for offset in comp.shift_offsets(PIECE_TYPES[piece_type], int(piece_orientation[-1])):  # NEW: Shifts offset orientation according to last character in piece orientation
-            if offset[0] == 0 and offset[1] == 0:
-                self.place_piece(index[0] + offset[0], index[1] + offset[1])  # Orientation doesn't matter since (0, 0) is the reference point
-            else:
-                new_x, new_y = comp.rotate_piece(index, offset[0], offset[1], piece_orientation)
-                self.place_piece(new_x, new_y)
+        piece_id = PIECE_NAME_TO_ID[piece_type]
+        orientation_id = ORIENTATION_TO_ID[piece_orientation[:-1]]  # Last character in piece orientation is the shift id
+        offsets = SHIFTED_OFFSET_TABLE[piece_id, orientation_id, int(piece_orientation[-1]), :PIECE_SIZES[piece_id]]
+        for x_offset, y_offset in offsets.tolist():
+            self.place_piece(index[0] + x_offset, index[1] + y_offset)
 
     def place_piece(self, x, y):
         ''' Places piece on board by filling board_contents with the current player color
@@ -115,14 +141,7 @@ class Board:
         ''' Returns a list of tuples with the indexes of empty corner cells that connect to the player's color.
             The corner_index is not adjecent/touching any same color tiles on its sides beside its corners.
         '''
-        empty_corner_indexes = []
-        for row_num, row in enumerate(self.board_contents):
-            for col_num, cell in enumerate(row):
-                if cell == 0:  # Check if cell is empty
-                    if self.check_valid_corner(self.board_contents, player_color, row_num, col_num):  # If cell lines up with any adjacent piece that is the same color, its an invalid move, otherwise valid
-                        empty_corner_indexes.append((col_num, row_num))
-
-        return empty_corner_indexes
+        return [tuple(index) for index in comp.find_corner_indexes(self.board_contents, player_color).tolist()]
 
     def check_valid_corner(self, board_contents, player_color, row_num, col_num):
         ''' Checks whether all adjacent pieces are a different color to the current player's color.
@@ -162,10 +181,26 @@ class Board:
                         orientation: string specifying the current orientation being checked
             RETURNS: List of all offset lists where a shift at that index and orientation is possible
         '''
-        shifted_offsets = comp.get_all_shifted_offsets(PIECE_TYPES[piece_type], orientation)
-        valid_shift_offsets = comp.check_shifted(self.board_contents, player_color, index, orientation, shifted_offsets)
+        piece_id = PIECE_NAME_TO_ID[piece_type]
+        shifted_offsets = SHIFTED_OFFSET_TABLE[piece_id, ORIENTATION_TO_ID[orientation]]
+        size = PIECE_SIZES[piece_id]
 
-        return valid_shift_offsets
+        return [shifted_id for shifted_id in range(size)
+                if comp.check_placement(self.board_contents, player_color, index[0], index[1],
+                                        shifted_offsets[shifted_id], size)]
+
+    def get_valid_placements(self, round_count, player_color, player_pieces):
+        ''' Same moves as get_all_valid_moves, as a numpy array with one
+            (piece_id, x, y, orientation_id, shifted_id) row per move instead of a dictionary of strings.
+        '''
+        if round_count == 0:  # If still first round of game..
+            empty_corner_indexes = np.array([PLAYER_DEFAULT_CORNERS[player_color-1]], dtype=np.int64)
+        else:
+            empty_corner_indexes = comp.find_corner_indexes(self.board_contents, player_color)
+
+        piece_ids = np.array([PIECE_NAME_TO_ID[piece_type] for piece_type in player_pieces], dtype=np.int64)
+        return comp.find_valid_placements(self.board_contents, player_color, empty_corner_indexes, piece_ids,
+                                          SHIFTED_OFFSET_TABLE, PIECE_SIZES, CANONICAL_PLACEMENTS)
 
     def get_all_valid_moves(self, round_count, player_color, player_pieces):
         ''' Gathers all valid moves on the board that meet the following criteria:
@@ -173,25 +208,41 @@ class Board:
             - Player piece does not fall outside of the board
             - Player piece does not overlap any of their pieces or other opponent pieces
             - May lay adjacent to another piece as long as its another color
+            Each distinct set of covered cells is returned only once, even for symmetric pieces.
         '''
-        if round_count == 0:  # If still first round of game..
-            # empty_corner_indexes = self.gather_empty_board_corners([(0, 0), (19, 0), (0, 19), (19, 19)])
-            empty_corner_indexes = [PLAYER_DEFAULT_CORNERS[player_color-1]]
-        else:
-            empty_corner_indexes = self.gather_empty_corner_indexes(player_color)
+        placements = self.get_valid_placements(round_count, player_color, player_pieces)
 
         all_valid_moves = {}
-        for piece_type in player_pieces:                # Loop through all pieces the player currently has
-            all_index_orientations = defaultdict(list)  # Valid indexes with their valid orientations dict created for every piece
-            for index in empty_corner_indexes:          # Loop through all indexes where a piece can be placed
-                for orientation in ORIENTATIONS:        # Loop through all possible orientations at an unshifted index
-                    for shifted_id in self.check_orientation_shifts(player_color, piece_type, index, orientation):  # NEW: Loop through all shifted offsets of a particular orientation, if none valid, nothing gets added
-                        all_index_orientations[index].append(orientation + str(shifted_id))                         # NEW: shifted_id is the cell(s) in piece where a shift is possible
-            if len(list(all_index_orientations.keys())) > 0:  # If there are valid indexes for the piece type..
-                all_valid_moves[piece_type] = all_index_orientations
+        for piece_id, x, y, orientation_id, shifted_id in placements.tolist():
+            piece_type = PIECE_NAMES[piece_id]
+            if piece_type not in all_valid_moves:  # Valid indexes with their valid orientations dict created for every piece
+                all_valid_moves[piece_type] = defaultdict(list)
+            all_valid_moves[piece_type][(x, y)].append(ORIENTATIONS[orientation_id] + str(shifted_id))  # shifted_id is the cell in piece used as index
 
         return all_valid_moves
 
+    def is_valid_move(self, round_count, player_color, player_pieces, piece_type, index, orientation):
+        ''' Checks a single move without generating every valid move. Any (orientation, shift) pair that covers
+            valid cells is accepted, not only the canonical one returned by get_all_valid_moves.
+        '''
+        if piece_type not in player_pieces or orientation[:-1] not in ORIENTATION_TO_ID or not orientation[-1].isdigit():
+            return False
+
+        piece_id = PIECE_NAME_TO_ID[piece_type]
+        shifted_id = int(orientation[-1])
+        if shifted_id >= PIECE_SIZES[piece_id] or len(index) != 2:
+            return False
+
+        x, y = index
+        if round_count == 0:
+            if (x, y) != PLAYER_DEFAULT_CORNERS[player_color-1]:
+                return False
+        elif not comp.is_corner_index(self.board_contents, player_color, x, y):
+            return False
+
+        offsets = SHIFTED_OFFSET_TABLE[piece_id, ORIENTATION_TO_ID[orientation[:-1]], shifted_id]
+        return comp.check_placement(self.board_contents, player_color, x, y, offsets, PIECE_SIZES[piece_id])
+
     def decode_color(self, player_color):
         ''' Converts int representatio of player color to string representation.
         '''
@@ -0,0 +1,108 @@
+'''
+Summary:
+Baseline Blokus opponents that work directly on the integer move-generation kernels,
+without building the action strings of every valid move. Every bot is a callable that
+takes a BlokusEnvironment state and a player number and returns one action string, so
+it can be used with BlokusEnvironment.next_state, with a BlokusClientEnvironment
+(see BlokusClientEnvironment.bot_action) or, through select_move, with a BlokusSearchState.
+'''
+
+from typing import Dict, Type
+
+import numpy as np
+
+from . import computation as comp
+from .board import SHIFTED_OFFSET_TABLE, PIECE_SIZES
+from .search import BlokusSearchState, Move
+
+
+class BlokusBot:
+    ''' Base class for baseline bots. Subclasses only need to score the valid placements.
+        The move with the highest score is played, ties are broken at random.
+    '''
+    def __init__(self, seed: int = None):
+        self.random_state = np.random.RandomState(seed)
+
+    def evaluate(self, board_contents: np.ndarray, player: int, placements: np.ndarray) -> np.ndarray:
+        ''' Scores every placement, higher is better.
+
+            Parameters
+            ----------
+            board_contents : np.ndarray
+                The current 20 by 20 board. It may be modified temporarily but must be restored.
+            player : int
+                The player choosing a move.
+            placements : np.ndarray
+                One (piece_id, x, y, orientation_id, shifted_id) row per valid move.
+
+            Returns
+            -------
+            np.ndarray
+                One score per placement.
+        '''
+        raise NotImplementedError
+
+    def choose(self, board_contents: np.ndarray, player: int, placements: np.ndarray) -> Move:
+        ''' Picks one of the placements, or None if there are no valid moves.
+        '''
+        if len(placements) == 0:
+            return None
+
+        scores = self.evaluate(board_contents, player, placements)
+        best = np.flatnonzero(scores == scores.max())
+        return tuple(placements[self.random_state.choice(best)])
+
+    def select_move(self, search_state: BlokusSearchState) -> Move:
+        ''' Picks a move for the player to move in a search state.
+        '''
+        return self.choose(search_state.board_contents, search_state.player, search_state.legal_moves())
+
+    def __call__(self, state: object, player: int) -> str:
+        ''' Picks an action string for a player in a BlokusEnvironment state.
+        '''
+        board, round_count, players = state
+        current_player = players[player]
+        placements = board.get_valid_placements(round_count, current_player.player_color, current_player.current_pieces)
+        move = self.choose(board.board_contents.copy(), player, placements)
+        return BlokusSearchState.move_to_action(move)
+
+
+class RandomBot(BlokusBot):
+    ''' Uniformly random choice among the distinct valid placements. '''
+    def evaluate(self, board_contents, player, placements):
+        return np.zeros(len(placements))
+
+
+class LargestPieceBot(BlokusBot):
+    ''' Always plays one of the largest pieces it can place. '''
+    def evaluate(self, board_contents, player, placements):
+        return PIECE_SIZES[placements[:, 0]].astype(np.float64)
+
+
+class GreedyCornerBot(BlokusBot):
+    ''' One move look-ahead that prefers large pieces, maximizes its own corner indexes
+        and minimizes the opponents' mobility by covering their corner indexes.
+    '''
+    def __init__(self, seed: int = None, size_weight: float = 1.0, corner_weight: float = 1.0,
+                 block_weight: float = 1.0):
+        super().__init__(seed)
+        self.size_weight = size_weight
+        self.corner_weight = corner_weight
+        self.block_weight = block_weight
+
+    def evaluate(self, board_contents, player, placements):
+        return comp.score_placements(board_contents, player + 1, placements, SHIFTED_OFFSET_TABLE, PIECE_SIZES,
+                                     self.size_weight, self.corner_weight, self.block_weight)
+
+
+BOTS: Dict[str, Type[BlokusBot]] = {
+    'random': RandomBot,
+    'largest_piece': LargestPieceBot,
+    'greedy_corner': GreedyCornerBot
+}
+
+
+def get_bot(name: str, *args, **kwargs) -> BlokusBot:
+    ''' Create a baseline bot by name. Available names are the keys of BOTS.
+    '''
+    return BOTS[name](*args, **kwargs)
@@ -5,12 +5,19 @@ Date: 3/15/19
 Summary:
 - Contains computation methods that board.py uses to
   manage valid move seeks and piece placement.
-- Methods use Numba with jit decorator that precompiles
-  types and makes runtime faster than normal python.
+- Methods use Numba with jit decorator that compiles
+  lazily and caches the machine code on disk, so only the
+  first process after an install pays the compilation cost.
+  Numba itself is only imported on the first call of a
+  jitted method (see jit below), so importing the board
+  stays cheap.
+- Piece orientations are looked up in integer offset tables
+  (see build_shifted_offset_table) instead of being rotated
+  with trigonometry on every query.
 '''
-from numba import jit
-import numpy as np
+import functools
 import math
+import numpy as np
 
 # def dummy_jit(*args, **kwargs):
 #     def dumdum(f):
@@ -20,8 +27,45 @@ import math
 # jit = dummy_jit
 
 
+_JIT_FUNCTIONS = {}  # key: function name, val: (python function, numba.jit options)
+
+
+def jit(**options):
+    ''' Deferred numba.jit. Importing numba takes longer than everything
+        else in the engine, so it is imported on the first call of any
+        decorated method. That call replaces every decorated method of
+        this module with its numba dispatcher, which is what jitted
+        methods calling each other resolve to when they compile.
+    '''
+    def decorate(function):
+        _JIT_FUNCTIONS[function.__name__] = (function, options)
+
+        @functools.wraps(function)
+        def compile_and_call(*args):
+            return _load_jit()[function.__name__](*args)
+
+        return compile_and_call
+
+    return decorate
+
+
+def _load_jit():
+    ''' Replaces every method decorated with jit by its numba dispatcher.
+        Returns the globals of this module.
+    '''
+    module_globals = globals()
+    if not _JIT_FUNCTIONS:
+        return module_globals
+
+    import numba
+    for name, (function, options) in _JIT_FUNCTIONS.items():
+        module_globals[name] = numba.jit(**options)(function)
+    _JIT_FUNCTIONS.clear()
+    return module_globals
+
+
 #### METHODS FOR check_shifted() ####
-@jit("UniTuple(int64, 2)(UniTuple(int64, 2), UniTuple(int64, 2), double)", nopython=True)  # "int(int64, ...)"
+@jit(nopython=True, cache=True)
 def rotate_by_deg(index, offset_point, angle):
     ''' Rotates each point on piece around the index by the given angle
     '''
@@ -34,7 +78,7 @@ def rotate_by_deg(index, offset_point, angle):
     return int(round(new_x, 1)), int(round(new_y, 1))
 
 
-@jit("UniTuple(int64, 2)(UniTuple(int64, 2), int64, int64)", nopython=True)
+@jit(nopython=True, cache=True)
 def flip_piece_x(index, x, y):
     ''' Takes the difference between index x and point x, then applies reverse
         difference to the index point. y stays the same
@@ -42,7 +86,7 @@ def flip_piece_x(index, x, y):
     return index[0] - (index[0] - x) * -1, y
 
 
-@jit("UniTuple(int64, 2)(UniTuple(int64, 2), int64, int64)", nopython=True)
+@jit(nopython=True, cache=True)
 def flip_piece_y(index, x, y):
     ''' Takes the difference between index y and point y, then applies reverse
         difference to the index point. x stays the same
@@ -50,7 +94,7 @@ def flip_piece_y(index, x, y):
     return x, index[1] + (y - index[1]) * -1
 
 
-@jit("UniTuple(int64, 2)(UniTuple(int64, 2), int64, int64, unicode_type)", nopython=True)
+@jit(nopython=True, cache=True)
 def rotate_piece(index, x_offset, y_offset, piece_orientation):
     ''' Description: Orients piece around the index point
         Parameters:
@@ -86,7 +130,7 @@ def rotate_piece(index, x_offset, y_offset, piece_orientation):
         return rotate_by_deg(index, (x_offset, y_offset), math.radians(0))
 
 
-@jit("boolean(int64[:, ::1], int64, int64, int64)", nopython=True)
+@jit(nopython=True, cache=True)
 def is_valid_adjacents(board_contents, y, x, player_color):
     ''' Description: Invalid coord if left, right, bottom, or top cell is the same color as the current player.
         Parameters:
@@ -119,7 +163,7 @@ def is_valid_adjacents(board_contents, y, x, player_color):
     return valid_adjacent
 
 
-@jit("boolean(int64[:, ::1], int64, int64, int64)", nopython=True)
+@jit(nopython=True, cache=True)
 def is_valid_cell(board_contents, x, y, player_color):
     ''' Description: If the cell x, y is empty, has no adjacent cells that are the same color,
                      and is not out of bounds of the 20x20 board, then the cell is valid 
@@ -142,7 +186,7 @@ def is_valid_cell(board_contents, x, y, player_color):
         return False
 
 
-@jit("int64[:](int64[:, ::1], int64, UniTuple(int64, 2), unicode_type, int64[:, :, ::1])", nopython=True)
+@jit(nopython=True, cache=True)
 def check_shifted(board_contents, player_color, index, orientation, shifted_offsets):
     ''' Description: Shifts entire piece N times were N is how many cells the piece takes up. 
                      All shifted offsets are checked for the current orientation to see whether
@@ -181,7 +225,7 @@ def check_shifted(board_contents, player_color, index, orientation, shifted_offs
 
 
 #### METHODS FOR get_all_shifted_offsets() ####
-@jit("int64[:, ::1](int64[:, ::1], unicode_type)", nopython=True)
+@jit(nopython=True, cache=True)
 def rotate_default_piece(offsets, orientation):
     ''' Description: Rotates the initial default piece orientation for shifting.
         Parameters:
@@ -202,7 +246,7 @@ def rotate_default_piece(offsets, orientation):
     return orientation_offsets_to_shift
 
 
-@jit("int64[:, ::1](int64[:, ::1], int64)", nopython=True)
+@jit(nopython=True, cache=True)
 def shift_offsets(offsets, offset_id):
     ''' Description: Shifts the offsets so that the offset that corresponds to the offset_id is the new index
         Parameters:
@@ -225,7 +269,7 @@ def shift_offsets(offsets, offset_id):
     return shifted_offsets
 
 
-@jit("int64[:, :, ::1](int64[:, ::1], unicode_type)", nopython=True)
+@jit(nopython=True, cache=True)
 def get_all_shifted_offsets(offsets, orientation):
     ''' Description: Compiles a list of all shifted offsets for a piece at a specific orientation.
                      Returns a numpy array, which is a list of a list of tuples which each contain 
@@ -244,3 +288,349 @@ def get_all_shifted_offsets(offsets, orientation):
         shifted_offsets[offset_id] = shift_offsets(orientation_offsets_to_shift, offset_id)
 
     return shifted_offsets
+
+
+#### PRECOMPUTED OFFSET TABLES ####
+def build_shifted_offset_table(piece_offsets, orientation_matrices):
+    ''' Description: Precomputes every shifted offset for every piece at every orientation.
+                     Entry [piece_id, orientation_id, shifted_id, offset_id] holds the (x, y) offset from the index
+                     of one cell of the piece. Pieces with fewer cells than the largest piece are padded with (0, 0).
+        Parameters:
+            piece_offsets: list of numpy arrays containing the default offsets of every piece type
+            orientation_matrices: numpy array of 2x2 integer matrices, one for every orientation
+        Returns:
+            numpy array of shape (num_pieces, num_orientations, max_size, max_size, 2) with all of the offsets
+            numpy array of shape (num_pieces,) holding the number of cells in every piece
+    '''
+    piece_sizes = np.array([len(offsets) for offsets in piece_offsets], np.int64)
+    max_size = piece_sizes.max()
+
+    table = np.zeros((len(piece_offsets), len(orientation_matrices), max_size, max_size, 2), np.int64)
+    for piece_id, offsets in enumerate(piece_offsets):
+        size = len(offsets)
+        shifted = offsets[np.newaxis, :, :] - offsets[:, np.newaxis, :]  # [shifted_id, offset_id, 2]
+        for orientation_id, matrix in enumerate(orientation_matrices):
+            table[piece_id, orientation_id, :size, :size] = shifted @ matrix.T
+
+    table.setflags(write=False)
+    piece_sizes.setflags(write=False)
+    return table, piece_sizes
+
+
+def build_canonical_table(shifted_offset_table, piece_sizes):
+    ''' Description: Marks the canonical (orientation, shift) for every distinct set of cells a piece can cover
+                     relative to its index. Symmetric pieces cover the same cells with several orientations and shifts,
+                     only the first of them in (orientation, shift) order is canonical.
+        Parameters:
+            shifted_offset_table: offset table created by build_shifted_offset_table
+            piece_sizes: number of cells in every piece
+        Returns:
+            boolean numpy array of shape (num_pieces, num_orientations, max_size), True for canonical entries
+    '''
+    num_pieces, num_orientations, max_size = shifted_offset_table.shape[:3]
+    canonical = np.zeros((num_pieces, num_orientations, max_size), np.bool_)
+
+    for piece_id in range(num_pieces):
+        size = piece_sizes[piece_id]
+        placements = set()  # covered cell sets seen so far
+        for orientation_id in range(num_orientations):
+            for shifted_id in range(size):
+                cells = frozenset(map(tuple, shifted_offset_table[piece_id, orientation_id, shifted_id, :size].tolist()))
+                if cells not in placements:
+                    placements.add(cells)
+                    canonical[piece_id, orientation_id, shifted_id] = True
+
+    canonical.setflags(write=False)
+    return canonical
+
+
+@jit(nopython=True, cache=True)
+def check_placement(board_contents, player_color, x, y, offsets, size):
+    ''' Description: Checks whether every cell of a single oriented and shifted piece can be placed at index (x, y).
+        Parameters:
+            board_contents: 20 by 20 numpy matrix representing the current state of the board
+            player_color: int representing current player color
+            x: int x coord of the index
+            y: int y coord of the index
+            offsets: numpy array of offsets for one piece, orientation and shift (one entry of the offset table)
+            size: number of cells in the piece
+        Returns:
+            bool indicating whether the piece fits
+    '''
+    for offset_id in range(size):
+        if not is_valid_cell(board_contents, x + offsets[offset_id, 0], y + offsets[offset_id, 1], player_color):
+            return False
+    return True
+
+
+@jit(nopython=True, cache=True)
+def is_corner_index(board_contents, player_color, x, y):
+    ''' Description: An empty cell is a corner index if it touches a corner of the player's color but none of its sides.
+        Parameters:
+            board_contents: 20 by 20 numpy matrix representing the current state of the board
+            player_color: int representing current player color
+            x: int x coord of the cell
+            y: int y coord of the cell
+        Returns:
+            bool indicating whether a piece may be placed with its index on this cell
+    '''
+    if x < 0 or x >= 20 or y < 0 or y >= 20:
+        return False
+    if board_contents[y, x] != 0 or not is_valid_adjacents(board_contents, y, x, player_color):
+        return False
+
+    if y != 0 and x != 19 and board_contents[y - 1, x + 1] == player_color:
+        return True
+    if y != 0 and x != 0 and board_contents[y - 1, x - 1] == player_color:
+        return True
+    if y != 19 and x != 19 and board_contents[y + 1, x + 1] == player_color:
+        return True
+    if y != 19 and x != 0 and board_contents[y + 1, x - 1] == player_color:
+        return True
+
+    return False
+
+
+@jit(nopython=True, cache=True)
+def find_corner_indexes(board_contents, player_color):
+    ''' Description: Finds every corner index of the player's color (see is_corner_index).
+        Parameters:
+            board_contents: 20 by 20 numpy matrix representing the current state of the board
+            player_color: int representing current player color
+        Returns:
+            numpy array of (x, y) coords in row-major order
+    '''
+    corners = np.zeros((400, 2), np.int64)
+    num_corners = 0
+    for y in range(20):
+        for x in range(20):
+            if is_corner_index(board_contents, player_color, x, y):
+                corners[num_corners, 0] = x
+                corners[num_corners, 1] = y
+                num_corners += 1
+
+    return corners[:num_corners]
+
+
+@jit(nopython=True, cache=True)
+def find_valid_placements(board_contents, player_color, corner_indexes, piece_ids,
+                          shifted_offset_table, piece_sizes, canonical_table):
+    ''' Description: Collects every distinct valid placement of the given pieces on the given corner indexes.
+                     Placements are ordered by piece, then index, then orientation, then shift.
+                     A set of covered cells is only reported once: with its canonical orientation and shift,
+                     at the first corner index it covers.
+        Parameters:
+            board_contents: 20 by 20 numpy matrix representing the current state of the board
+            player_color: int representing current player color
+            corner_indexes: numpy array of (x, y) coords where the index of a piece may be placed
+            piece_ids: numpy array of the piece ids the player still owns
+            shifted_offset_table: offset table created by build_shifted_offset_table
+            piece_sizes: number of cells in every piece
+            canonical_table: boolean table created by build_canonical_table
+        Returns:
+            numpy array with one (piece_id, x, y, orientation_id, shifted_id) row per valid placement
+    '''
+    num_orientations = shifted_offset_table.shape[1]
+    max_rows = len(piece_ids) * len(corner_indexes) * num_orientations * shifted_offset_table.shape[2]
+    placements = np.empty((max_rows, 5), np.int64)
+    num_placements = 0
+
+    # Position of every corner index in the search order, used to skip placements already found from an earlier corner
+    corner_order = np.full((20, 20), len(corner_indexes), np.int64)
+    for corner_id in range(len(corner_indexes)):
+        corner_order[corner_indexes[corner_id, 1], corner_indexes[corner_id, 0]] = corner_id
+
+    for piece_id in piece_ids:
+        size = piece_sizes[piece_id]
+        for corner_id in range(len(corner_indexes)):
+            x = corner_indexes[corner_id, 0]
+            y = corner_indexes[corner_id, 1]
+            for orientation_id in range(num_orientations):
+                for shifted_id in range(size):
+                    if not canonical_table[piece_id, orientation_id, shifted_id]:
+                        continue
+
+                    offsets = shifted_offset_table[piece_id, orientation_id, shifted_id]
+                    if not check_placement(board_contents, player_color, x, y, offsets, size):
+                        continue
+
+                    first_corner = True
+                    for offset_id in range(size):
+                        if corner_order[y + offsets[offset_id, 1], x + offsets[offset_id, 0]] < corner_id:
+                            first_corner = False
+
+                    if first_corner:
+                        placements[num_placements, 0] = piece_id
+                        placements[num_placements, 1] = x
+                        placements[num_placements, 2] = y
+                        placements[num_placements, 3] = orientation_id
+                        placements[num_placements, 4] = shifted_id
+                        num_placements += 1
+
+    return placements[:num_placements]
+
+
+#### METHODS FOR search.BlokusSearchState ####
+@jit(nopython=True, cache=True)
+def toggle_piece(board_contents, diagonal_counts, side_counts, zobrist_keys, player_color, x, y, offsets, size, place):
+    ''' Description: Places or removes a single piece and incrementally updates the corner frontier counters.
+                     Removing a piece is the exact inverse of placing it, so both run in O(piece size).
+        Parameters:
+            board_contents: 20 by 20 numpy matrix representing the current state of the board
+            diagonal_counts: 20 by 20 numpy matrix counting the player's cells touching each cell diagonally
+            side_counts: 20 by 20 numpy matrix counting the player's cells touching each cell on a side
+            zobrist_keys: numpy array of shape (400, 5) holding a random key for every (cell, color)
+            player_color: int representing current player color
+            x: int x coord of the index
+            y: int y coord of the index
+            offsets: numpy array of offsets for one piece, orientation and shift (one entry of the offset table)
+            size: number of cells in the piece
+            place: True to place the piece, False to remove it
+        Returns:
+            the zobrist key difference to xor into the position hash
+    '''
+    delta = 1 if place else -1
+    color = player_color if place else 0
+    hash_delta = np.uint64(0)
+
+    for offset_id in range(size):
+        cell_x = x + offsets[offset_id, 0]
+        cell_y = y + offsets[offset_id, 1]
+        board_contents[cell_y, cell_x] = color
+        hash_delta ^= zobrist_keys[cell_y * 20 + cell_x, player_color]
+
+        for dy in range(-1, 2):
+            for dx in range(-1, 2):
+                if dx == 0 and dy == 0:
+                    continue
+                nx = cell_x + dx
+                ny = cell_y + dy
+                if nx < 0 or nx >= 20 or ny < 0 or ny >= 20:
+                    continue
+                if dx == 0 or dy == 0:
+                    side_counts[ny, nx] += delta
+                else:
+                    diagonal_counts[ny, nx] += delta
+
+    return hash_delta
+
+
+@jit(nopython=True, cache=True)
+def has_valid_placement(board_contents, player_color, corner_indexes, piece_ids, shifted_offset_table, piece_sizes):
+    ''' Description: Whether any of the given pieces fits on any of the given corner indexes.
+                     Same as checking find_valid_placements for an empty result, but stops at the first placement.
+        Parameters:
+            board_contents: 20 by 20 numpy matrix representing the current state of the board
+            player_color: int representing current player color
+            corner_indexes: numpy array of (x, y) coords where the index of a piece may be placed
+            piece_ids: numpy array of the piece ids the player still owns
+            shifted_offset_table: offset table created by build_shifted_offset_table
+            piece_sizes: number of cells in every piece
+        Returns:
+            True if there is at least one valid placement
+    '''
+    num_orientations = shifted_offset_table.shape[1]
+    for piece_id in piece_ids:
+        size = piece_sizes[piece_id]
+        for corner_id in range(len(corner_indexes)):
+            x = corner_indexes[corner_id, 0]
+            y = corner_indexes[corner_id, 1]
+            for orientation_id in range(num_orientations):
+                for shifted_id in range(size):
+                    if check_placement(board_contents, player_color, x, y,
+                                       shifted_offset_table[piece_id, orientation_id, shifted_id], size):
+                        return True
+
+    return False
+
+
+@jit(nopython=True, cache=True)
+def frontier_indexes(board_contents, diagonal_counts, side_counts):
+    ''' Description: Same result as find_corner_indexes, but read from the incrementally maintained counters.
+        Parameters:
+            board_contents: 20 by 20 numpy matrix representing the current state of the board
+            diagonal_counts: 20 by 20 numpy matrix counting the player's cells touching each cell diagonally
+            side_counts: 20 by 20 numpy matrix counting the player's cells touching each cell on a side
+        Returns:
+            numpy array of (x, y) coords in row-major order
+    '''
+    corners = np.zeros((400, 2), np.int64)
+    num_corners = 0
+    for y in range(20):
+        for x in range(20):
+            if board_contents[y, x] == 0 and diagonal_counts[y, x] > 0 and side_counts[y, x] == 0:
+                corners[num_corners, 0] = x
+                corners[num_corners, 1] = y
+                num_corners += 1
+
+    return corners[:num_corners]
+
+
+#### METHODS FOR bots ####
+@jit(nopython=True, cache=True)
+def score_placements(board_contents, player_color, placements, shifted_offset_table, piece_sizes,
+                     size_weight, corner_weight, block_weight):
+    ''' Description: Greedy evaluation of every placement. Each piece is placed temporarily on the board to count
+                     the corner indexes it creates or destroys for the player and the opponent corner indexes it covers.
+                     The board is restored before returning.
+        Parameters:
+            board_contents: 20 by 20 numpy matrix representing the current state of the board
+            player_color: int representing current player color
+            placements: numpy array of (piece_id, x, y, orientation_id, shifted_id) rows, see find_valid_placements
+            shifted_offset_table: offset table created by build_shifted_offset_table
+            piece_sizes: number of cells in every piece
+            size_weight: weight of the number of cells in the piece
+            corner_weight: weight of the change in the player's number of corner indexes
+            block_weight: weight of the number of opponent corner indexes covered by the piece
+        Returns:
+            numpy array of float scores, one per placement
+    '''
+    own_corners = np.zeros((20, 20), np.bool_)
+    opponent_corners = np.zeros((20, 20), np.int64)
+    for y in range(20):
+        for x in range(20):
+            own_corners[y, x] = is_corner_index(board_contents, player_color, x, y)
+            for color in range(1, 5):
+                if color != player_color and is_corner_index(board_contents, color, x, y):
+                    opponent_corners[y, x] += 1
+
+    visited = np.full((20, 20), -1, np.int64)  # Placement that last looked at each cell, avoids counting cells twice
+    scores = np.zeros(len(placements), np.float64)
+
+    for placement_id in range(len(placements)):
+        piece_id = placements[placement_id, 0]
+        x = placements[placement_id, 1]
+        y = placements[placement_id, 2]
+        offsets = shifted_offset_table[piece_id, placements[placement_id, 3], placements[placement_id, 4]]
+        size = piece_sizes[piece_id]
+
+        blocked = 0
+        for offset_id in range(size):
+            cell_x = x + offsets[offset_id, 0]
+            cell_y = y + offsets[offset_id, 1]
+            board_contents[cell_y, cell_x] = player_color
+            blocked += opponent_corners[cell_y, cell_x]
+
+        corner_change = 0
+        for offset_id in range(size):
+            cell_x = x + offsets[offset_id, 0]
+            cell_y = y + offsets[offset_id, 1]
+            for dy in range(-1, 2):
+                for dx in range(-1, 2):
+                    nx = cell_x + dx
+                    ny = cell_y + dy
+                    if nx < 0 or nx >= 20 or ny < 0 or ny >= 20 or visited[ny, nx] == placement_id:
+                        continue
+                    visited[ny, nx] = placement_id
+                    is_corner = is_corner_index(board_contents, player_color, nx, ny)
+                    if is_corner and not own_corners[ny, nx]:
+                        corner_change += 1
+                    elif own_corners[ny, nx] and not is_corner:
+                        corner_change -= 1
+
+        for offset_id in range(size):
+            board_contents[y + offsets[offset_id, 1], x + offsets[offset_id, 0]] = 0
+
+        scores[placement_id] = size_weight * size + corner_weight * corner_change + block_weight * blocked
+
+    return scores
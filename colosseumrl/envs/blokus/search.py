@@ -0,0 +1,301 @@
+'''
+Summary:
+Mutable Blokus state for tree search. Instead of copying the whole state for every
+node like BlokusEnvironment.next_state, moves are applied in place and reverted with
+an undo stack. Every move only touches the cells of the placed piece, so both
+apply_move and undo_move run in O(piece size). The corner frontier of every player
+and a zobrist hash of the position are updated incrementally along the way.
+BlokusEnvironment.make_move and unmake_move play on it, so colosseumrl.MCTS searches Blokus in place.
+
+Moves are the integer rows returned by legal_moves:
+(piece_id, x, y, orientation_id, shifted_id), or None for a pass.
+'''
+
+import random
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from colosseumrl.zobrist import ZobristTable
+from . import computation as comp
+from .ai import AI, GAME_PIECE_VALUES
+from .board import Board, PIECE_NAMES, PIECE_NAME_TO_ID, ORIENTATIONS, ORIENTATION_TO_ID, PLAYER_DEFAULT_CORNERS, \
+    SHIFTED_OFFSET_TABLE, PIECE_SIZES, CANONICAL_PLACEMENTS
+
+NUM_PLAYERS = 4
+NUM_PIECES = len(PIECE_NAMES)
+FULL_INVENTORY = (1 << NUM_PIECES) - 1
+
+# Keys of the zobrist hash, seeded so that hashes are comparable between processes.
+# The hash is kept as a Python int, so every key is converted with int before it is XORed in.
+ZOBRIST = ZobristTable((20, 20), NUM_PLAYERS + 1, seed=3)
+ZOBRIST_PIECE_KEYS = ZobristTable.extra_keys((NUM_PLAYERS, NUM_PIECES), seed=4)
+ZOBRIST_TURN_KEYS = ZobristTable.extra_keys(NUM_PLAYERS, seed=5)
+
+Move = Optional[Tuple[int, int, int, int, int]]
+
+# Parts of the action strings of every piece, index and (orientation, shift), joined to convert moves into actions
+ACTION_PIECES = [name + ";" for name in PIECE_NAMES]
+ACTION_INDEXES = [["{};".format((x, y)) for y in range(20)] for x in range(20)]
+ACTION_ORIENTATIONS = [[orientation + str(shifted_id) for shifted_id in range(SHIFTED_OFFSET_TABLE.shape[2])]
+                       for orientation in ORIENTATIONS]
+
+
+def _piece_score(inventory: int, piece_id: int) -> int:
+    ''' Points earned by playing piece_id when inventory is what remains afterwards, same as AI.update_player.
+    '''
+    score = GAME_PIECE_VALUES[PIECE_NAMES[piece_id]]
+    if inventory == 0:
+        score += 20 if PIECE_NAMES[piece_id] == "monomino1" else 15
+    return score
+
+
+class BlokusSearchState:
+    ''' A single mutable Blokus position with make / unmake moves.
+
+        Use BlokusSearchState.from_state to start searching from a BlokusEnvironment state
+        and to_state to convert a position back.
+    '''
+    def __init__(self):
+        self.board_contents = np.zeros((20, 20), dtype=np.int64)
+        self.diagonal_counts = np.zeros((NUM_PLAYERS, 20, 20), dtype=np.int64)
+        self.side_counts = np.zeros((NUM_PLAYERS, 20, 20), dtype=np.int64)
+        self.inventories = [FULL_INVENTORY] * NUM_PLAYERS
+        self.scores = [0] * NUM_PLAYERS
+        self.round_count = 0
+        self.player = 0
+        self.hash = int(ZOBRIST_TURN_KEYS[0])
+
+        # Every entry holds what is needed to revert one move: (player, move, previous score)
+        self._undo_stack: List[Tuple[int, Move, int]] = []
+
+    @classmethod
+    def from_state(cls, state: object, player: int) -> "BlokusSearchState":
+        ''' Creates a search state from a BlokusEnvironment state, with player to move.
+        '''
+        board, round_count, players = state
+        search_state = cls()
+        search_state.board_contents[:] = board.board_contents
+        search_state.round_count = round_count
+        search_state.player = player
+        search_state.scores = [p.player_score for p in players]
+        search_state.inventories = [sum(1 << PIECE_NAME_TO_ID[piece] for piece in p.current_pieces) for p in players]
+
+        position_hash = int(ZOBRIST_TURN_KEYS[player])
+        for p in range(NUM_PLAYERS):
+            for piece_id in range(NUM_PIECES):
+                if not (search_state.inventories[p] >> piece_id) & 1:
+                    position_hash ^= int(ZOBRIST_PIECE_KEYS[p, piece_id])
+
+        # Rebuild the frontier counters by placing every occupied cell as a monomino on an empty board
+        board_contents = np.zeros((20, 20), dtype=np.int64)
+        monomino = SHIFTED_OFFSET_TABLE[PIECE_NAME_TO_ID["monomino1"], 0, 0]
+        for y, x in zip(*np.nonzero(board.board_contents)):
+            color = board.board_contents[y, x]
+            position_hash ^= int(comp.toggle_piece(board_contents, search_state.diagonal_counts[color - 1],
+                                                   search_state.side_counts[color - 1], ZOBRIST.keys,
+                                                   color, x, y, monomino, 1, True))
+
+        search_state.hash = position_hash
+        return search_state
+
+    def to_state(self) -> object:
+        ''' Converts this position back into a BlokusEnvironment state.
+        '''
+        board = Board()
+        board.board_contents[:] = self.board_contents
+
+        players = []
+        for p in range(NUM_PLAYERS):
+            ai = AI(board, p + 1)
+            ai.current_pieces = [name for piece_id, name in enumerate(PIECE_NAMES) if (self.inventories[p] >> piece_id) & 1]
+            ai.player_score = self.scores[p]
+            players.append(ai)
+
+        return board, self.round_count, players
+
+    def copy(self) -> "BlokusSearchState":
+        ''' Independent copy of this position, including the moves it can undo.
+        '''
+        search_state = BlokusSearchState.__new__(BlokusSearchState)
+        search_state.board_contents = self.board_contents.copy()
+        search_state.diagonal_counts = self.diagonal_counts.copy()
+        search_state.side_counts = self.side_counts.copy()
+        search_state.inventories = list(self.inventories)
+        search_state.scores = list(self.scores)
+        search_state.round_count = self.round_count
+        search_state.player = self.player
+        search_state.hash = self.hash
+        search_state._undo_stack = list(self._undo_stack)
+        return search_state
+
+    @property
+    def depth(self) -> int:
+        ''' Number of moves that can currently be undone.
+        '''
+        return len(self._undo_stack)
+
+    def piece_ids(self, player: int = None) -> np.ndarray:
+        ''' Ids of the pieces still owned by a player (default is the player to move).
+        '''
+        inventory = self.inventories[self.player if player is None else player]
+        return np.array([piece_id for piece_id in range(NUM_PIECES) if (inventory >> piece_id) & 1], dtype=np.int64)
+
+    def corner_indexes(self, player: int = None) -> np.ndarray:
+        ''' Cells where the index of a piece may be placed by a player (default is the player to move).
+        '''
+        player = self.player if player is None else player
+        if self.round_count == 0:
+            return np.array([PLAYER_DEFAULT_CORNERS[player]], dtype=np.int64)
+
+        return comp.frontier_indexes(self.board_contents, self.diagonal_counts[player], self.side_counts[player])
+
+    def legal_moves(self, player: int = None) -> np.ndarray:
+        ''' Every distinct valid placement for a player (default is the player to move).
+
+            Returns
+            -------
+            numpy array with one (piece_id, x, y, orientation_id, shifted_id) row per move,
+            in the same order as BlokusEnvironment.valid_actions.
+        '''
+        player = self.player if player is None else player
+        return comp.find_valid_placements(self.board_contents, player + 1, self.corner_indexes(player),
+                                          self.piece_ids(player), SHIFTED_OFFSET_TABLE, PIECE_SIZES,
+                                          CANONICAL_PLACEMENTS)
+
+    def has_moves(self, player: int = None) -> bool:
+        ''' Whether a player has at least one valid placement (default is the player to move).
+        '''
+        player = self.player if player is None else player
+        return comp.has_valid_placement(self.board_contents, player + 1, self.corner_indexes(player),
+                                        self.piece_ids(player), SHIFTED_OFFSET_TABLE, PIECE_SIZES)
+
+    def is_terminal(self) -> bool:
+        ''' The game is over once no player can place another piece.
+        '''
+        return not any(self.has_moves(p) for p in range(NUM_PLAYERS))
+
+    def ends_game(self, move: Move) -> bool:
+        ''' Whether playing move for the player to move ends the game. Same rule as BlokusEnvironment.next_state:
+            no player has a valid placement left on the board before the move, given the pieces they hold after it.
+        '''
+        player = self.player
+
+        # Check the other players first, since one of them usually still has moves
+        if any(self.has_moves(other) for other in range(NUM_PLAYERS) if other != player):
+            return False
+
+        if move is None:
+            return not self.has_moves(player)
+
+        piece_bit = 1 << int(move[0])
+        self.inventories[player] ^= piece_bit  # Temporarily remove the piece being played
+        terminal = not self.has_moves(player)
+        self.inventories[player] ^= piece_bit
+        return terminal
+
+    def set_player(self, player: int):
+        ''' Hands the turn to player without playing a move.
+        '''
+        self.hash ^= int(ZOBRIST_TURN_KEYS[self.player]) ^ int(ZOBRIST_TURN_KEYS[player])
+        self.player = player
+
+    def _toggle(self, player: int, move: Sequence[int], place: bool):
+        piece_id, x, y, orientation_id, shifted_id = move
+        self.hash ^= int(comp.toggle_piece(self.board_contents, self.diagonal_counts[player], self.side_counts[player],
+                                           ZOBRIST.keys, player + 1, x, y,
+                                           SHIFTED_OFFSET_TABLE[piece_id, orientation_id, shifted_id],
+                                           PIECE_SIZES[piece_id], place))
+        self.inventories[player] ^= 1 << piece_id
+        self.hash ^= int(ZOBRIST_PIECE_KEYS[player, piece_id])
+
+    def _advance_turn(self, step: int):
+        self.hash ^= int(ZOBRIST_TURN_KEYS[self.player])
+        if step > 0 and self.player == NUM_PLAYERS - 1:
+            self.round_count += 1
+        self.player = (self.player + step) % NUM_PLAYERS
+        if step < 0 and self.player == NUM_PLAYERS - 1:
+            self.round_count -= 1
+        self.hash ^= int(ZOBRIST_TURN_KEYS[self.player])
+
+    def apply_move(self, move: Move):
+        ''' Plays a move for the player to move and passes the turn. None is a pass.
+
+            The move is not validated, it must come from legal_moves.
+        '''
+        player = self.player
+        previous_score = self.scores[player]
+
+        if move is not None:
+            move = tuple(int(value) for value in move)
+            self._toggle(player, move, True)
+            self.scores[player] += _piece_score(self.inventories[player], move[0])
+
+        self._undo_stack.append((player, move, previous_score))
+        self._advance_turn(1)
+
+    def undo_move(self) -> Move:
+        ''' Reverts the last applied move and returns it.
+        '''
+        player, move, score = self._undo_stack.pop()
+        self._advance_turn(-1)
+
+        if move is not None:
+            self._toggle(player, move, False)
+            self.scores[player] = score
+
+        return move
+
+    @staticmethod
+    def move_to_action(move: Move) -> str:
+        ''' Converts an integer move into a BlokusEnvironment action string.
+        '''
+        if move is None:
+            return ""
+
+        piece_id, x, y, orientation_id, shifted_id = map(int, move)
+        return ACTION_PIECES[piece_id] + ACTION_INDEXES[x][y] + ACTION_ORIENTATIONS[orientation_id][shifted_id]
+
+    @staticmethod
+    def moves_to_actions(moves: np.ndarray) -> List[str]:
+        ''' Converts the rows returned by legal_moves into BlokusEnvironment action strings, same as move_to_action.
+        '''
+        return [ACTION_PIECES[piece_id] + ACTION_INDEXES[x][y] + ACTION_ORIENTATIONS[orientation_id][shifted_id]
+                for piece_id, x, y, orientation_id, shifted_id in moves.tolist()]
+
+    @staticmethod
+    def action_to_move(action: str) -> Move:
+        ''' Converts a BlokusEnvironment action string into an integer move.
+        '''
+        if action == "":
+            return None
+
+        piece_type, index, orientation = action.split(";")
+        x, y = map(int, index.replace('(', '').replace(')', '').split(','))
+        return PIECE_NAME_TO_ID[piece_type], x, y, ORIENTATION_TO_ID[orientation[:-1]], int(orientation[-1])
+
+
+def check_make_undo(num_moves: int = 40, seed: int = 0):
+    ''' Plays random legal moves from a new game and undoes them all again, asserting along the way that
+        the incremental hash matches a hash rebuilt from scratch, and that undoing every move restores the
+        starting board, scores and hash. Raises AssertionError on the first mismatch.
+    '''
+    rng = random.Random(seed)
+    search_state = BlokusSearchState()
+    start_hash = search_state.hash
+    start_board = search_state.board_contents.copy()
+
+    for _ in range(num_moves):
+        moves = search_state.legal_moves()
+        search_state.apply_move(moves[rng.randrange(len(moves))] if len(moves) > 0 else None)
+
+        rebuilt = BlokusSearchState.from_state(search_state.to_state(), search_state.player)
+        assert rebuilt.hash == search_state.hash, "Incremental hash differs from the rebuilt hash"
+
+    while search_state.depth > 0:
+        search_state.undo_move()
+
+    assert search_state.hash == start_hash, "Hash did not return to its starting value"
+    assert np.array_equal(search_state.board_contents, start_board), "Board did not return to its starting value"
+    assert search_state.scores == [0] * NUM_PLAYERS and search_state.inventories == [FULL_INVENTORY] * NUM_PLAYERS
+    assert search_state.player == 0 and search_state.round_count == 0
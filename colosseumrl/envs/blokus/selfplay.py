@@ -0,0 +1,287 @@
+'''
+Summary:
+Offline Blokus self-play. Games are played entirely in-process on a BlokusSearchState,
+without BlokusEnvironment.next_state copies or any networking, and are spread across a
+process pool. Finished games are streamed back as compact numpy batches.
+
+Agents are either baseline bots (anything with a select_move(search_state) method,
+see bots.py) or plain callables taking a BlokusEnvironment state and a player number
+and returning an action string.
+
+Run `python -m colosseumrl.envs.blokus.selfplay -h` for the command line interface.
+'''
+
+import argparse
+import multiprocessing as mp
+import random
+import time
+from typing import Callable, Iterator, List, NamedTuple, Optional, Sequence, Union
+
+import numpy as np
+
+from .bots import BlokusBot, BOTS, get_bot
+from .search import BlokusSearchState, NUM_PLAYERS
+
+from colosseumrl.rl_logging import get_logger
+
+logger = get_logger()
+
+Agent = Union[BlokusBot, Callable[[object, int], str]]
+
+PASS_MOVE = (-1, -1, -1, -1, -1)
+
+
+class SelfPlayBatch(NamedTuple):
+    ''' Trajectories of several finished games. Steps of game i are steps[game_offsets[i]:game_offsets[i + 1]].
+    '''
+    moves: np.ndarray         # (steps, 5) int16: (piece_id, x, y, orientation_id, shifted_id), -1 for a pass
+    players: np.ndarray       # (steps,) int8: the player that took each step
+    rewards: np.ndarray       # (steps,) float32: reward given by BlokusEnvironment.next_state for each step
+    game_offsets: np.ndarray  # (games + 1,) int64
+    seats: np.ndarray         # (games, 4) int8: index of the agent playing as each player
+    scores: np.ndarray        # (games, 4) int16: final score of each player
+    rankings: np.ndarray      # (games, 4) int8: final ranking of each player, same as compute_ranking
+    seeds: np.ndarray         # (games,) int64: seed used for each game
+
+    @property
+    def num_games(self) -> int:
+        return len(self.seeds)
+
+    @staticmethod
+    def concatenate(batches: Sequence["SelfPlayBatch"]) -> "SelfPlayBatch":
+        ''' Merges several batches into a single one.
+        '''
+        offsets = [np.zeros(1, np.int64)]
+        total_steps = 0
+        for batch in batches:
+            offsets.append(batch.game_offsets[1:] + total_steps)
+            total_steps += batch.game_offsets[-1]
+
+        fields = {name: np.concatenate([getattr(batch, name) for batch in batches])
+                  for name in SelfPlayBatch._fields if name != 'game_offsets'}
+        return SelfPlayBatch(game_offsets=np.concatenate(offsets), **fields)
+
+
+def _seed_agents(agents: Sequence[Agent], seed: int):
+    random.seed(seed)
+    np.random.seed(seed % (2 ** 32))
+    for i, agent in enumerate(agents):
+        if isinstance(agent, BlokusBot):
+            agent.random_state.seed((seed + i) % (2 ** 32))
+
+
+def _select_move(agent: Agent, search_state: BlokusSearchState):
+    if hasattr(agent, 'select_move'):
+        return agent.select_move(search_state)
+
+    action = agent(search_state.to_state(), search_state.player)
+    return BlokusSearchState.action_to_move(action)
+
+
+def play_game(agents: Sequence[Agent], seed: int = 0):
+    ''' Plays a single game between four agents, agents[i] playing as player i.
+
+        The game ends at the same step as it would with BlokusEnvironment.next_state:
+        once no player has a valid move left on the board before the last move,
+        given the pieces they hold after it.
+
+        Returns
+        -------
+        moves : List[Tuple[int, ...]]
+            Every move played, PASS_MOVE for a pass.
+        players : List[int]
+            The player of every move.
+        rewards : List[float]
+            The reward of every move.
+        scores : List[int]
+            The final score of every player.
+        winners : List[int]
+            The players with the highest final score.
+    '''
+    _seed_agents(agents, seed)
+
+    search_state = BlokusSearchState()
+    out_of_moves = [False] * NUM_PLAYERS
+    moves, players, rewards = [], [], []
+
+    while True:
+        player = search_state.player
+
+        # After the first round, a player without moves never gets them back, so they are not checked again
+        remember = search_state.round_count > 0
+
+        move = None
+        if not out_of_moves[player] and search_state.has_moves():
+            move = _select_move(agents[player], search_state)
+        out_of_moves[player] = remember and move is None
+
+        # Check the other players on the current board first, since one of them usually still has moves
+        terminal = True
+        for other in range(NUM_PLAYERS):
+            if other != player and not out_of_moves[other]:
+                if search_state.has_moves(other):
+                    terminal = False
+                    break
+                out_of_moves[other] = remember
+
+        if terminal and move is not None:
+            piece_bit = 1 << int(move[0])
+            search_state.inventories[player] ^= piece_bit  # Temporarily remove the piece being played
+            terminal = not search_state.has_moves()
+            search_state.inventories[player] ^= piece_bit
+
+        search_state.apply_move(move)
+        moves.append(PASS_MOVE if move is None else move)
+        players.append(player)
+
+        if terminal:
+            # Same reward as BlokusEnvironment.next_state: rank of the player's score in ascending order
+            scores = list(search_state.scores)
+            sorted_scores = sorted(enumerate(scores), key=lambda x: x[1])
+            rewards.append(float(sorted_scores.index((player, scores[player]))))
+            winners = [p for p in range(NUM_PLAYERS) if scores[p] == max(scores)]
+            return moves, players, rewards, scores, winners
+
+        rewards.append(0.0)
+
+
+def play_games(agents: Sequence[Agent], seeds: Sequence[int], rotate_seats: bool = True) -> SelfPlayBatch:
+    ''' Plays several games in the current process and packs them into a single batch.
+
+        Parameters
+        ----------
+        agents : Sequence[Agent]
+            One or more agents. Seats are filled by cycling through the agents.
+        seeds : Sequence[int]
+            One seed per game.
+        rotate_seats : bool
+            Shift the seat assignment by one for every consecutive seed, so that each agent plays every color.
+    '''
+    all_moves, all_players, all_rewards = [], [], []
+    game_offsets = [0]
+    seats = np.zeros((len(seeds), NUM_PLAYERS), np.int8)
+    scores = np.zeros((len(seeds), NUM_PLAYERS), np.int16)
+    rankings = np.zeros((len(seeds), NUM_PLAYERS), np.int8)
+
+    for game, seed in enumerate(seeds):
+        rotation = seed if rotate_seats else 0
+        seats[game] = [(player + rotation) % len(agents) for player in range(NUM_PLAYERS)]
+
+        moves, players, rewards, game_scores, winners = play_game([agents[i] for i in seats[game]], seed)
+        all_moves.extend(moves)
+        all_players.extend(players)
+        all_rewards.extend(rewards)
+        game_offsets.append(game_offsets[-1] + len(moves))
+
+        scores[game] = game_scores
+        rankings[game] = [0 if player in winners else 1 for player in range(NUM_PLAYERS)]
+
+    return SelfPlayBatch(moves=np.array(all_moves, np.int16).reshape(-1, 5),
+                         players=np.array(all_players, np.int8),
+                         rewards=np.array(all_rewards, np.float32),
+                         game_offsets=np.array(game_offsets, np.int64),
+                         seats=seats,
+                         scores=scores,
+                         rankings=rankings,
+                         seeds=np.array(seeds, np.int64))
+
+
+# Agents are sent to every worker once with the pool initializer instead of with every task
+_worker_agents: Optional[List[Agent]] = None
+_worker_rotate_seats = True
+
+
+def _init_worker(agents: Sequence[Agent], rotate_seats: bool):
+    global _worker_agents, _worker_rotate_seats
+    _worker_agents = list(agents)
+    _worker_rotate_seats = rotate_seats
+
+
+def _play_games_worker(seeds: Sequence[int]) -> SelfPlayBatch:
+    return play_games(_worker_agents, seeds, _worker_rotate_seats)
+
+
+class SelfPlayRunner:
+    ''' Spreads Blokus self-play games over a pool of worker processes.
+
+        Every worker plays batch_size games at a time and sends them back as one SelfPlayBatch.
+        Games are independent, so throughput grows with the number of workers.
+    '''
+    def __init__(self, agents: Sequence[Agent], num_workers: int = None, batch_size: int = 16,
+                 rotate_seats: bool = True, start_method: str = None):
+        self.agents = list(agents)
+        self.num_workers = mp.cpu_count() if num_workers is None else num_workers
+        self.batch_size = batch_size
+        self.rotate_seats = rotate_seats
+        self.context = mp.get_context(start_method)
+
+        self.games_played = 0
+        self.elapsed_time = 0.0
+
+    @property
+    def games_per_second(self) -> float:
+        return self.games_played / self.elapsed_time if self.elapsed_time > 0 else 0.0
+
+    def run(self, num_games: int, first_seed: int = 0) -> Iterator[SelfPlayBatch]:
+        ''' Plays num_games games, yielding every batch as soon as a worker finishes it.
+            Batches may arrive out of order, use SelfPlayBatch.seeds to identify games.
+        '''
+        seeds = np.arange(first_seed, first_seed + num_games)
+        chunks = [seeds[i:i + self.batch_size].tolist() for i in range(0, num_games, self.batch_size)]
+
+        start_time = time.time() - self.elapsed_time
+        if self.num_workers <= 1:
+            batches = map(lambda chunk: play_games(self.agents, chunk, self.rotate_seats), chunks)
+            for batch in batches:
+                yield self._record(batch, start_time)
+            return
+
+        with self.context.Pool(self.num_workers, initializer=_init_worker,
+                               initargs=(self.agents, self.rotate_seats)) as pool:
+            for batch in pool.imap_unordered(_play_games_worker, chunks):
+                yield self._record(batch, start_time)
+
+    def _record(self, batch: SelfPlayBatch, start_time: float) -> SelfPlayBatch:
+        self.elapsed_time = time.time() - start_time
+        self.games_played += batch.num_games
+        return batch
+
+    def run_all(self, num_games: int, first_seed: int = 0) -> SelfPlayBatch:
+        ''' Plays num_games games and returns all of them in a single batch.
+        '''
+        batch = SelfPlayBatch.concatenate(list(self.run(num_games, first_seed)))
+        logger.info("Played {} games in {:.2f}s ({:.1f} games/sec)".format(
+            self.games_played, self.elapsed_time, self.games_per_second))
+        return batch
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter, description="""
+    Play Blokus games between baseline bots on a process pool and report the throughput.
+    """)
+    parser.add_argument("--agents", '-a', type=str, nargs='+', default=['greedy_corner', 'random'],
+                        help="Names of the bots to play, seats cycle through them. Choices are: {}".format(list(BOTS)))
+    parser.add_argument("--games", '-g', type=int, default=100,
+                        help="Number of games to play.")
+    parser.add_argument("--workers", '-w', type=int, default=mp.cpu_count(),
+                        help="Number of worker processes.")
+    parser.add_argument("--batch-size", '-b', type=int, default=16,
+                        help="Number of games every worker plays before sending them back.")
+    parser.add_argument("--output", '-o', type=str, default=None,
+                        help="Optional .npz file to save all of the trajectories to.")
+
+    args = parser.parse_args()
+
+    runner = SelfPlayRunner([get_bot(name) for name in args.agents], args.workers, args.batch_size)
+    result = runner.run_all(args.games)
+
+    print("Played {} games ({} steps) in {:.2f}s: {:.1f} games/sec".format(
+        result.num_games, len(result.players), runner.elapsed_time, runner.games_per_second))
+
+    for agent_id, name in enumerate(args.agents):
+        wins = (result.rankings == 0) & (result.seats == agent_id)
+        seats = (result.seats == agent_id).sum()
+        print("\t{}: won {} of {} seats".format(name, wins.sum(), seats))
+
+    if args.output is not None:
+        np.savez(args.output, **result._asdict())
@@ -0,0 +1,214 @@
+""" Empirical game analysis for the single step matrix games (RPSTwoPlayerEnvironment, RPSThreePlayerEnvironment and
+RandomMatrixEnvironment).
+
+Payoff tensors have shape (S_1, ..., S_P, P): the reward of every player for every joint pure strategy. Mixed
+strategies are contracted with the tensor using np.einsum, so the expected payoffs of whole populations of policies
+are computed in one call instead of stepping the environment once per joint action.
+
+The meta-game of K_1, ..., K_P policies is itself a payoff tensor of shape (K_1, ..., K_P, P), so the best response,
+Nash and replicator dynamics solvers below apply to both the underlying game and its meta-games, as in PSRO.
+"""
+
+from string import ascii_lowercase
+from typing import List, Sequence, Union
+
+import numpy as np
+
+Tensor = np.ndarray
+Mixture = np.ndarray
+
+
+def payoff_tensor(game: object) -> Tensor:
+    """ The payoff tensor of a matrix game environment, or of a state of one.
+
+    Parameters
+    ----------
+    game : object
+        A matrix game environment, a state returned by its new_state, or an explicit tensor.
+
+    Returns
+    -------
+    np.ndarray
+        (S_1, ..., S_P, P) payoffs
+    """
+    game = getattr(game, "game_matrix", game)
+    if hasattr(game, "materialize"):
+        game = game.materialize()
+    return np.asarray(game, np.float64)
+
+
+def _subscripts(num_players: int) -> str:
+    return ascii_lowercase[:num_players]
+
+
+def expected_payoffs(game: object, populations: Sequence[np.ndarray]) -> Tensor:
+    """ Expected payoffs of every combination of mixed strategies, in one einsum contraction.
+
+    Parameters
+    ----------
+    game : object
+        Payoff tensor (S_1, ..., S_P, P), or anything accepted by payoff_tensor.
+    populations : Sequence[np.ndarray]
+        One (K_p, S_p) array of mixed strategies per player, each row a probability vector.
+        A single (K, S) array is used for every player.
+
+    Returns
+    -------
+    np.ndarray
+        (K_1, ..., K_P, P) expected payoff of every player for every combination of policies.
+    """
+    tensor = payoff_tensor(game)
+    num_players = tensor.shape[-1]
+    if isinstance(populations, np.ndarray):
+        populations = [populations] * num_players
+
+    strategies = _subscripts(num_players)
+    policies = strategies.upper()
+    inputs = [strategies + "Z"] + ["{}{}".format(k, s) for k, s in zip(policies, strategies)]
+    expression = "{}->{}Z".format(",".join(inputs), policies)
+
+    return np.einsum(expression, tensor, *populations, optimize=True)
+
+
+def meta_game(game: object, populations: Union[np.ndarray, Sequence[np.ndarray]]) -> Tensor:
+    """ The empirical meta-game payoff table between populations of policies.
+
+    Same as expected_payoffs, named for PSRO-style loops where the rows of populations are the policies found so far.
+    """
+    return expected_payoffs(game, populations)
+
+
+def deviation_payoffs(game: object, mixtures: Sequence[Mixture], player: int) -> np.ndarray:
+    """ Payoff of every pure strategy of one player when the others play their mixtures.
+
+    Parameters
+    ----------
+    game : object
+        Payoff tensor (S_1, ..., S_P, P), or anything accepted by payoff_tensor.
+    mixtures : Sequence[np.ndarray]
+        One probability vector per player. The entry of the deviating player is ignored.
+    player : int
+        The deviating player.
+
+    Returns
+    -------
+    np.ndarray
+        (S_player,) payoffs
+    """
+    tensor = payoff_tensor(game)
+    num_players = tensor.shape[-1]
+    strategies = _subscripts(num_players)
+
+    inputs = [strategies]
+    operands = [tensor[..., player]]
+    for other in range(num_players):
+        if other != player:
+            inputs.append(strategies[other])
+            operands.append(mixtures[other])
+
+    return np.einsum("{}->{}".format(",".join(inputs), strategies[player]), *operands, optimize=True)
+
+
+def best_response(game: object, mixtures: Sequence[Mixture], player: int) -> int:
+    """ Index of the pure strategy that maximizes a player's payoff against the others' mixtures. """
+    return int(np.argmax(deviation_payoffs(game, mixtures, player)))
+
+
+def nash_conv(game: object, mixtures: Sequence[Mixture]) -> float:
+    """ Sum over the players of how much each one could gain by deviating to a best response.
+    Zero exactly at a Nash equilibrium. """
+    tensor = payoff_tensor(game)
+    total = 0.0
+    for player in range(tensor.shape[-1]):
+        payoffs = deviation_payoffs(tensor, mixtures, player)
+        total += float(np.max(payoffs) - payoffs @ mixtures[player])
+    return total
+
+
+def fictitious_play(game: object, iterations: int = 10000) -> List[Mixture]:
+    """ Approximate a Nash equilibrium with simultaneous fictitious play.
+
+    Every player best responds to the empirical average of the others' past play. The averages converge to a Nash
+    equilibrium in two player zero-sum games, and often do in other games. Check the result with nash_conv.
+
+    Returns
+    -------
+    List[np.ndarray]
+        The average mixture of every player.
+    """
+    tensor = payoff_tensor(game)
+    num_players = tensor.shape[-1]
+    counts = [np.ones(size) for size in tensor.shape[:-1]]
+
+    for _ in range(iterations):
+        mixtures = [count / count.sum() for count in counts]
+        responses = [best_response(tensor, mixtures, player) for player in range(num_players)]
+        for player, response in enumerate(responses):
+            counts[player][response] += 1
+
+    return [count / count.sum() for count in counts]
+
+
+def zero_sum_nash(game: object) -> List[Mixture]:
+    """ Exact Nash equilibrium of a two player zero-sum game, by linear programming.
+
+    Only the payoffs of the first player are used, the second player is assumed to receive their negation.
+    """
+    from scipy.optimize import linprog
+
+    payoffs = payoff_tensor(game)[..., 0]
+    if payoffs.ndim != 2:
+        raise ValueError("zero_sum_nash requires a two player game")
+
+    def maximin(matrix: np.ndarray) -> Mixture:
+        # Maximize v such that the mixture x earns at least v against every column: variables are (x, v)
+        rows, columns = matrix.shape
+        cost = np.zeros(rows + 1)
+        cost[-1] = -1
+        upper_bound = np.hstack([-matrix.T, np.ones((columns, 1))])
+        equality = np.hstack([np.ones((1, rows)), np.zeros((1, 1))])
+        bounds = [(0, None)] * rows + [(None, None)]
+        result = linprog(cost, A_ub=upper_bound, b_ub=np.zeros(columns), A_eq=equality, b_eq=[1], bounds=bounds)
+        mixture = np.maximum(result.x[:rows], 0)
+        return mixture / mixture.sum()
+
+    return [maximin(payoffs), maximin(-payoffs.T)]
+
+
+def replicator_dynamics(game: object, iterations: int = 10000, step_size: float = 0.01,
+                        initial: Sequence[Mixture] = None) -> List[Mixture]:
+    """ Discrete time replicator dynamics: strategies grow in proportion to how much better than average they do.
+
+    Parameters
+    ----------
+    game : object
+        Payoff tensor (S_1, ..., S_P, P), or anything accepted by payoff_tensor.
+    iterations : int
+        Number of updates.
+    step_size : float
+        Size of every update.
+    initial : Sequence[np.ndarray]
+        Starting mixture of every player, uniform by default.
+
+    Returns
+    -------
+    List[np.ndarray]
+        The mixture of every player after the last update.
+    """
+    tensor = payoff_tensor(game)
+    num_players = tensor.shape[-1]
+
+    if initial is None:
+        mixtures = [np.full(size, 1 / size) for size in tensor.shape[:-1]]
+    else:
+        mixtures = [np.asarray(mixture, np.float64) for mixture in initial]
+
+    for _ in range(iterations):
+        fitness = [deviation_payoffs(tensor, mixtures, player) for player in range(num_players)]
+        for player in range(num_players):
+            mixture = mixtures[player]
+            mixture = mixture + step_size * mixture * (fitness[player] - fitness[player] @ mixture)
+            mixture = np.maximum(mixture, 0)
+            mixtures[player] = mixture / mixture.sum()
+
+    return mixtures
@@ -0,0 +1,335 @@
+""" Generalized m,n,k-game: players take turns placing stones on an m by n board and the first player with k stones
+in a row, horizontally, vertically or diagonally, wins. Tic Tac Toe is the 3,3,3 game and free-style Gomoku the 15,15,5
+game. Lines longer than k also win.
+
+Actions are flat cell indices, row * n + column. The string form used by the server is the decimal index.
+
+Every move is processed in constant time per direction instead of scanning the board: for every run of consecutive
+stones of one player, the run length is stored at both of its end cells. A new stone merges the runs ending next to it,
+so only the two new end cells need updating.
+"""
+
+from typing import Dict, List, Tuple, Union
+
+import numpy as np
+
+from colosseumrl.BaseEnvironment import BaseEnvironment, SimpleConfigParser
+from colosseumrl.envs.tictactoe.lines import write_relative_board
+from colosseumrl.serialization import serialize, deserialize
+from colosseumrl.zobrist import ZobristTable
+
+# Row and column step of the four line directions: horizontal, vertical, diagonal and anti-diagonal.
+DIRECTIONS = ((0, 1), (1, 0), (1, 1), (1, -1))
+
+PLAYER_NUM_TO_STRING = {
+    -1: ".",
+    0: "X",
+    1: "O",
+    2: "Y",
+    3: "Z"
+}
+
+Action = Union[int, str]
+
+
+class MNKState:
+    """ Mutable state of an m,n,k-game. Use MNKEnvironment.place to update it in place. """
+    __slots__ = ["board", "run_lengths", "legal_mask", "num_empty", "winner"]
+
+    def __init__(self, board: np.ndarray, run_lengths: np.ndarray, legal_mask: np.ndarray, num_empty: int,
+                 winner: Union[int, None]):
+        # (m, n) int8 player number of every stone, -1 for an empty cell.
+        self.board = board
+
+        # (4, m, n) int16 length of the run of stones along every direction.
+        # Only valid on the two end cells of a run, interior cells keep stale values.
+        self.run_lengths = run_lengths
+
+        # (m * n,) bool mask of the empty cells.
+        self.legal_mask = legal_mask
+
+        self.num_empty = num_empty
+        self.winner = winner
+
+    def copy(self) -> "MNKState":
+        return MNKState(self.board.copy(), self.run_lengths.copy(), self.legal_mask.copy(), self.num_empty,
+                        self.winner)
+
+
+def print_board(state: MNKState):
+    """ Print board to console
+
+    Parameters
+    ----------
+    state : MNKState
+        The state to render
+    """
+    if state.winner is not None:
+        print("\nWinner: {} (marked by {})".format(state.winner, PLAYER_NUM_TO_STRING[state.winner]))
+    else:
+        print("")
+
+    for row in state.board.tolist():
+        print(" ".join(PLAYER_NUM_TO_STRING[player_num] for player_num in row))
+    print("")
+
+
+class MNKEnvironment(BaseEnvironment):
+    r"""
+    m,n,k-in-a-row environment for 2 to 4 players.
+    """
+    parser = SimpleConfigParser((int, 15), (int, 15), (int, 5), (int, 2))
+
+    def __init__(self, config: str = None):
+        """ Create an m,n,k-game.
+
+        Parameters
+        ----------
+        config : str
+            Serialized "m;n;k;num_players" config string.
+            Use MNKEnvironment.create for a more programming friendly way of initializing the environment.
+        """
+        super().__init__(config)
+        self.m, self.n, self.k, self.num_players = self.parser.parse(config)
+
+        if not 2 <= self.num_players <= 4:
+            raise ValueError("m,n,k-games support 2 to 4 players, got {}".format(self.num_players))
+        if self.k > max(self.m, self.n):
+            raise ValueError("k = {} does not fit on a {} by {} board".format(self.k, self.m, self.n))
+
+        # Zobrist keys of the board, empty cells are -1. The winner follows from the board, so it is not hashed.
+        self.zobrist = ZobristTable((self.m, self.n), self.num_players + 1, offset=1)
+
+    @classmethod
+    def create(cls, m: int = 15, n: int = 15, k: int = 5, num_players: int = 2) -> "MNKEnvironment":
+        """ Secondary constructor with explicit options for creating the environment
+
+        Parameters
+        ----------
+        m : int
+            Number of rows of the board.
+        n : int
+            Number of columns of the board.
+        k : int
+            Number of stones in a row needed to win.
+        num_players : int
+            Number of players, between 2 and 4.
+        """
+        return cls(cls.parser.store(m, n, k, num_players))
+
+    def __repr__(self):
+        return "MNKEnvironment(m={}, n={}, k={}, num_players={})".format(self.m, self.n, self.k, self.num_players)
+
+    @property
+    def min_players(self) -> int:
+        return self.num_players
+
+    @property
+    def max_players(self) -> int:
+        return self.num_players
+
+    @property
+    def action_space_size(self) -> int:
+        """ Number of integer actions, one per cell. """
+        return self.m * self.n
+
+    @staticmethod
+    def observation_names() -> List[str]:
+        return ["board"]
+
+    @property
+    def observation_shape(self) -> Dict[str, tuple]:
+        return {"board": (self.m, self.n)}
+
+    def new_state(self, num_players: int = None) -> Tuple[MNKState, List[int]]:
+        if num_players is not None and num_players != self.num_players:
+            raise ValueError("This environment is configured for {} players".format(self.num_players))
+
+        board = np.full((self.m, self.n), -1, np.int8)
+        run_lengths = np.zeros((len(DIRECTIONS), self.m, self.n), np.int16)
+        legal_mask = np.ones(self.m * self.n, np.bool_)
+
+        return MNKState(board, run_lengths, legal_mask, self.m * self.n, None), [0]
+
+    # Serialization Methods
+    @staticmethod
+    def serializable() -> bool:
+        return True
+
+    @staticmethod
+    def serialize_state(state: MNKState) -> bytearray:
+        return serialize(state)
+
+    @staticmethod
+    def deserialize_state(serialized_state: bytearray) -> MNKState:
+        return deserialize(serialized_state)
+
+    # Integer action API
+    @staticmethod
+    def action_to_index(action: Action) -> int:
+        """ Convert an action string, or an integer action, into a flat cell index. """
+        return int(action)
+
+    @staticmethod
+    def index_to_action(index: int) -> str:
+        """ Convert a flat cell index into its action string. """
+        return str(index)
+
+    def index_to_cell(self, index: int) -> Tuple[int, int]:
+        """ Convert a flat cell index into a (row, column) tuple. """
+        return divmod(index, self.n)
+
+    def state_hash(self, state: MNKState) -> int:
+        """ Zobrist hash of the board. """
+        return self.zobrist.hash(state.board)
+
+    def legal_action_mask(self, state: MNKState, player: int = None) -> np.ndarray:
+        """ Boolean mask over all m * n actions, True where a stone may be placed.
+
+        The returned array is the one stored in the state, copy it before modifying it.
+        """
+        if state.winner is not None:
+            return np.zeros_like(state.legal_mask)
+        return state.legal_mask
+
+    def _run_length(self, state: MNKState, direction: int, player: int, row: int, column: int) -> int:
+        if 0 <= row < self.m and 0 <= column < self.n and state.board[row, column] == player:
+            return int(state.run_lengths[direction, row, column])
+        return 0
+
+    def place(self, state: MNKState, player: int, action: Action, undo: list = None) -> bool:
+        """ Place a stone in place, without copying the state.
+
+        Parameters
+        ----------
+        state : MNKState
+            The state to update.
+        player : int
+            The player placing the stone.
+        action : Union[int, str]
+            The cell to place the stone on. It must be empty.
+        undo : list
+            Optional list that (direction, row, column, previous length) is appended to for every run length changed.
+
+        Returns
+        -------
+        bool
+            Whether this stone completed a line of k stones. The winner of the state is updated accordingly.
+        """
+        index = self.action_to_index(action)
+        row, column = divmod(index, self.n)
+
+        state.board[row, column] = player
+        state.legal_mask[index] = False
+        state.num_empty -= 1
+
+        won = False
+        for direction, (row_step, column_step) in enumerate(DIRECTIONS):
+            before = self._run_length(state, direction, player, row - row_step, column - column_step)
+            after = self._run_length(state, direction, player, row + row_step, column + column_step)
+
+            length = before + after + 1
+            run_lengths = state.run_lengths[direction]
+            ends = ((row, column),
+                    (row - before * row_step, column - before * column_step),
+                    (row + after * row_step, column + after * column_step))
+            for end in ends:
+                if undo is not None:
+                    undo.append((direction, end[0], end[1], run_lengths[end]))
+                run_lengths[end] = length
+
+            won = won or length >= self.k
+
+        if won:
+            state.winner = player
+
+        return won
+
+    def current_rewards(self, state: MNKState) -> List[float]:
+        """ Returns current reward for each player: 1 for the winner, -1 for everyone else if there is a winner. """
+        if state.winner is not None:
+            return [1 if p == state.winner else -1 for p in range(self.num_players)]
+        else:
+            return [0 for _ in range(self.num_players)]
+
+    def next_state(self, state: MNKState, players: List[int], actions: List[Action]) \
+            -> Tuple[MNKState, List[int], List[float], bool, Union[List[int], None]]:
+        """ Perform a game step from a given state. Only one player acts at a time.
+
+        An empty or invalid action skips the player's turn.
+        """
+        player = players[0]
+        action = actions[0]
+
+        new_state = state.copy()
+        reward = 0
+
+        if self.is_valid_action(state, player, action) and self.place(new_state, player, action):
+            reward = 1
+
+        winners = None if new_state.winner is None else [new_state.winner]
+        terminal = new_state.winner is not None or new_state.num_empty == 0
+
+        return new_state, [(player + 1) % self.num_players], [reward], terminal, winners
+
+    def clone_state(self, state: MNKState) -> MNKState:
+        return state.copy()
+
+    def make_move(self, state: MNKState, players: List[int], actions: List[Action]) \
+            -> Tuple[List[int], List[float], bool, Union[List[int], None], object]:
+        """ Same as next_state, placing the stone in place. Returns the undo information last. """
+        player = players[0]
+        action = actions[0]
+
+        undo = None
+        reward = 0
+        if self.is_valid_action(state, player, action):
+            undo = (self.action_to_index(action), state.winner, [])
+            if self.place(state, player, action, undo[2]):
+                reward = 1
+
+        winners = None if state.winner is None else [state.winner]
+        terminal = state.winner is not None or state.num_empty == 0
+
+        return [(player + 1) % self.num_players], [reward], terminal, winners, undo
+
+    def unmake_move(self, state: MNKState, undo: object):
+        """ Take back the stone placed by make_move. """
+        if undo is None:
+            return
+
+        index, winner, run_length_changes = undo
+        for direction, row, column, length in reversed(run_length_changes):
+            state.run_lengths[direction, row, column] = length
+
+        state.board.flat[index] = -1
+        state.legal_mask[index] = True
+        state.num_empty += 1
+        state.winner = winner
+
+    def valid_actions(self, state: MNKState, player: int) -> List[str]:
+        """ Valid actions for a specific state and player, the empty string if there are none. """
+        valid_actions = [str(index) for index in np.flatnonzero(self.legal_action_mask(state, player))]
+        if len(valid_actions) == 0:
+            valid_actions.append("")
+        return valid_actions
+
+    def is_valid_action(self, state: MNKState, player: int, action: Action) -> bool:
+        if state.winner is not None or action == "":
+            return False
+
+        try:
+            index = self.action_to_index(action)
+        except ValueError:
+            return False
+
+        return 0 <= index < self.m * self.n and bool(state.legal_mask[index])
+
+    def state_to_observation(self, state: MNKState, player: int) -> Dict[str, np.ndarray]:
+        """ The board with the player ids relative to the observing player, who is always player 0. """
+        return self.write_observation(state, player, {"board": np.empty_like(state.board)})
+
+    def write_observation(self, state: MNKState, player: int, buffers: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """ Same as state_to_observation, written into the caller owned buffers["board"] array. """
+        write_relative_board(state.board, player, self.num_players, buffers["board"])
+        return buffers
@@ -0,0 +1 @@
+from .MNKEnvironment import MNKEnvironment, MNKState
@@ -6,11 +6,17 @@ from colosseumrl.BaseEnvironment import BaseEnvironment, SimpleConfigParser
 class KuhnPokerEnvironment(BaseEnvironment):
     parser = SimpleConfigParser((int, 2), (int, None))
 
+    # Action strings by integer action
+    ACTIONS = ["check", "bet"]
+
     def __init__(self, config: str = None):
         super().__init__(config)
         self.num_players, seed = self.parser.parse(config)
         self.random_state = np.random.RandomState(seed)
 
+        # Row p holds every player, starting from p, in turn order
+        self._rolled_players = (np.arange(self.num_players)[:, None] + np.arange(self.num_players)) % self.num_players
+
     @classmethod
     def create(cls, num_players: int = 2, seed: int = None):
         return cls(cls.parser.store(num_players, seed))
@@ -40,7 +46,7 @@ class KuhnPokerEnvironment(BaseEnvironment):
     def showdown(self, hands, bets):
         showdown_players = np.where(bets == np.max(bets))[0]
         showdown_hands = hands[showdown_players]
-        showdown_winner = np.argmax(showdown_hands)
+        showdown_winner = showdown_players[np.argmax(showdown_hands)]
 
         rewards = -np.copy(bets)
         rewards[showdown_winner] += np.sum(bets)
@@ -52,6 +58,8 @@ class KuhnPokerEnvironment(BaseEnvironment):
         bets = bets.copy()
         player = players[0]
         action = actions[0]
+        if isinstance(action, (int, np.integer)):
+            action = self.ACTIONS[action]
 
         # Default return values
         rewards = [0]
@@ -96,29 +104,180 @@ class KuhnPokerEnvironment(BaseEnvironment):
         new_state = (hands, bets, last_bet, terminal)
         return new_state, new_players, rewards, terminal, winners
 
+    @property
+    def action_space_size(self) -> int:
+        return len(self.ACTIONS)
+
+    def action_to_index(self, action: Union[str, int]) -> int:
+        if isinstance(action, (int, np.integer)):
+            return int(action)
+        return self.ACTIONS.index(action)
+
+    def index_to_action(self, index: int) -> str:
+        return self.ACTIONS[index]
+
     def valid_actions(self, state: object, player: int) -> [str]:
         return ["check", "bet"]
 
-    def is_valid_action(self, state: object, player: int, action: str) -> bool:
-        return player in ("check", "bet")
+    def is_valid_action(self, state: object, player: int, action: Union[str, int]) -> bool:
+        if isinstance(action, (int, np.integer)):
+            return 0 <= action < len(self.ACTIONS)
+        return action in self.ACTIONS
 
     def state_to_observation(self, state: object, player: int) -> Dict[str, np.ndarray]:
-        hands, bets, last_bet, terminal = map(np.copy, state)
+        return self.write_observation(state, player, {"hands": np.empty(self.num_players, np.int64),
+                                                      "bets": np.empty(self.num_players, np.int64)})
+
+    def write_observation(self, state: object, player: int, buffers: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """ Same as state_to_observation, written into the caller owned buffers. """
+        hands, bets, last_bet, terminal = state
+        output_hands, output_bets = buffers["hands"], buffers["bets"]
+
+        # Both views are rolled so that the observing player comes first
+        rolled_players = self._rolled_players[player]
+        output_bets[...] = bets[rolled_players]
 
         # Create masked hand view.
         # If the game isn't over, then we just see ourselves
         # If the game is over, we see all showdown players
-        output_hands = np.zeros(self.num_players, np.int64) - 1
-        output_hands[player] = hands[player]
+        output_hands[...] = -1
+        output_hands[0] = hands[player]
 
         if terminal:
-            showdown_players = np.where(bets == np.max(bets))[0]
-            for sp in showdown_players:
-                output_hands[sp] = hands[sp]
+            showdown_players = output_bets == np.max(bets)
+            output_hands[showdown_players] = hands[rolled_players][showdown_players]
+
+        return buffers
+
+    # Batched methods
+    # -----------------------------------------------
+    # A batch of B games is stored like a single state, with a leading batch dimension:
+    # hands (B, P), bets (B, P), last_bet (B,) and terminal (B,).
+    # Actions are integers, 0 for "check" and 1 for "bet".
+    def new_state_batch(self, batch_size: int, num_players: int = None) -> Tuple[tuple, np.ndarray]:
+        """ Deal batch_size new games at once.
+
+        Returns
+        -------
+        state : Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+            The batched state.
+        players : np.ndarray
+            (B,) the player to act in every game.
+        """
+        # Random permutations of the deck, the first P cards of each are dealt
+        hands = np.argsort(self.random_state.rand(batch_size, self.num_players + 1), axis=1)[:, :self.num_players]
+        bets = np.ones((batch_size, self.num_players), np.int64)
+        last_bet = np.full(batch_size, -1, np.int64)
+        terminal = np.zeros(batch_size, np.bool_)
+        return (hands, bets, last_bet, terminal), np.zeros(batch_size, np.int64)
+
+    def showdown_batch(self, hands: np.ndarray, bets: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """ Resolve the showdown of every game in a batch, same as showdown.
+
+        Returns
+        -------
+        winners : np.ndarray
+            (B,) the winner of every game.
+        rewards : np.ndarray
+            (B, P) the reward of every player.
+        """
+        showdown_players = bets == np.max(bets, axis=1, keepdims=True)
+        winners = np.argmax(np.where(showdown_players, hands, -1), axis=1)
+
+        rewards = -bets
+        rewards[np.arange(len(bets)), winners] += np.sum(bets, axis=1)
+        return winners, rewards
+
+    def next_state_batch(self, state: tuple, players: np.ndarray, actions: np.ndarray) \
+            -> Tuple[tuple, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """ Advance every game of a batch by one action, same rules as next_state.
+
+        Parameters
+        ----------
+        state : tuple
+            The batched state.
+        players : np.ndarray
+            (B,) the player acting in every game.
+        actions : np.ndarray
+            (B,) 0 for "check" / "fold" and 1 for "bet" / "call". Games that are already over ignore their action.
+
+        Returns
+        -------
+        new_state : tuple
+            The batched state after the actions.
+        new_players : np.ndarray
+            (B,) the player to act next in every game.
+        rewards : np.ndarray
+            (B, P) the reward of every player, non-zero only for the games that ended with this step.
+        terminal : np.ndarray
+            (B,) whether every game is over.
+        winners : np.ndarray
+            (B,) the winner of every game that ended with this step, -1 otherwise.
+        """
+        hands, bets, last_bet, terminal = state
+        batch = np.arange(len(hands))
+        players = np.asarray(players)
+
+        active = ~terminal
+        check = active & (np.asarray(actions) == 0)
+        bet = active & ~check
+        no_bet = last_bet < 0
+
+        # Same logic as next_state, one mask per branch
+        all_checked = no_bet & check & (players == self.num_players - 1)
+        first_bet = no_bet & bet
+        call = ~no_bet & bet
+        betting_done = active & ~no_bet & (players == (last_bet - 1) % self.num_players)
+
+        bets = bets.copy()
+        bets[batch, players] += first_bet | call
+        last_bet = np.where(first_bet, players, last_bet)
+
+        ended = all_checked | betting_done
+        winners, rewards = self.showdown_batch(hands, bets)
+        rewards[~ended] = 0
+        winners[~ended] = -1
+
+        new_players = np.where(terminal, players, (players + 1) % self.num_players)
+        return (hands, bets, last_bet, terminal | ended), new_players, rewards, terminal | ended, winners
+
+    def reset_state_batch(self, state: tuple, players: np.ndarray, mask: np.ndarray, num_players: int = None) \
+            -> Tuple[tuple, np.ndarray]:
+        """ Deal new games in the slots of a batch where mask is True. """
+        new_state, new_players = self.new_state_batch(int(np.count_nonzero(mask)))
+
+        state = tuple(np.copy(array) for array in state)
+        players = np.copy(players)
+        for array, new_array in zip(state, new_state):
+            array[mask] = new_array
+        players[mask] = new_players
+        return state, players
+
+    def state_to_observation_batch(self, state: tuple, players: np.ndarray) -> Dict[str, np.ndarray]:
+        """ Observations of every game of a batch, same as state_to_observation.
+
+        Parameters
+        ----------
+        state : tuple
+            The batched state.
+        players : np.ndarray
+            (B,) the observing player of every game.
+
+        Returns
+        -------
+        Dict[str, np.ndarray]
+            (B, P) arrays for every observation name.
+        """
+        hands, bets, last_bet, terminal = state
+        batch = np.arange(len(hands))[:, None]
+        players = np.asarray(players)
 
-        output_hands = np.roll(output_hands, -player)
-        output_bets = np.roll(bets, -player)
+        visible = terminal[:, None] & (bets == np.max(bets, axis=1, keepdims=True))
+        visible[batch[:, 0], players] = True
+        output_hands = np.where(visible, hands, -1)
 
-        return {"hands": output_hands,
-                "bets": output_bets}
+        # Roll every row so that the observing player comes first
+        columns = (np.arange(self.num_players) + players[:, None]) % self.num_players
 
+        return {"hands": output_hands[batch, columns],
+                "bets": bets[batch, columns]}
@@ -1 +1,2 @@
-from .KuhnPokerEnvironment import KuhnPokerEnvironment
\ No newline at end of file
+from .KuhnPokerEnvironment import KuhnPokerEnvironment
+from .cfr import KuhnCFRSolver, KuhnGameTree
@@ -0,0 +1,288 @@
+""" Counterfactual regret minimization for N-player Kuhn poker.
+
+The betting tree of KuhnPokerEnvironment is compiled once into flat arrays: every public betting history is a node,
+and an information set is a (node, card) pair, since the public history determines who acts. The cards only change
+who wins a showdown, so every CFR iteration walks the handful of betting nodes with numpy arrays over all (N + 1)! / 1
+deals at once.
+
+Both vanilla CFR and CFR+ (regrets floored at zero, alternating updates and linearly weighted averaging) are
+available. For two players the average strategy converges to a Nash equilibrium, for more players CFR has no such
+guarantee but the reported NashConv still measures how much any single player could gain by deviating.
+"""
+
+from itertools import permutations
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from .KuhnPokerEnvironment import KuhnPokerEnvironment
+
+# Index of the two actions in every strategy array
+ACTIONS = ["check", "bet"]
+
+
+class KuhnGameTree:
+    """ Flat array representation of the N-player Kuhn poker game tree. """
+
+    def __init__(self, num_players: int = 2):
+        """ Enumerate every betting history and every deal.
+
+        The betting rules are taken from KuhnPokerEnvironment.next_state and the payoffs from
+        KuhnPokerEnvironment.showdown, so the tree always matches the environment.
+        """
+        self.num_players = num_players
+        self.num_cards = num_players + 1
+        env = KuhnPokerEnvironment.create(num_players)
+
+        #: (D, N) card of every player in every deal
+        self.deals = np.array(list(permutations(range(self.num_cards), num_players)), np.int64)
+        self.num_deals = len(self.deals)
+
+        #: Action sequence of every history
+        self.histories: List[Tuple[str, ...]] = []
+
+        #: (H,) player acting at every history, -1 for terminal histories
+        player = []
+
+        #: (H, 2) child history after each action, -1 for terminal histories
+        children = []
+
+        # Betting state at every history, identifies the node from an environment state
+        self._state_nodes: Dict[Tuple[int, int, Tuple[int, ...]], int] = {}
+        terminal_bets = {}
+
+        # Hands do not change the betting, so any hand can be used to walk the tree
+        state, players = env.new_state()
+        stack = [(state, players[0], ())]
+        while stack:
+            state, acting, history = stack.pop()
+            node = len(self.histories)
+            self.histories.append(history)
+            children.append([-1, -1])
+
+            hands, bets, last_bet, terminal = state
+            if terminal:
+                player.append(-1)
+                terminal_bets[node] = bets
+                continue
+
+            player.append(acting)
+            self._state_nodes[(acting, last_bet, tuple(bets.tolist()))] = node
+            for action_index, action in reversed(list(enumerate(ACTIONS))):
+                new_state, new_players, _, _, _ = env.next_state(state, [acting], [action])
+                stack.append((new_state, new_players[0], history + (action,)))
+
+        # Histories are numbered in depth first order, so every child comes after its parent
+        for node, history in enumerate(self.histories):
+            if len(history) > 0:
+                parent = self.histories.index(history[:-1])
+                children[parent][ACTIONS.index(history[-1])] = node
+
+        self.player = np.array(player, np.int64)
+        self.children = np.array(children, np.int64)
+        self.num_histories = len(self.histories)
+        self.decision_nodes = np.flatnonzero(self.player >= 0)
+
+        #: (H, D, N) reward of every player at every terminal history and deal, zero for decision nodes
+        self.payoffs = np.zeros((self.num_histories, self.num_deals, num_players))
+        for node, bets in terminal_bets.items():
+            self.payoffs[node] = self.showdown(bets)
+
+        #: (N, D, C) one-hot card of every player in every deal, used to sum over the deals of an information set
+        self.card_onehot = (self.deals.T[:, :, None] == np.arange(self.num_cards)).astype(np.float64)
+
+    def showdown(self, bets: np.ndarray) -> np.ndarray:
+        """ Rewards of every player in every deal for final bets, same as KuhnPokerEnvironment.showdown.
+
+        Returns
+        -------
+        np.ndarray
+            (D, N) rewards
+        """
+        showdown_players = np.flatnonzero(bets == np.max(bets))
+        winners = showdown_players[np.argmax(self.deals[:, showdown_players], axis=1)]
+
+        rewards = np.tile(-bets.astype(np.float64), (self.num_deals, 1))
+        rewards[np.arange(self.num_deals), winners] += np.sum(bets)
+        return rewards
+
+    def node(self, state: object, player: int) -> int:
+        """ History index of a KuhnPokerEnvironment state with player to act. """
+        hands, bets, last_bet, terminal = state
+        return self._state_nodes[(player, last_bet, tuple(bets.tolist()))]
+
+    def reach_probabilities(self, strategy: np.ndarray) -> np.ndarray:
+        """ Contribution of every player to the probability of reaching every history in every deal.
+
+        Parameters
+        ----------
+        strategy : np.ndarray
+            (H, C, 2) probability of each action at every information set.
+
+        Returns
+        -------
+        np.ndarray
+            (H, D, N) reach probabilities
+        """
+        reach = np.ones((self.num_histories, self.num_deals, self.num_players))
+        for node in self.decision_nodes:
+            acting = self.player[node]
+            probabilities = strategy[node, self.deals[:, acting]]
+            for action, child in enumerate(self.children[node]):
+                reach[child] = reach[node]
+                reach[child, :, acting] *= probabilities[:, action]
+        return reach
+
+    def expected_values(self, strategy: np.ndarray) -> np.ndarray:
+        """ Expected reward of every player from every history in every deal when everyone plays strategy.
+
+        Returns
+        -------
+        np.ndarray
+            (H, D, N) expected rewards
+        """
+        values = self.payoffs.copy()
+        for node in self.decision_nodes[::-1]:
+            probabilities = strategy[node, self.deals[:, self.player[node]]]
+            values[node] = np.einsum("da,adn->dn", probabilities, values[self.children[node]])
+        return values
+
+    def opponent_reach(self, reach: np.ndarray, player: int) -> np.ndarray:
+        """ (H, D) probability of reaching every history due to every player but one. """
+        return np.prod(np.delete(reach, player, axis=2), axis=2)
+
+    def best_response_value(self, strategy: np.ndarray, player: int) -> float:
+        """ Expected reward of the best response of one player against everyone else playing strategy. """
+        opponent_reach = self.opponent_reach(self.reach_probabilities(strategy), player)
+        onehot = self.card_onehot[player]
+
+        values = self.payoffs[:, :, player].copy()
+        for node in self.decision_nodes[::-1]:
+            acting = self.player[node]
+            child_values = values[self.children[node]]
+
+            if acting == player:
+                # Same action in every deal of an information set: the one with the best counterfactual value
+                action_values = onehot.T @ (opponent_reach[node][:, None] * child_values.T)
+                best_actions = np.argmax(action_values, axis=1)[self.deals[:, player]]
+                values[node] = np.where(best_actions == 0, child_values[0], child_values[1])
+            else:
+                probabilities = strategy[node, self.deals[:, acting]]
+                values[node] = np.sum(probabilities.T * child_values, axis=0)
+
+        return float(np.mean(values[0]))
+
+    def nash_conv(self, strategy: np.ndarray) -> float:
+        """ Sum over the players of how much each one could gain with a best response. Zero at a Nash equilibrium. """
+        game_values = np.mean(self.expected_values(strategy)[0], axis=0)
+        return sum(self.best_response_value(strategy, player) - game_values[player]
+                   for player in range(self.num_players))
+
+
+class KuhnCFRSolver:
+    """ Vectorized CFR / CFR+ over every deal of N-player Kuhn poker.
+
+    An instance is also an agent: calling it with a KuhnPokerEnvironment state and a player samples an action
+    from the average strategy.
+    """
+
+    def __init__(self, num_players: int = 2, plus: bool = True, seed: int = None):
+        """ Create a solver with zero regrets.
+
+        Parameters
+        ----------
+        num_players : int
+            Number of players of the Kuhn poker game.
+        plus : bool
+            Use CFR+ instead of vanilla CFR.
+        seed : int
+            Seed for sampling actions when used as an agent.
+        """
+        self.tree = KuhnGameTree(num_players)
+        self.plus = plus
+        self.iteration = 0
+        self.random_state = np.random.RandomState(seed)
+
+        shape = (self.tree.num_histories, self.tree.num_cards, len(ACTIONS))
+        self.regrets = np.zeros(shape)
+        self.strategy_sum = np.zeros(shape)
+
+    def current_strategy(self) -> np.ndarray:
+        """ (H, C, 2) regret matching strategy of the current iteration. Uniform where no regret is positive. """
+        positive = np.maximum(self.regrets, 0)
+        total = positive.sum(axis=2, keepdims=True)
+        return np.where(total > 0, positive / np.where(total > 0, total, 1), 1 / len(ACTIONS))
+
+    def average_strategy(self) -> np.ndarray:
+        """ (H, C, 2) average strategy over all iterations, the one that converges. """
+        total = self.strategy_sum.sum(axis=2, keepdims=True)
+        return np.where(total > 0, self.strategy_sum / np.where(total > 0, total, 1), 1 / len(ACTIONS))
+
+    def _update(self, players: List[int]):
+        tree = self.tree
+        strategy = self.current_strategy()
+        reach = tree.reach_probabilities(strategy)
+        values = tree.expected_values(strategy)
+        weight = self.iteration + 1 if self.plus else 1
+
+        for node in tree.decision_nodes:
+            acting = tree.player[node]
+            if acting not in players:
+                continue
+
+            onehot = tree.card_onehot[acting]
+            opponent_reach = np.prod(np.delete(reach[node], acting, axis=1), axis=1)
+            child_values = values[tree.children[node], :, acting].T
+            regrets = opponent_reach[:, None] * (child_values - values[node, :, acting][:, None])
+
+            self.regrets[node] += onehot.T @ regrets
+            if self.plus:
+                np.maximum(self.regrets[node], 0, out=self.regrets[node])
+
+            self.strategy_sum[node] += weight * (onehot.T @ reach[node, :, acting])[:, None] * strategy[node]
+
+    def iterate(self):
+        """ Run a single CFR iteration. CFR+ updates the players one after the other, vanilla CFR all at once. """
+        if self.plus:
+            for player in range(self.tree.num_players):
+                self._update([player])
+        else:
+            self._update(list(range(self.tree.num_players)))
+        self.iteration += 1
+
+    def nash_conv(self) -> float:
+        """ NashConv of the average strategy. """
+        return self.tree.nash_conv(self.average_strategy())
+
+    def exploitability(self) -> float:
+        """ NashConv of the average strategy divided by the number of players. """
+        return self.nash_conv() / self.tree.num_players
+
+    def solve(self, iterations: int, report_every: int = 1) -> np.ndarray:
+        """ Run several iterations and report the exploitability along the way.
+
+        Returns
+        -------
+        np.ndarray
+            (reports, 2) iteration number and exploitability of the average strategy after every report_every
+            iterations.
+        """
+        reports = []
+        for _ in range(iterations):
+            self.iterate()
+            if self.iteration % report_every == 0:
+                reports.append((self.iteration, self.exploitability()))
+        return np.array(reports).reshape(-1, 2)
+
+    def game_values(self) -> np.ndarray:
+        """ (N,) expected reward of every player when everyone plays the average strategy. """
+        return np.mean(self.tree.expected_values(self.average_strategy())[0], axis=0)
+
+    def policy(self, state: object, player: int) -> np.ndarray:
+        """ Average strategy probabilities of [check, bet] for a player in a KuhnPokerEnvironment state. """
+        hands = state[0]
+        return self.average_strategy()[self.tree.node(state, player), hands[player]]
+
+    def __call__(self, state: object, player: int) -> str:
+        """ Sample an action string from the average strategy. """
+        return ACTIONS[self.random_state.choice(len(ACTIONS), p=self.policy(state, player))]
@@ -2,22 +2,135 @@ import numpy as np
 from typing import Dict, Tuple, List, Union
 from colosseumrl.BaseEnvironment import BaseEnvironment, SimpleConfigParser
 
+# Constants of the splitmix64 finalizer, used as a counter-based hash for procedural payoffs
+_GOLDEN_GAMMA = np.uint64(0x9E3779B97F4A7C15)
+_MIX_MULTIPLIER_1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX_MULTIPLIER_2 = np.uint64(0x94D049BB133111EB)
+
+
+def _mix(z: np.ndarray) -> np.ndarray:
+    z = (z ^ (z >> np.uint64(30))) * _MIX_MULTIPLIER_1
+    z = (z ^ (z >> np.uint64(27))) * _MIX_MULTIPLIER_2
+    return z ^ (z >> np.uint64(31))
+
+
+def _joint_action_keys(seed: int, player_actions: List[np.ndarray]) -> np.ndarray:
+    """ Hash of (seed, joint action), the strategy of every player given as arrays that broadcast together. """
+    key = np.uint64(seed)
+    for actions in player_actions:
+        key = _mix(key + _GOLDEN_GAMMA * (np.asarray(actions).astype(np.uint64) + np.uint64(1)))
+    return key
+
+
+def _payoffs_from_keys(keys: np.ndarray, players: np.ndarray) -> np.ndarray:
+    bits = _mix(keys ^ (_GOLDEN_GAMMA * (players.astype(np.uint64) + np.uint64(1))))
+
+    # Top 53 bits as a double in [0, 1)
+    return (bits >> np.uint64(11)).astype(np.float64) * (2.0 ** -53)
+
+
+def procedural_payoffs(seed: int, joint_actions: np.ndarray) -> np.ndarray:
+    """ Payoffs of a procedural random matrix game, uniform in [0, 1) like the dense game matrix.
+
+    Every payoff is a hash of (seed, joint action, player), so any entry can be computed on demand
+    without storing the game matrix.
+
+    Parameters
+    ----------
+    seed : int
+        Seed of the game.
+    joint_actions : np.ndarray
+        (..., num_players) strategy index of every player.
+
+    Returns
+    -------
+    np.ndarray
+        (..., num_players) payoff of every player for every joint action.
+    """
+    joint_actions = np.asarray(joint_actions)
+    num_players = joint_actions.shape[-1]
+
+    with np.errstate(over="ignore"):
+        keys = _joint_action_keys(seed, [joint_actions[..., player] for player in range(num_players)])
+        keys = np.broadcast_to(keys, joint_actions.shape[:-1])
+        return _payoffs_from_keys(keys[..., None], np.arange(num_players))
+
+
+class ProceduralPayoffs:
+    """ Game matrix of a procedural random matrix game. Indexing it with a joint action computes the payoffs
+    of that joint action on demand, so it can replace the dense game matrix in a state. """
+
+    def __init__(self, seed: int, num_players: int, num_strategies: int):
+        self.seed = seed
+        self.num_players = num_players
+        self.num_strategies = num_strategies
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        return tuple([self.num_strategies for _ in range(self.num_players)] + [self.num_players])
+
+    def __getitem__(self, joint_action: Tuple[int, ...]) -> np.ndarray:
+        return procedural_payoffs(self.seed, np.array(joint_action))
+
+    def player_payoffs(self, player: int) -> np.ndarray:
+        """ The (num_strategies, ..., num_strategies) payoffs of one player, the same as materialize()[..., player].
+        The payoffs of the other players are never computed, so no array is larger than the result. """
+        axes = [np.arange(self.num_strategies).reshape([-1 if axis == p else 1 for axis in range(self.num_players)])
+                for p in range(self.num_players)]
+
+        with np.errstate(over="ignore"):
+            keys = _joint_action_keys(self.seed, axes)
+            return _payoffs_from_keys(keys, np.array(player))
+
+    def materialize(self) -> np.ndarray:
+        """ The full game matrix. Its size grows exponentially with the number of players. """
+        joint_actions = np.stack(np.indices(self.shape[:-1]), axis=-1)
+        return procedural_payoffs(self.seed, joint_actions)
+
 
 class RandomMatrixEnvironment(BaseEnvironment):
-    parser = SimpleConfigParser((int, 2), (int, 2), (int, None))
+    """ Single step normal form game with uniformly random payoffs.
+
+    Config options are: num_players, num_strategies, seed, payoffs and observation.
+
+    payoffs is either "dense", where the whole game matrix is sampled up front, or "procedural", where payoffs
+    are hashed from (seed, joint action) on demand and memory stays constant whatever the size of the game.
+
+    observation selects what is sent to the players:
+    "full" is the whole (num_strategies, ..., num_strategies, num_players) game matrix,
+    "player" is only the payoffs of the observing player, a (num_strategies, ..., num_strategies) slice,
+    and "seed" is the (1,) procedural payoff seed, from which procedural_payoffs computes any payoff.
+    The default is "full" for dense payoffs and "seed" for procedural payoffs.
+    """
+    parser = SimpleConfigParser((int, 2), (int, 2), (int, None), (str, "dense"), (str, None))
 
     def __init__(self, config: str = None):
         super(BaseEnvironment, self).__init__()
 
-        self.num_players, self.num_strategies, seed = self.parser.parse(config)
+        self.num_players, self.num_strategies, seed, self.payoffs, self.observation = self.parser.parse(config)
+
+        if self.payoffs not in ("dense", "procedural"):
+            raise ValueError("Unknown payoffs option: {}".format(self.payoffs))
+        if self.observation is None:
+            self.observation = "full" if self.payoffs == "dense" else "seed"
+        if self.observation not in ("full", "player", "seed"):
+            raise ValueError("Unknown observation option: {}".format(self.observation))
+        if self.observation == "seed" and self.payoffs != "procedural":
+            raise ValueError("Seed observations require procedural payoffs")
 
         self.random_state = np.random.RandomState(seed)
         self.game_matrix_shape = tuple([self.num_strategies for _ in range(self.num_players)] + [self.num_players])
-        self.game_matrix = self.random_state.rand(*self.game_matrix_shape)
+
+        if self.payoffs == "dense":
+            self.game_matrix = self.random_state.rand(*self.game_matrix_shape)
+        else:
+            payoff_seed = seed if seed is not None else self.random_state.randint(2 ** 63, dtype=np.uint64)
+            self.game_matrix = ProceduralPayoffs(payoff_seed, self.num_players, self.num_strategies)
 
     @classmethod
-    def create(cls, num_players: int = 2, num_strategies: int = 2, seed: int = None):
-        return cls(cls.parser.store(num_players, num_strategies, seed))
+    def create(cls, num_players: int = 2, num_strategies: int = 2, seed: int = None, payoffs: str = "dense",
+               observation: str = None):
+        return cls(cls.parser.store(num_players, num_strategies, seed, payoffs, observation))
 
     @property
     def min_players(self) -> int:
@@ -27,15 +140,21 @@ class RandomMatrixEnvironment(BaseEnvironment):
     def max_players(self) -> int:
         return self.num_players
 
-    @staticmethod
-    def observation_names() -> List[str]:
-        return ["game_matrix"]
+    def observation_names(self) -> List[str]:
+        # The observation depends on the config, so the names come from the instance
+        return list(self.observation_shape)
 
     @property
     def observation_shape(self) -> Dict[str, tuple]:
+        if self.observation == "seed":
+            return {"payoff_seed": (1,)}
+        if self.observation == "player":
+            return {"game_matrix": self.game_matrix_shape[:-1]}
         return {"game_matrix": self.game_matrix_shape}
 
-    def new_state(self, num_players: int = None) -> Tuple[np.ndarray, np.ndarray]:
+    def new_state(self, num_players: int = None) -> Tuple[Union[np.ndarray, ProceduralPayoffs], np.ndarray]:
+        if self.payoffs == "procedural":
+            return self.game_matrix, np.arange(self.num_players)
         return self.game_matrix.copy(), np.arange(self.num_players)
 
     def next_state(self, state: np.ndarray, players: np.ndarray, actions: [str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, bool, Union[List[int], None]]:
@@ -44,11 +163,139 @@ class RandomMatrixEnvironment(BaseEnvironment):
 
         return state, players, rewards, True, [int(np.argmax(rewards))]
 
+    # Batched methods
+    # -----------------------------------------------
+    # Every game of a batch shares the game matrix as its state, and the players of a batch are (B, P).
+    def new_state_batch(self, batch_size: int, num_players: int = None) \
+            -> Tuple[Union[np.ndarray, ProceduralPayoffs], np.ndarray]:
+        state, players = self.new_state(num_players)
+        return state, np.tile(players, (batch_size, 1))
+
+    def reset_state_batch(self, state: Union[np.ndarray, ProceduralPayoffs], players: np.ndarray, mask: np.ndarray,
+                          num_players: int = None) -> Tuple[Union[np.ndarray, ProceduralPayoffs], np.ndarray]:
+        # Games only last one step and the state never changes, so a new game is the same as the old one
+        return state, players
+
+    def state_to_observation_batch(self, state: Union[np.ndarray, ProceduralPayoffs],
+                                   players: np.ndarray) -> Dict[str, np.ndarray]:
+        """ Observations of every game of a batch, same as state_to_observation.
+
+        Observations that are the same for every game are read-only views that do not copy the game matrix.
+        """
+        players = np.asarray(players)
+        if self.observation == "seed":
+            return {"payoff_seed": np.full((len(players), 1), state.seed, np.uint64)}
+
+        if self.observation == "player":
+            if isinstance(state, ProceduralPayoffs):
+                player_payoffs = {player: state.player_payoffs(player) for player in np.unique(players)}
+                return {"game_matrix": np.stack([player_payoffs[player] for player in players])}
+            return {"game_matrix": np.moveaxis(state, -1, 0)[players]}
+
+        game_matrix = state.materialize() if isinstance(state, ProceduralPayoffs) else state
+        return {"game_matrix": np.broadcast_to(game_matrix, (len(players),) + game_matrix.shape)}
+
+    def rewards_batch(self, state: Union[np.ndarray, ProceduralPayoffs], actions: np.ndarray) -> np.ndarray:
+        """ Rewards of many joint actions at once: a single gather on a dense game matrix,
+        or one vectorized hash for procedural payoffs.
+
+        Parameters
+        ----------
+        state : Union[np.ndarray, ProceduralPayoffs]
+            The game matrix returned by new_state.
+        actions : np.ndarray
+            (B, P) integer joint actions.
+
+        Returns
+        -------
+        np.ndarray
+            (B, P) the reward of every player for every joint action.
+        """
+        actions = np.asarray(actions)
+        if isinstance(state, ProceduralPayoffs):
+            if np.any((actions < 0) | (actions >= self.num_strategies)):
+                raise ValueError("Actions must be in [0, {})".format(self.num_strategies))
+            return procedural_payoffs(state.seed, actions)
+
+        joint_actions = np.ravel_multi_index(actions.T, state.shape[:-1])
+        return np.take(state.reshape(-1, state.shape[-1]), joint_actions, axis=0)
+
+    def next_state_batch(self, state: Union[np.ndarray, ProceduralPayoffs], players: np.ndarray,
+                         actions: np.ndarray) -> Tuple[object, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """ Play B independent games at once, same rules as next_state.
+
+        Parameters
+        ----------
+        state : Union[np.ndarray, ProceduralPayoffs]
+            The game matrix returned by new_state, shared by every game.
+        players : np.ndarray
+            (B, P) the players of every game, returned unchanged.
+        actions : np.ndarray
+            (B, P) integer joint actions.
+
+        Returns
+        -------
+        new_state : Union[np.ndarray, ProceduralPayoffs]
+            The unchanged game matrix.
+        new_players : np.ndarray
+            The unchanged players.
+        rewards : np.ndarray
+            (B, P) the reward of every player.
+        terminal : np.ndarray
+            (B,) all True, every game ends after one step.
+        winners : np.ndarray
+            (B, P) bool mask of the winner of every game, the player with the highest reward.
+        """
+        rewards = self.rewards_batch(state, actions)
+        winners = np.zeros(rewards.shape, np.bool_)
+        winners[np.arange(len(rewards)), np.argmax(rewards, axis=1)] = True
+        return state, players, rewards, np.ones(len(rewards), np.bool_), winners
+
+    @property
+    def action_space_size(self) -> int:
+        return self.num_strategies
+
+    def action_to_index(self, action: Union[str, int]) -> int:
+        return int(action)
+
+    def index_to_action(self, index: int) -> str:
+        return str(index)
+
+    def legal_action_mask(self, state: object, player: int) -> np.ndarray:
+        return np.ones(self.num_strategies, np.bool_)
+
     def valid_actions(self, state: object, player: int) -> [str]:
         return [str(i) for i in range(self.num_strategies)]
 
-    def is_valid_action(self, state: object, player: int, action: str) -> bool:
-        return int(action) < self.num_strategies
+    def is_valid_action(self, state: object, player: int, action: Union[str, int]) -> bool:
+        try:
+            return 0 <= int(action) < self.num_strategies
+        except ValueError:
+            return False
+
+    def state_to_observation(self, state: Union[np.ndarray, ProceduralPayoffs], player: int) -> Dict[str, np.ndarray]:
+        if self.observation == "seed":
+            return {"payoff_seed": np.array([state.seed], np.uint64)}
+
+        if self.observation == "player":
+            if isinstance(state, ProceduralPayoffs):
+                return {"game_matrix": state.player_payoffs(player)}
+            return {"game_matrix": state[..., player]}
+
+        game_matrix = state.materialize() if isinstance(state, ProceduralPayoffs) else state
+        return {"game_matrix": game_matrix}
+
+    def write_observation(self, state: Union[np.ndarray, ProceduralPayoffs], player: int,
+                          buffers: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        if self.observation == "seed":
+            buffers["payoff_seed"][0] = state.seed
+            return buffers
 
-    def state_to_observation(self, state: np.ndarray, player: int) -> Dict[str, np.ndarray]:
-        return {"game_matrix": state}
+        if self.observation == "player":
+            if isinstance(state, ProceduralPayoffs):
+                buffers["game_matrix"][...] = state.player_payoffs(player)
+            else:
+                buffers["game_matrix"][...] = state[..., player]
+        else:
+            buffers["game_matrix"][...] = state.materialize() if isinstance(state, ProceduralPayoffs) else state
+        return buffers
@@ -1 +1 @@
-from .RandomMatrixEnvironment import RandomMatrixEnvironment
\ No newline at end of file
+from .RandomMatrixEnvironment import RandomMatrixEnvironment, ProceduralPayoffs, procedural_payoffs
@@ -51,17 +51,98 @@ class RPSTwoPlayerEnvironment(BaseEnvironment):
 
     def next_state(self, state: object, players: [int], actions: [str]) -> Tuple[
         object, List[int], List[float], bool, Union[List[int], None]]:
-        action_indices = tuple(self.action_map[action] for action in actions)
+        action_indices = tuple(self.action_to_index(action) for action in actions)
         rewards = state[action_indices]
         winners = np.where(rewards == np.max(rewards))[0]
 
         return state, players, rewards, True, list(winners)
 
+    # Batched methods
+    # -----------------------------------------------
+    # Every game of a batch shares the game matrix as its state, and the players of a batch are (B, P).
+    def new_state_batch(self, batch_size: int, num_players: int = None) -> Tuple[np.ndarray, np.ndarray]:
+        return np.copy(self.game_matrix), np.tile(self.players, (batch_size, 1))
+
+    def reset_state_batch(self, state: np.ndarray, players: np.ndarray, mask: np.ndarray, num_players: int = None) \
+            -> Tuple[np.ndarray, np.ndarray]:
+        # Games only last one step and the state never changes, so a new game is the same as the old one
+        return state, players
+
+    def state_to_observation_batch(self, state: np.ndarray, players: np.ndarray) -> Dict[str, np.ndarray]:
+        """ The game matrix of every game, as a read-only (B,) + game matrix view that does not copy the matrix. """
+        return {'game_matrix': np.broadcast_to(state, (len(players),) + state.shape)}
+
+    def rewards_batch(self, state: np.ndarray, actions: np.ndarray) -> np.ndarray:
+        """ Rewards of many joint actions at once, with a single gather on the game matrix.
+
+        Parameters
+        ----------
+        state : np.ndarray
+            The game matrix returned by new_state.
+        actions : np.ndarray
+            (B, P) integer joint actions, the action_map index of every player's action.
+
+        Returns
+        -------
+        np.ndarray
+            (B, P) the reward of every player for every joint action.
+        """
+        joint_actions = np.ravel_multi_index(np.asarray(actions).T, state.shape[:-1])
+        return np.take(state.reshape(-1, state.shape[-1]), joint_actions, axis=0)
+
+    def next_state_batch(self, state: np.ndarray, players: np.ndarray, actions: np.ndarray) \
+            -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """ Play B independent games at once, same rules as next_state.
+
+        Parameters
+        ----------
+        state : np.ndarray
+            The game matrix returned by new_state, shared by every game.
+        players : np.ndarray
+            (B, P) the players of every game, returned unchanged.
+        actions : np.ndarray
+            (B, P) integer joint actions, the action_map index of every player's action.
+
+        Returns
+        -------
+        new_state : np.ndarray
+            The unchanged game matrix.
+        new_players : np.ndarray
+            The unchanged players.
+        rewards : np.ndarray
+            (B, P) the reward of every player.
+        terminal : np.ndarray
+            (B,) all True, every game ends after one step.
+        winners : np.ndarray
+            (B, P) bool mask of the players with the highest reward in every game.
+        """
+        rewards = self.rewards_batch(state, actions)
+        winners = rewards == np.max(rewards, axis=1, keepdims=True)
+        return state, players, rewards, np.ones(len(rewards), np.bool_), winners
+
+    @property
+    def action_space_size(self) -> int:
+        return len(self.action_map)
+
+    def action_to_index(self, action: Union[str, int]) -> int:
+        if isinstance(action, (int, np.integer)):
+            return int(action)
+        return self.action_map[action]
+
+    def index_to_action(self, index: int) -> str:
+        return ["R", "P", "S"][index]
+
     def valid_actions(self, state: object, player: int) -> [str]:
         return ["R", "P", "S"]
 
-    def is_valid_action(self, state: object, player: int, action: str) -> bool:
+    def is_valid_action(self, state: object, player: int, action: Union[str, int]) -> bool:
+        if isinstance(action, (int, np.integer)):
+            return 0 <= action < len(self.action_map)
         return action in ["R", "P", "S"]
 
     def state_to_observation(self, state: object, player: int) -> Dict[str, np.ndarray]:
-        return {'game_matrix': np.copy(state)}
\ No newline at end of file
+        return {'game_matrix': np.copy(state)}
+
+    def write_observation(self, state: object, player: int, buffers: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        buffers['game_matrix'][...] = state
+        return buffers
\ No newline at end of file
@@ -0,0 +1,143 @@
+""" Batched Tic Tac Toe engine for self-play.
+
+Plays B independent games of one Tic Tac Toe variant at once. Every step takes one flat cell index per game, and the
+whole batch is advanced with numpy array operations, without a Python loop over the games. Finished games are reset
+in place, so the batch can be stepped forever.
+
+The game rules are the same as TicTacToe2PlayerEnv, TicTacToe3PlayerEnv and TicTacToe4PlayerEnv: players move in
+turn, an invalid action skips the player's turn, three in a row wins and a full board is a draw. Their batch methods,
+which colosseumrl.VectorEnvironment uses, step a BatchedTicTacToe as their batched state.
+"""
+
+from typing import NamedTuple, Tuple
+
+import numpy as np
+
+from . import tictactoe_2p_env, tictactoe_3p_env, tictactoe_4p_env
+
+VARIANTS = {
+    2: tictactoe_2p_env,
+    3: tictactoe_3p_env,
+    4: tictactoe_4p_env
+}
+
+
+class BatchStep(NamedTuple):
+    """ Result of one step of every game in a batch. """
+    rewards: np.ndarray    # (B, P) float32: 1 for the winner and -1 for the others when a game is won, else 0
+    terminal: np.ndarray   # (B,) bool: whether the game ended with this step, and was reset
+    winners: np.ndarray    # (B,) int8: the player that won with this step, -1 if none
+    players: np.ndarray    # (B,) int8: the player to move next in every game
+    legal_mask: np.ndarray  # (B, cells) bool: empty cells of every game after the step
+
+
+class BatchedTicTacToe:
+    """ B games of a Tic Tac Toe variant, stepped together. """
+
+    def __init__(self, num_players: int = 2, batch_size: int = 1024, auto_reset: bool = True):
+        """ Create a batch of new games.
+
+        Parameters
+        ----------
+        num_players : int
+            The Tic Tac Toe variant, 2, 3 or 4 players.
+        batch_size : int
+            Number of games B.
+        auto_reset : bool
+            Reset every game as soon as it ends. Otherwise finished games ignore their actions until reset is called.
+        """
+        lines = VARIANTS[num_players].WINNING_LINES
+
+        self.num_players = num_players
+        self.batch_size = batch_size
+        self.auto_reset = auto_reset
+        self.board_shape = lines.board_shape
+        self.num_cells = len(lines.cell_lines)
+
+        # (cells, max lines per cell, line length) cells of every line through a cell, padded by repeating a line
+        max_lines = max(len(line_ids) for line_ids in lines.cell_lines)
+        padded = [np.resize(line_ids, max_lines) for line_ids in lines.cell_lines]
+        self.cell_line_cells = lines.lines[np.stack(padded)]
+
+        self.boards = np.full((batch_size, self.num_cells), -1, np.int8)
+        self.players = np.zeros(batch_size, np.int8)
+        self.num_empty = np.full(batch_size, self.num_cells, np.int16)
+        self.finished = np.zeros(batch_size, np.bool_)
+
+        self._games = np.arange(batch_size)
+
+    @property
+    def observation_shape(self) -> Tuple[int, ...]:
+        return (self.batch_size,) + self.board_shape
+
+    def reset(self, mask: np.ndarray = None):
+        """ Start new games, either in every slot or only where mask is True. """
+        mask = slice(None) if mask is None else mask
+        self.boards[mask] = -1
+        self.players[mask] = 0
+        self.num_empty[mask] = self.num_cells
+        self.finished[mask] = False
+
+    def legal_mask(self) -> np.ndarray:
+        """ (B, cells) bool mask of the cells that can be played in every game. """
+        return (self.boards < 0) & ~self.finished[:, None]
+
+    def observation(self, players: np.ndarray = None) -> np.ndarray:
+        """ Boards of every game from the point of view of an observing player, who is always player 0.
+
+        Parameters
+        ----------
+        players : np.ndarray
+            (B,) the observing player of every game. Defaults to the player to move.
+
+        Returns
+        -------
+        np.ndarray
+            (B,) + board_shape int8 boards with player ids relative to the observing player and -1 for empty cells.
+        """
+        players = self.players if players is None else np.asarray(players)
+        relative = (self.boards - players[:, None]) % self.num_players
+        boards = np.where(self.boards < 0, self.boards, relative).astype(np.int8)
+        return boards.reshape(self.observation_shape)
+
+    def step(self, actions: np.ndarray) -> BatchStep:
+        """ Play one move in every game.
+
+        Parameters
+        ----------
+        actions : np.ndarray
+            (B,) flat cell index played by the player to move in every game. Actions that are out of range or
+            on an occupied cell skip the player's turn.
+
+        Returns
+        -------
+        BatchStep
+            Rewards, terminal flags and winners of this step, then the players to move and legal masks of the next one.
+        """
+        games = self._games
+        actions = np.asarray(actions, np.int64)
+        players = self.players
+
+        in_range = (actions >= 0) & (actions < self.num_cells)
+        cells = np.where(in_range, actions, 0)
+        placed = in_range & (self.boards[games, cells] < 0) & ~self.finished
+
+        self.boards[games[placed], cells[placed]] = players[placed]
+        self.num_empty -= placed
+
+        # Only the lines through the placed cell can have been completed
+        line_owners = self.boards[games[:, None, None], self.cell_line_cells[cells]]
+        won = placed & (line_owners == players[:, None, None]).all(axis=2).any(axis=1)
+        terminal = won | (placed & (self.num_empty == 0))
+
+        winners = np.where(won, players, -1).astype(np.int8)
+        rewards = np.zeros((self.batch_size, self.num_players), np.float32)
+        rewards[won] = -1
+        rewards[games[won], players[won]] = 1
+
+        self.players = np.where(self.finished, players, (players + 1) % self.num_players).astype(np.int8)
+        self.finished |= terminal
+        if self.auto_reset:
+            self.reset(terminal)
+
+        return BatchStep(rewards, terminal, winners, self.players.copy(), self.legal_mask())
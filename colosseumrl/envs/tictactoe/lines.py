@@ -0,0 +1,154 @@
+""" Shared board bookkeeping for the Tic Tac Toe environments.
+
+Every placement of every winning shape on the board is a line. The lines are enumerated once per board geometry,
+and the state keeps a counter of how many cells each player owns on every line. Placing a piece only updates
+and checks the lines through that cell, instead of correlating the whole board with every winning shape.
+
+Empty cells are tracked with a counter and an integer bitmask, bit i set when flat cell i is empty, so checking an
+action or detecting a full board never scans the board or formats action strings.
+"""
+
+from typing import Dict, List, Sequence, Tuple, Union
+
+import numpy as np
+
+
+class LineTable:
+    """ All winning lines of one board geometry, indexed by the cells they pass through. """
+
+    def __init__(self, board_shape: Tuple[int, ...], winning_shapes: Sequence[np.ndarray]):
+        """ Enumerate the winning lines of a board.
+
+        Parameters
+        ----------
+        board_shape : Tuple[int, ...]
+            Shape of the board.
+        winning_shapes : Sequence[np.ndarray]
+            Patterns that win when all of their non-zero cells belong to one player. A line is created for every
+            position where the pattern fits entirely on the board, the same positions as a 'valid' correlation.
+        """
+        self.board_shape = tuple(board_shape)
+
+        lines = []
+        seen = set()
+        for shape in winning_shapes:
+            shape = np.asarray(shape)
+            pattern_cells = np.argwhere(shape != 0)
+            positions = np.array(self.board_shape) - np.array(shape.shape) + 1
+            for position in np.ndindex(*positions):
+                cells = np.ravel_multi_index(tuple((pattern_cells + position).T), self.board_shape)
+                key = tuple(sorted(cells.tolist()))
+                if key not in seen:
+                    seen.add(key)
+                    lines.append(key)
+
+        #: (num_lines, line_length) flat index of every cell in every line
+        self.lines = np.array(lines, dtype=np.int64)
+        self.line_length = self.lines.shape[1]
+
+        num_cells = int(np.prod(self.board_shape))
+        cell_lines: List[List[int]] = [[] for _ in range(num_cells)]
+        for line, cells in enumerate(lines):
+            for cell in cells:
+                cell_lines[cell].append(line)
+
+        #: For every flat cell index, the indices of the lines passing through it
+        self.cell_lines = [np.array(line_list, dtype=np.int64) for line_list in cell_lines]
+
+    @property
+    def num_lines(self) -> int:
+        return len(self.lines)
+
+    def new_counts(self, num_players: int) -> np.ndarray:
+        """ Line counters for an empty board.
+
+        Returns
+        -------
+        np.ndarray
+            (num_lines, num_players) number of cells each player owns on each line.
+        """
+        return np.zeros((self.num_lines, num_players), np.int8)
+
+    def place(self, line_counts: np.ndarray, cell: int, player: int) -> bool:
+        """ Record a piece placed by a player, in place, and check if it completes a line.
+
+        Parameters
+        ----------
+        line_counts : np.ndarray
+            Counters created by new_counts. These are updated in place.
+        cell : int
+            Flat index of the cell where the piece was placed.
+        player : int
+            The player that placed the piece.
+
+        Returns
+        -------
+        bool
+            Whether the player now owns every cell of one of the lines through this cell.
+        """
+        lines = self.cell_lines[cell]
+        line_counts[lines, player] += 1
+        return bool((line_counts[lines, player] == self.line_length).any())
+
+
+class ActionTable:
+    """ Conversion between action strings and flat cell indices for one board geometry. """
+
+    def __init__(self, board_shape: Tuple[int, ...]):
+        self.board_shape = tuple(board_shape)
+        self.num_cells = int(np.prod(self.board_shape))
+
+        #: Bitmask with every cell empty
+        self.full_mask = (1 << self.num_cells) - 1
+        self._mask_bytes = (self.num_cells + 7) // 8
+
+        #: For every flat cell index, the board index and its action string
+        self.cells: List[Tuple[int, ...]] = [tuple(int(i) for i in np.unravel_index(cell, self.board_shape))
+                                             for cell in range(self.num_cells)]
+        self.strings: List[str] = [str(index) for index in self.cells]
+        self._string_to_cell: Dict[str, int] = {string: cell for cell, string in enumerate(self.strings)}
+
+    def to_cell(self, action: Union[str, int]) -> Union[int, None]:
+        """ Flat cell index of an action string or integer action, or None if the action is not a cell of this board.
+
+        Strings formatted by action_to_string are found with a single lookup, other spacings are parsed.
+        """
+        if isinstance(action, (int, np.integer)):
+            return int(action) if 0 <= action < self.num_cells else None
+
+        cell = self._string_to_cell.get(action)
+        if cell is not None or len(action) == 0:
+            return cell
+
+        try:
+            index = tuple(map(int, action.replace('(', '').replace(')', '').split(',')))
+        except ValueError:
+            return None
+
+        if len(index) != len(self.board_shape) or not all(0 <= i < n for i, n in zip(index, self.board_shape)):
+            return None
+        return int(np.ravel_multi_index(index, self.board_shape))
+
+    def legal_mask(self, empty_cells: int) -> np.ndarray:
+        """ (num_cells,) bool mask of the empty cells in a bitmask. """
+        bits = np.frombuffer(empty_cells.to_bytes(self._mask_bytes, "little"), np.uint8)
+        return np.unpackbits(bits, count=self.num_cells, bitorder="little").astype(np.bool_)
+
+    def valid_actions(self, empty_cells: int) -> List[str]:
+        """ Action strings of every empty cell in a bitmask, or [""] if the board is full. """
+        valid_actions = [string for cell, string in enumerate(self.strings) if (empty_cells >> cell) & 1]
+        if len(valid_actions) == 0:
+            valid_actions.append("")
+        return valid_actions
+
+
+def write_relative_board(board: np.ndarray, player: int, num_players: int, out: np.ndarray) -> np.ndarray:
+    """ Write a board with the player ids relative to an observing player, who becomes player 0, into out.
+
+    Empty cells stay -1. The board is converted with a single table lookup, without temporary boards.
+    """
+    table = (np.arange(num_players + 1) - player) % num_players
+
+    # Empty cells index the table with -1, which wraps around to the last entry
+    table[-1] = -1
+    return np.take(table.astype(out.dtype), board, out=out, mode="wrap")
@@ -0,0 +1,367 @@
+""" Perfect-play tables for the Tic Tac Toe environments.
+
+The solver walks every reachable position of a variant once, with a transposition table, and stores the best move of
+every non-terminal position in a compact numpy table. Positions are keyed by a base (num_players + 1) hash of the board,
+where every cell contributes (player + 1) * base ** cell and empty cells contribute nothing.
+
+With more than two players, every player maximizes their own reward (max-n): 1 for a win, -1 for a loss and 0 for a
+draw. Ties between moves are broken towards the lowest cell index, so the table is deterministic.
+
+Tables are saved as .npy files and memory-mapped when loaded. Small variants are stored densely, one row per possible
+hash, so a lookup is a single array index. Larger variants only store the reachable positions, with their sorted
+hashes in a separate file, and are looked up with a binary search. The 2 player table takes 60 kB and solves almost
+instantly. The 3 player table has about 46 million positions, takes 370 MB and solves in about a minute. The 3 by 3
+by 3 board of the 4 player variant has far too many positions to be tabulated.
+"""
+
+import os
+from math import factorial
+from typing import List, Tuple, Union
+
+import numpy as np
+from numba import jit
+
+from . import tictactoe_2p_env, tictactoe_3p_env, tictactoe_4p_env
+
+VARIANTS = {
+    2: tictactoe_2p_env,
+    3: tictactoe_3p_env,
+    4: tictactoe_4p_env
+}
+
+# Variants with at most this many possible hashes are stored densely.
+DENSE_TABLE_LIMIT = 2 ** 22
+
+# Variants with more positions than this are not solved.
+MAX_POSITIONS = 2 ** 27
+
+DEFAULT_DIRECTORY = os.path.join(os.path.expanduser("~"), ".colosseumrl", "tictactoe")
+
+
+def key_dtype(num_players: int) -> type:
+    """ Smallest unsigned integer type that holds every board hash of a variant. """
+    num_cells = len(VARIANTS[num_players].ACTIONS.cells)
+    return np.uint32 if (num_players + 1) ** num_cells <= 2 ** 32 else np.uint64
+
+
+def count_positions(num_players: int) -> int:
+    """ Upper bound on the number of positions of a variant: every way to place the stones of the first t turns. """
+    num_cells = len(VARIANTS[num_players].ACTIONS.cells)
+
+    total = 0
+    for num_stones in range(num_cells + 1):
+        positions = factorial(num_cells) // factorial(num_cells - num_stones)
+        for player in range(num_players):
+            positions //= factorial(num_stones // num_players + (player < num_stones % num_players))
+        total += positions
+    return total
+
+
+@jit(nopython=True, cache=True)
+def _slot(keys, key, empty, shift):
+    """ Slot of a key in an open addressing hash table, or the empty slot where it would be inserted.
+    The table size is a power of two, 2 ** (64 - shift), and keys are spread with Fibonacci hashing. """
+    mask = len(keys) - 1
+    slot = (np.uint64(key) * np.uint64(0x9E3779B97F4A7C15)) >> np.uint64(shift)
+    while keys[slot] != key and keys[slot] != empty:
+        slot = (slot + np.uint64(1)) & np.uint64(mask)
+    return slot
+
+
+@jit(nopython=True, cache=True)
+def _decode(code, player):
+    """ Reward of one player out of a vector of rewards packed as base 3 digits. """
+    return (code // 3 ** player) % 3 - 1
+
+
+@jit(nopython=True, cache=True)
+def _solve_kernel(num_players, cell_lines, line_length, keys, moves, codes, empty):
+    """ Depth first search over every reachable position, iterative so that it can run in nopython mode.
+
+    Every visited non-terminal position is stored in the keys / moves / codes hash table,
+    with its best move and the reward vector of perfect play packed as base 3 digits.
+
+    Returns the number of stored positions, or -1 if the table is full.
+    """
+    num_cells, max_lines = cell_lines.shape
+    num_lines = cell_lines.max() + 1
+    capacity_limit = len(keys) - len(keys) // 8
+    shift = 64
+    while (1 << (64 - shift)) < len(keys):
+        shift -= 1
+
+    powers = np.ones(num_cells, np.uint64)
+    for cell in range(1, num_cells):
+        powers[cell] = powers[cell - 1] * np.uint64(num_players + 1)
+
+    win_codes = np.zeros(num_players, np.int64)
+    draw_code = 0
+    for player in range(num_players):
+        draw_code += 3 ** player
+    for player in range(num_players):
+        win_codes[player] = 3 ** player * 2
+
+    board = np.zeros(num_cells, np.int8)
+    line_counts = np.zeros((num_players, num_lines), np.int8)
+
+    # One frame per number of stones on the board
+    frame_hash = np.zeros(num_cells + 1, np.uint64)
+    frame_cell = np.zeros(num_cells + 1, np.int64)
+    frame_move = np.full(num_cells + 1, -1, np.int64)
+    frame_code = np.full(num_cells + 1, -1, np.int64)
+
+    num_stored = 0
+    depth = 0
+    while True:
+        player = depth % num_players
+        cell = frame_cell[depth]
+
+        if cell == num_cells:
+            # Every move has been tried: store this position and return to the parent
+            slot = _slot(keys, frame_hash[depth], empty, shift)
+            keys[slot] = frame_hash[depth]
+            moves[slot] = frame_move[depth]
+            codes[slot] = frame_code[depth]
+            num_stored += 1
+            if num_stored > capacity_limit:
+                return -1
+            if depth == 0:
+                return num_stored
+
+            code = frame_code[depth]
+            depth -= 1
+            player = depth % num_players
+            cell = frame_cell[depth]
+            board[cell] = 0
+            for i in range(max_lines):
+                if cell_lines[cell, i] >= 0:
+                    line_counts[player, cell_lines[cell, i]] -= 1
+
+        elif board[cell] != 0:
+            frame_cell[depth] += 1
+            continue
+
+        else:
+            board[cell] = player + 1
+            won = False
+            for i in range(max_lines):
+                line = cell_lines[cell, i]
+                if line >= 0:
+                    line_counts[player, line] += 1
+                    won = won or line_counts[player, line] == line_length
+
+            code = -1
+            if won:
+                code = win_codes[player]
+            elif depth + 1 == num_cells:
+                code = draw_code
+            else:
+                child_hash = frame_hash[depth] + np.uint64(player + 1) * powers[cell]
+                slot = _slot(keys, child_hash, empty, shift)
+                if keys[slot] == child_hash:
+                    code = codes[slot]
+                else:
+                    depth += 1
+                    frame_hash[depth] = child_hash
+                    frame_cell[depth] = 0
+                    frame_move[depth] = -1
+                    frame_code[depth] = -1
+                    continue
+
+            board[cell] = 0
+            for i in range(max_lines):
+                if cell_lines[cell, i] >= 0:
+                    line_counts[player, cell_lines[cell, i]] -= 1
+
+        # Keep the child if it is strictly better for the player to move
+        best = frame_code[depth]
+        if best < 0 or _decode(code, player) > _decode(best, player):
+            frame_move[depth] = cell
+            frame_code[depth] = code
+        frame_cell[depth] += 1
+
+
+def solve(num_players: int) -> Tuple[np.ndarray, np.ndarray]:
+    """ Enumerate every reachable position of a variant and compute its perfect-play move.
+
+    Parameters
+    ----------
+    num_players : int
+        The Tic Tac Toe variant to solve, 2 or 3 players.
+        The 3 by 3 by 3 board of the 4 player variant has far too many positions to be solved this way.
+
+    Returns
+    -------
+    keys : np.ndarray
+        Sorted board hash of every reachable non-terminal position.
+    rows : np.ndarray
+        (positions, 1 + num_players) int8 best cell to play followed by the reward of every player, for every key.
+    """
+    max_positions = count_positions(num_players)
+    if max_positions > MAX_POSITIONS:
+        raise ValueError("The {} player variant has up to {} positions, which is too many to solve".format(
+            num_players, max_positions))
+
+    lines = VARIANTS[num_players].WINNING_LINES
+    max_lines = max(len(line_ids) for line_ids in lines.cell_lines)
+    cell_lines = np.full((len(lines.cell_lines), max_lines), -1, np.int64)
+    for cell, line_ids in enumerate(lines.cell_lines):
+        cell_lines[cell, :len(line_ids)] = line_ids
+
+    # Transposition table with room for every position at a load factor below one half
+    capacity = 1 << int(2 * max_positions).bit_length()
+    dtype = key_dtype(num_players)
+    empty = np.iinfo(dtype).max
+    keys = np.full(capacity, empty, dtype)
+    moves = np.zeros(capacity, np.int8)
+    codes = np.zeros(capacity, np.int8)
+
+    num_stored = _solve_kernel(num_players, cell_lines, lines.line_length, keys, moves, codes, dtype(empty))
+    if num_stored < 0:
+        raise RuntimeError("The transposition table of the {} player variant is full".format(num_players))
+
+    stored = np.flatnonzero(keys != empty)
+    stored = stored[np.argsort(keys[stored])]
+
+    rows = np.zeros((len(stored), 1 + num_players), np.int8)
+    rows[:, 0] = moves[stored]
+    for player in range(num_players):
+        rows[:, 1 + player] = codes[stored] // 3 ** player % 3 - 1
+    return keys[stored], rows
+
+
+class PerfectPlayTable:
+    """ Perfect-play lookups for one Tic Tac Toe variant.
+
+    An instance is also an agent: calling it with an environment state and a player returns the best action string.
+    """
+
+    def __init__(self, num_players: int, rows: np.ndarray, keys: np.ndarray = None):
+        """ Wrap a solved table.
+
+        Parameters
+        ----------
+        num_players : int
+            The Tic Tac Toe variant.
+        rows : np.ndarray
+            (positions, 1 + num_players) int8 best move and rewards, as returned by solve.
+        keys : np.ndarray
+            Sorted board hash of every row. None for a dense table, where the hash is the row index.
+        """
+        self.num_players = num_players
+        self.base = num_players + 1
+        self.actions = VARIANTS[num_players].ACTIONS
+        self.powers = self.base ** np.arange(self.actions.num_cells, dtype=np.uint64)
+
+        self.rows = rows
+        self.keys = keys
+
+    @property
+    def dense(self) -> bool:
+        return self.keys is None
+
+    @classmethod
+    def solve(cls, num_players: int) -> "PerfectPlayTable":
+        """ Solve a variant in memory. Small variants are expanded into a dense table. """
+        keys, rows = solve(num_players)
+        num_hashes = (num_players + 1) ** VARIANTS[num_players].ACTIONS.num_cells
+
+        if num_hashes > DENSE_TABLE_LIMIT:
+            return cls(num_players, rows, keys)
+
+        dense_rows = np.zeros((num_hashes, 1 + num_players), np.int8)
+        dense_rows[:, 0] = -1
+        dense_rows[keys.astype(np.int64)] = rows
+        return cls(num_players, dense_rows)
+
+    @staticmethod
+    def default_path(num_players: int, directory: str = None) -> str:
+        directory = DEFAULT_DIRECTORY if directory is None else directory
+        return os.path.join(directory, "tictactoe_{}p.npy".format(num_players))
+
+    @staticmethod
+    def _keys_path(path: str) -> str:
+        return path[:-len(".npy")] + "_keys.npy" if path.endswith(".npy") else path + "_keys.npy"
+
+    def save(self, path: str):
+        """ Save the table as a .npy file, and its keys next to it in a _keys.npy file if it is not dense. """
+        dirname = os.path.dirname(path)
+        if dirname and not os.path.exists(dirname):
+            os.makedirs(dirname)
+
+        np.save(path, self.rows)
+        if not self.dense:
+            np.save(self._keys_path(path), self.keys)
+
+    @classmethod
+    def load(cls, num_players: int, path: str = None, mmap: bool = True) -> "PerfectPlayTable":
+        """ Load a table saved with save. The files are memory-mapped unless mmap is False. """
+        path = cls.default_path(num_players) if path is None else path
+        mmap_mode = "r" if mmap else None
+
+        rows = np.load(path, mmap_mode=mmap_mode)
+        if rows.ndim != 2 or rows.shape[1] != 1 + num_players:
+            raise ValueError("{} does not hold a {} player table".format(path, num_players))
+
+        keys_path = cls._keys_path(path)
+        keys = np.load(keys_path, mmap_mode=mmap_mode) if os.path.exists(keys_path) else None
+
+        return cls(num_players, rows, keys)
+
+    @classmethod
+    def get(cls, num_players: int, directory: str = None) -> "PerfectPlayTable":
+        """ Load the table of a variant, solving it and saving it first if there is none in the directory yet. """
+        path = cls.default_path(num_players, directory)
+        if not os.path.exists(path):
+            cls.solve(num_players).save(path)
+
+        return cls.load(num_players, path)
+
+    def board_hash(self, board: np.ndarray) -> int:
+        """ Base (num_players + 1) hash of an environment board, where -1 marks an empty cell. """
+        return int(np.dot((board.ravel() + 1).astype(np.uint64), self.powers))
+
+    def lookup(self, board: np.ndarray) -> Union[np.ndarray, None]:
+        """ Table row of a board, [best move, rewards...], or None if the position is not in the table. """
+        key = self.board_hash(board)
+
+        if self.dense:
+            return self.rows[key] if key < len(self.rows) else None
+
+        # Search with the dtype of the keys, a python int would cast the whole key array first
+        row = int(np.searchsorted(self.keys, self.keys.dtype.type(key)))
+        if row < len(self.keys) and self.keys[row] == key:
+            return self.rows[row]
+        return None
+
+    def best_move(self, board: np.ndarray) -> Union[int, None]:
+        """ Flat index of the best cell to play, None if the position is finished or not reachable.
+
+        The player to move is the one whose turn it is when no turn has been skipped: the number of stones modulo
+        the number of players.
+        """
+        row = self.lookup(board)
+        if row is None or row[0] < 0:
+            return None
+        return int(row[0])
+
+    def values(self, board: np.ndarray) -> Union[List[int], None]:
+        """ Reward of every player under perfect play from this position, None if it is finished or not reachable. """
+        row = self.lookup(board)
+        if row is None or row[0] < 0:
+            return None
+        return row[1:].tolist()
+
+    def __call__(self, state: object, player: int) -> str:
+        """ Best action string for a Tic Tac Toe environment state.
+
+        The table only holds the best move of the side to move, the number of stones modulo the number of players.
+        When player is not that side, for example after a skipped turn, and for positions outside of the table,
+        the agent falls back to the first valid action.
+        """
+        board, winner, line_counts, empty_cells, num_empty = state
+        side_to_move = int(np.count_nonzero(board >= 0)) % self.num_players
+        move = self.best_move(board) if player == side_to_move else None
+        if move is None:
+            return self.actions.valid_actions(empty_cells)[0]
+        return self.actions.strings[move]
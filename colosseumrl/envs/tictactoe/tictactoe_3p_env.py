@@ -1,10 +1,11 @@
 from typing import Tuple, List, Union, Dict
 
-import dill
 import numpy as np
-import scipy.signal
 
 from colosseumrl.BaseEnvironment import BaseEnvironment
+from colosseumrl.serialization import serialize, deserialize
+from colosseumrl.zobrist import ZobristTable
+from .lines import ActionTable, LineTable, write_relative_board
 
 State = object
 
@@ -16,6 +17,15 @@ WINNING_SHAPES = [
     np.rot90(np.identity(3, np.int8), 1)
 ]
 
+# Every placement of the winning patterns on the board, used to detect wins incrementally
+WINNING_LINES = LineTable((3, 5), WINNING_SHAPES)
+
+# Action string and board index of every cell
+ACTIONS = ActionTable((3, 5))
+
+# Zobrist keys of the board, empty cells are -1
+ZOBRIST = ZobristTable((3, 5), 4, offset=1)
+
 PLAYER_NUM_TO_STRING = {
     -1: " ",
     0: "X",
@@ -23,10 +33,6 @@ PLAYER_NUM_TO_STRING = {
     2: "Y"
 }
 
-def _relative_player_id(current_player: int, absolute_player_num: np.ndarray) -> np.ndarray:
-    return np.where(absolute_player_num < 0, absolute_player_num, (absolute_player_num - current_player) % 3)
-
-
 def action_to_string(index: Tuple[int, int]) -> str:
     """Convert an action index into a formatted action string.
 
@@ -79,7 +85,7 @@ def print_board(state: object):
     Y marks player 2.
     """
 
-    board, winner = state
+    board, winner, *_ = state
 
     board = board.tolist()
 
@@ -167,7 +173,13 @@ class TicTacToe3PlayerEnv(BaseEnvironment):
 
         winner = None
 
-        return (board, winner), [0]
+        line_counts = WINNING_LINES.new_counts(num_players)
+
+        # Bitmask and number of the empty cells
+        empty_cells = ACTIONS.full_mask
+        num_empty = ACTIONS.num_cells
+
+        return (board, winner, line_counts, empty_cells, num_empty), [0]
 
     # Serialization Methods
     @staticmethod
@@ -198,7 +210,7 @@ class TicTacToe3PlayerEnv(BaseEnvironment):
             serialized state
 
         """
-        return dill.dumps(state)
+        return serialize(state)
 
     @staticmethod
     def deserialize_state(serialized_state: bytearray) -> State:
@@ -215,7 +227,7 @@ class TicTacToe3PlayerEnv(BaseEnvironment):
             deserialized state
 
         """
-        return dill.loads(serialized_state)
+        return deserialize(serialized_state)
 
     def current_rewards(self, state: object) -> List[float]:
         """Returns current reward for each player (in absolute order, not relative to any specific player
@@ -231,7 +243,7 @@ class TicTacToe3PlayerEnv(BaseEnvironment):
             A vector containing the current rewards for each player
 
         """
-        board, winner = state
+        board, winner, *_ = state
 
         if winner is not None:
             return [1 if p == winner else -1 for p in range(self.max_players)]
@@ -251,7 +263,7 @@ class TicTacToe3PlayerEnv(BaseEnvironment):
             The players who's turn it is and are executing actions.
             For TicTacToe, only one player should ever be passed in this list at a time.
         actions : List[str],
-            The actions to be executed by the players who's turn it is.
+            The actions to be executed by the players who's turn it is, action strings or integer actions.
             For TicTacToe, only one action should ever be passed in this list at a time.
 
         Returns
@@ -281,8 +293,9 @@ class TicTacToe3PlayerEnv(BaseEnvironment):
         and state_to_observation can be used to convert states into observations.
 
         """
-        board, winner = state
+        board, winner, line_counts, empty_cells, num_empty = state
         new_board = board.copy()
+        new_line_counts = line_counts.copy()
 
         action = actions[0]
         player_num = players[0]
@@ -291,14 +304,13 @@ class TicTacToe3PlayerEnv(BaseEnvironment):
         reward = 0
         terminal = False
 
-        if len(action) > 0 and self.is_valid_action(state, player_num, action) and winner is None:
-            index = string_to_action(action)
-            new_board[index] = player_num
-            player_mask = (new_board == player_num)
-            for pattern in WINNING_SHAPES:
-                if 3 in scipy.signal.correlate2d(player_mask, pattern, 'valid'):
-                    winner = player_num
-                    break
+        cell = ACTIONS.to_cell(action)
+        if cell is not None and (empty_cells >> cell) & 1 and winner is None:
+            new_board[ACTIONS.cells[cell]] = player_num
+            empty_cells &= ~(1 << cell)
+            num_empty -= 1
+            if WINNING_LINES.place(new_line_counts, cell, player_num):
+                winner = player_num
 
         if winner is not None:
             if winner == player_num:
@@ -308,12 +320,43 @@ class TicTacToe3PlayerEnv(BaseEnvironment):
             winners = [winner]
             terminal = True
 
-        if self.valid_actions(state=(new_board, winner), player=player_num) == ['']:
-                terminal = True
+        if num_empty == 0:
+            terminal = True
 
         new_player_num = (player_num + 1) % 3
 
-        return (new_board, winner), [new_player_num], [reward], terminal, winners
+        return (new_board, winner, new_line_counts, empty_cells, num_empty), [new_player_num], [reward], terminal, winners
+
+    @property
+    def action_space_size(self) -> int:
+        """ Number of integer actions, the flat index of every cell. """
+        return ACTIONS.num_cells
+
+    def action_to_index(self, action: Union[str, int]) -> int:
+        """ Flat cell index of an action string. Integer actions are returned unchanged.
+
+        Raises
+        ------
+        ValueError
+            If the action is not a cell of the board.
+        """
+        cell = ACTIONS.to_cell(action)
+        if cell is None:
+            raise ValueError("Invalid action: {}".format(action))
+        return cell
+
+    def index_to_action(self, index: int) -> str:
+        """ Action string of a flat cell index. """
+        return ACTIONS.strings[index]
+
+    def state_hash(self, state: object) -> int:
+        """ Zobrist hash of the board. """
+        return ZOBRIST.hash(state[0])
+
+    def legal_action_mask(self, state: object, player: int) -> np.ndarray:
+        """ Same as valid_actions, as a bool mask over the flat cell indices. """
+        board, winners, line_counts, empty_cells, num_empty = state
+        return ACTIONS.legal_mask(empty_cells)
 
     def valid_actions(self, state: object, player: int) -> List[str]:
         """ Valid actions for a specific state and player.
@@ -342,11 +385,8 @@ class TicTacToe3PlayerEnv(BaseEnvironment):
         This method does not keep track of who's turn it is. That is up to the user.
         If the specified player can physically place a piece at a location, it will be returned as a valid action.
         """
-        board, winners = state
-        valid_actions = list(map(lambda x: str(x), zip(*np.where(board == -1))))
-        if len(valid_actions) == 0:
-            valid_actions.append("")
-        return valid_actions
+        board, winners, line_counts, empty_cells, num_empty = state
+        return ACTIONS.valid_actions(empty_cells)
 
     def is_valid_action(self, state: object, player_num: int, action: str) -> bool:
         """ Returns True if an action is valid for a specific player and state.
@@ -372,13 +412,10 @@ class TicTacToe3PlayerEnv(BaseEnvironment):
         this method returns true, regardless of who just executed their turn or who should be going now.
         """
 
-        if len(action) == 0:
-            return False
-
-        board, winners = state
-        index = string_to_action(action)
+        board, winners, line_counts, empty_cells, num_empty = state
+        cell = ACTIONS.to_cell(action)
 
-        return board[index] == -1
+        return cell is not None and (empty_cells >> cell) & 1 == 1
 
     def state_to_observation(self, state: object, player: int) -> Dict[str, np.ndarray]:
         """ Convert the raw game state to a consumable observation for a specific player agent.
@@ -402,7 +439,59 @@ class TicTacToe3PlayerEnv(BaseEnvironment):
         This is done so that an RL agent only has to learn to perform moves that make player 0 win
         and other players lose.
         """
-        board, winners = state
-        board = _relative_player_id(current_player=player, absolute_player_num=board)
+        board, winners, *_ = state
+        return {'board': write_relative_board(board, player, 3, np.empty_like(board))}
+
+    def write_observation(self, state: object, player: int, buffers: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """ Same as state_to_observation, written into the caller owned buffers['board'] array. """
+        board, winners, *_ = state
+        write_relative_board(board, player, 3, buffers['board'])
+        return buffers
+
+    # Batch Methods
+    # The batched state is a BatchedTicTacToe, which every batch method steps in place with its vectorized kernels.
+    def new_state_batch(self, batch_size: int, num_players: int = None) -> Tuple[object, np.ndarray]:
+        """ B fresh games on one BatchedTicTacToe, and the (B,) players to move. """
+        from .batched import BatchedTicTacToe
+
+        state = BatchedTicTacToe(3, batch_size, auto_reset=False)
+        return state, state.players.astype(np.int64)
+
+    def next_state_batch(self, state: object, players: np.ndarray, actions: np.ndarray) \
+            -> Tuple[object, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """ Play one move in every game at once, same rules as next_state.
+
+        Parameters
+        ----------
+        state : object
+            The BatchedTicTacToe returned by new_state_batch.
+        players : np.ndarray
+            (B,) the player to move in every game.
+        actions : np.ndarray
+            (B,) integer actions, the flat cell index played in every game.
 
-        return {'board': board}
+        Returns
+        -------
+        new_state : object
+            The same BatchedTicTacToe, stepped in place.
+        new_players : np.ndarray
+            (B,) the player to move next in every game.
+        rewards : np.ndarray
+            (B, 3) reward of every player. Same as next_state, only the acting player is rewarded, with 1 for a win.
+        terminal : np.ndarray
+            (B,) whether every game has ended.
+        winners : np.ndarray
+            (B,) the player that won every game, -1 for games that did not end with a win.
+        """
+        step = state.step(actions)
+        return state, step.players.astype(np.int64), np.maximum(step.rewards, 0), step.terminal, step.winners
+
+    def reset_state_batch(self, state: object, players: np.ndarray, mask: np.ndarray, num_players: int = None) \
+            -> Tuple[object, np.ndarray]:
+        """ Restart the games of the BatchedTicTacToe where mask is True, in place. """
+        state.reset(mask)
+        return state, state.players.astype(np.int64)
+
+    def state_to_observation_batch(self, state: object, players: np.ndarray) -> Dict[str, np.ndarray]:
+        """ Same as state_to_observation for every game, with the (B,) observing players. """
+        return {'board': state.observation(players)}
@@ -1,11 +1,12 @@
 import numpy as np
-from typing import Dict, Tuple, List
-from dill import dumps, loads
+from typing import Dict, Tuple, List, Union
 from time import time
 from itertools import starmap
 from collections import Counter
 
 from colosseumrl.BaseEnvironment import BaseEnvironment
+from colosseumrl.serialization import serialize, deserialize
+from colosseumrl.zobrist import ZobristTable
 from .CyTronGrid import next_state_inplace, relative_player_inplace
 
 
@@ -66,6 +67,9 @@ class TronGridEnvironment(BaseEnvironment):
         "left": -1,
     }
 
+    # Moves of the integer actions, in the same order as move_array
+    INDEX_TO_ACTION = [0, 1, -1]
+
     @staticmethod
     def create(board_size: int = 19,
                num_players: int = 4,
@@ -117,6 +121,13 @@ class TronGridEnvironment(BaseEnvironment):
         self.move_array = ['forward', 'right', 'left']
         self._moves = np.zeros(num_players, dtype=np.int64)
 
+        # Zobrist keys of the board, and of the head cell, direction and killer of every player
+        self.zobrist = ZobristTable((board_size, board_size), num_players + 1)
+        self._head_keys = ZobristTable.extra_keys((num_players, board_size * board_size), seed=1)
+        self._direction_keys = ZobristTable.extra_keys((num_players, 4), seed=2)
+        self._death_keys = ZobristTable.extra_keys((num_players, num_players + 1), seed=3)
+        self._death_keys[:, 0] = 0
+
     def __repr__(self):
         output = ""
         output += "Tron Finite Grid Environment\n"
@@ -295,7 +306,10 @@ class TronGridEnvironment(BaseEnvironment):
 
         # Convert the move strings to move indices for c++
         for player, action in zip(players, actions):
-            self._moves[player] = self.STRING_TO_ACTION[action]
+            if isinstance(action, (int, np.integer)):
+                self._moves[player] = self.INDEX_TO_ACTION[action]
+            else:
+                self._moves[player] = self.STRING_TO_ACTION[action]
 
         # Make a copy of the state since we operate in-place
         new_board = np.copy(board)
@@ -340,6 +354,45 @@ class TronGridEnvironment(BaseEnvironment):
         """
         return self.move_array
 
+    @property
+    def action_space_size(self) -> int:
+        """ Number of integer actions, the index of every move in move_array. """
+        return len(self.move_array)
+
+    def action_to_index(self, action: Union[str, int]) -> int:
+        """ Convert a move string into its integer action, the index in move_array.
+
+        Parameters
+        ----------
+        action : Union[str, int]
+            The move string or integer action. The empty string is the same as 'forward'.
+
+        Returns
+        -------
+        int
+            The integer action.
+        """
+        if isinstance(action, (int, np.integer)):
+            return int(action)
+        return self.INDEX_TO_ACTION.index(self.STRING_TO_ACTION[action])
+
+    def index_to_action(self, index: int) -> str:
+        """ Convert an integer action into its move string. """
+        return self.move_array[index]
+
+    def legal_action_mask(self, state: object, player: int) -> np.ndarray:
+        """ Every move is always valid in tron. """
+        return np.ones(len(self.move_array), np.bool_)
+
+    def state_hash(self, state: object) -> int:
+        """ Zobrist hash of the board, heads, directions and deaths. """
+        board, heads, directions, deaths = state
+        players = self.player_array
+        player_keys = np.concatenate((self._head_keys[players, heads],
+                                      self._direction_keys[players, directions],
+                                      self._death_keys[players, deaths]))
+        return self.zobrist.hash(board) ^ int(np.bitwise_xor.reduce(player_keys))
+
     def is_valid_action(self, state: object, player: int, action: str) -> bool:
         """ Whether or not an action is valid for a specific state.
 
@@ -356,8 +409,10 @@ class TronGridEnvironment(BaseEnvironment):
         -------
         bool
             Whether or not this is a valid action in the current state.
-            This is always true for tron as every action is valid.
+            This is always true for tron as every move is valid, only integer actions can be out of range.
         """
+        if isinstance(action, (int, np.integer)):
+            return 0 <= action < len(self.move_array)
         return True
 
     def state_to_observation(self, state: object, player: int) -> Dict[str, np.ndarray]:
@@ -419,6 +474,48 @@ class TronGridEnvironment(BaseEnvironment):
                 "deaths": deaths
             }
 
+    def write_observation(self, state: object, player: int, buffers: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """ Same as state_to_observation, written into caller owned arrays.
+
+        Parameters
+        ----------
+        state : object
+            The full server state of the game.
+        player : int
+            Which player is getting the observation.
+        buffers : Dict[str, np.ndarray]
+            An array of shape observation_shape[name] for every observation name.
+
+        Returns
+        -------
+        Dict[str, np.ndarray]
+            The buffers, filled with the observation.
+
+        Notes
+        -----
+        Only fully observable games are written in place. An int64 C-contiguous board buffer is updated in place
+        by the compiled relative player conversion, other boards are converted with a temporary copy.
+        """
+        if not self.fully_observable:
+            return super().write_observation(state, player, buffers)
+
+        board, heads, directions, deaths = state
+        board_output = buffers["board"]
+
+        if board_output.dtype == board.dtype and board_output.flags.c_contiguous:
+            np.copyto(board_output, board)
+            relative_player_inplace(board_output, self.num_players, player + 1)
+        else:
+            observation = board.copy()
+            relative_player_inplace(observation, self.num_players, player + 1)
+            board_output[...] = observation
+
+        rolled_idx = (np.arange(self.num_players) + player) % self.num_players
+        buffers["heads"][...] = heads[rolled_idx]
+        buffers["directions"][...] = directions[rolled_idx]
+        buffers["deaths"][...] = deaths[rolled_idx]
+        return buffers
+
     @staticmethod
     def serializable() -> bool:
         """ Whether or not this class supports serialization of the state.
@@ -444,7 +541,7 @@ class TronGridEnvironment(BaseEnvironment):
         bytearray
             Serialized byte-string for the state.
         """
-        return dumps(state)
+        return serialize(state)
 
     @staticmethod
     def deserialize_state(serialized_state: bytearray) -> object:
@@ -460,7 +557,7 @@ class TronGridEnvironment(BaseEnvironment):
         object
             The current game state.
         """
-        return loads(serialized_state)
+        return deserialize(serialized_state)
 
     # Customer Helpers
     @staticmethod
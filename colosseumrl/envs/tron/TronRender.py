@@ -1,6 +1,5 @@
 import numpy as np
 from typing import Tuple
-from matplotlib import cm
 
 class TronRender:
     BACKGROUND_COLOR = (0.14, 0.14, 0.14)
@@ -22,6 +21,8 @@ class TronRender:
         if winner_player is not None:
             self.other_players = (np.arange(num_players - 1) + winner_player + 1) % num_players
 
+        from matplotlib import cm
+
         self.colors = cm.plasma(np.linspace(0.1, 0.9, num_players))
         self.colors = np.minimum(self.colors * 1.3, 1.0)
 
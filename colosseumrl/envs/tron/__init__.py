@@ -1,4 +1,9 @@
+from colosseumrl.lazy import lazy_attributes
 from .TronGridEnvironment import TronGridEnvironment
-from .TronGridClientEnvironment import TronGridClientEnvironment
-from .TronRllibEnvironment import TronRllibEnvironment
-from .TronRender import TronRender
\ No newline at end of file
+
+# The client, RLlib and rendering classes need spacetime, gym and matplotlib, they are only imported when used
+lazy_attributes(__name__, {
+    "TronGridClientEnvironment": ".TronGridClientEnvironment",
+    "TronRllibEnvironment": ".TronRllibEnvironment",
+    "TronRender": ".TronRender"
+})
@@ -3,6 +3,7 @@ import random
 
 from .TronGridEnvironment import TronGridEnvironment
 from .TronRender import TronRender
+from colosseumrl.trajectories import RecordingEnvironment, TrajectoryWriter
 
 import gym
 from gym.spaces import Dict, Discrete, Box
@@ -27,6 +28,10 @@ class TronRayEnvironment():
             'deaths': Box(0, num_players, shape=(num_players,))
         })
 
+    def record(self, writer: TrajectoryWriter):
+        """ Stream every step of this environment into a trajectory dataset. """
+        self.env = RecordingEnvironment(self.env, writer)
+
     def reset(self):
         self.state, self.players = self.env.new_state()
         return {str(i): self.env.state_to_observation(self.state, i) for i in range(self.env.num_players)}
@@ -1,4 +1,5 @@
 from colosseumrl import BaseEnvironment
+from colosseumrl.trajectories import RecordingEnvironment, TrajectoryWriter
 from gym.spaces import Space
 from ray.rllib import MultiAgentEnv
 
@@ -34,6 +35,10 @@ class RllibWrapper(MultiAgentEnv):
         self.state = None
         self.players = None
 
+    def record(self, writer: TrajectoryWriter):
+        """ Stream every step of this environment into a trajectory dataset. """
+        self.env = RecordingEnvironment(self.env, writer)
+
     def reset(self):
         self.state, self.players = self.env.new_state()
         return {str(i): self.env.state_to_observation(self.state, i) for i in self.players}
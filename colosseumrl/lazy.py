@@ -0,0 +1,56 @@
+""" Lazily imported package attributes.
+
+Packages list the attributes that pull in heavy or optional dependencies, such as spacetime, gym or matplotlib,
+together with the submodule that defines them. The submodule is only imported when the attribute is first accessed,
+so code that only needs an environment engine never pays for them.
+"""
+
+import importlib
+import sys
+from types import ModuleType
+from typing import Dict, List
+
+
+class LazyModule(ModuleType):
+    """ Module type of a package with lazily imported attributes. """
+
+    _lazy_attributes: Dict[str, str]
+
+    def __getattr__(self, name: str):
+        # Only called for attributes that are not set yet
+        lazy_attributes = self.__dict__.get("_lazy_attributes", {})
+        if name not in lazy_attributes:
+            raise AttributeError("module {!r} has no attribute {!r}".format(self.__name__, name))
+
+        value = getattr(importlib.import_module(lazy_attributes[name], self.__name__), name)
+        setattr(self, name, value)
+        return value
+
+    def __setattr__(self, name: str, value: object):
+        # Importing a submodule binds it on its package. Most submodules are named after the class they define,
+        # keep the class under that name, the same as an eager `from .Module import Module` would.
+        lazy_attributes = self.__dict__.get("_lazy_attributes", {})
+        if name in lazy_attributes and isinstance(value, ModuleType) \
+                and value.__name__ == "{}.{}".format(self.__name__, name):
+            value = getattr(value, name)
+        super().__setattr__(name, value)
+
+    def __dir__(self) -> List[str]:
+        return sorted(set(super().__dir__()) | set(self.__dict__.get("_lazy_attributes", {})))
+
+
+def lazy_attributes(module_name: str, attributes: Dict[str, str]):
+    """ Make attributes of a package load on first access.
+
+    Call it from the package __init__ with __name__, before any of the listed submodules is imported.
+
+    Parameters
+    ----------
+    module_name : str
+        Name of the package.
+    attributes : Dict[str, str]
+        The module that defines every attribute, relative to the package, such as {"RLApp": ".RLApp"}.
+    """
+    module = sys.modules[module_name]
+    module.__class__ = LazyModule
+    module.__dict__["_lazy_attributes"] = dict(attributes)
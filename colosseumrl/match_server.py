@@ -14,6 +14,7 @@ from .data_model import ServerState, Player, _Observation, Observation
 from .rl_logging import init_logging, get_logger
 from .FrameRateKeeper import FrameRateKeeper
 from .BaseEnvironment import BaseEnvironment
+from .CachedEnvironment import CachedEnvironment
 from .config import get_environment, ENVIRONMENT_CLASSES, available_environments
 from .util import log_params
 
@@ -48,8 +49,12 @@ def server_app(dataframe: Dataframe,
         for df in observation_dataframes.values():
             df.commit()
 
+    # Create the environment, its observation names may depend on the config
+    env: BaseEnvironment = env_class(args["config"])
+    integer_actions = env.action_space_size is not None
+
     # Add the server state to the master dataframe
-    server_state = ServerState(env_class.__name__, args["config"], env_class.observation_names())
+    server_state = ServerState(env_class.__name__, args["config"], env.observation_names())
     dataframe.add_one(ServerState, server_state)
     dataframe.commit()
 
@@ -60,8 +65,9 @@ def server_app(dataframe: Dataframe,
         dataframe.commit()
         sleep(5)
 
-    # Create the environment and start the server
-    env: BaseEnvironment = env_class(args["config"])
+    # Remember the valid actions of recent positions, for environments where checking moves is expensive
+    if args.get("action_cache", 0) > 0:
+        env = CachedEnvironment(env, args["action_cache"])
 
     logger.info("Waiting for enough players to join ({} required)...".format(env.min_players))
 
@@ -189,12 +195,17 @@ def server_app(dataframe: Dataframe,
         # Queue up each players action if it is legal
         # If the player failed to respond in time, we will simply execute the previous action
         # If it is invalid, we will pass in a blank string
+        # Integer actions are passed to the environment as they are, without going through strings
         for player in current_players:
-            if player.action == '' or env.is_valid_action(state=state, player=player.number, action=player.action):
-                current_actions.append(player.action)
+            action = player.action
+            if player.action_index >= 0:
+                action = player.action_index if integer_actions else ''
+
+            if action == '' or env.is_valid_action(state=state, player=player.number, action=action):
+                current_actions.append(action)
             else:
                 logger.info("Player #{}, {}'s, action of {} was invalid, passing empty string as action"
-                            .format(player.number, player.name, player.action))
+                            .format(player.number, player.name, action))
                 current_actions.append('')
 
         # Execute the current move
@@ -255,6 +266,8 @@ def server_app(dataframe: Dataframe,
             dataframe.checkout()
 
     logger.info("Game has ended. Player {} is the winner.".format([key for key, value in ranking_dict.items() if value == 0]))
+    if isinstance(env, CachedEnvironment):
+        logger.info("Action cache: {}".format(env.cache_info()))
     return ranking_dict
 
 
@@ -281,6 +294,9 @@ if __name__ == '__main__':
     parser.add_argument("--loop", '-l', action='store_true',
                         help="If this flag is set, the script will continually launch game servers. If not, the "
                              "program will exit after the game has ended.")
+    parser.add_argument("--action-cache", '-a', type=int, default=0,
+                        help="Number of positions for which the results of move validation are cached. "
+                             "0 disables the cache.")
 
     args = parser.parse_args()
     log_params(args)
@@ -292,7 +308,7 @@ if __name__ == '__main__':
             available_environments()
         ))
 
-    observation_type: Type[_Observation] = Observation(env_class.observation_names())
+    observation_type: Type[_Observation] = Observation(env_class(args.config).observation_names())
 
     while True:
         app = Node(server_app,
@@ -127,7 +127,7 @@ class MatchProcessJanitor(Thread):
 
     def run(self) -> None:
         port = self.match_server_args['port']
-        observation_type = Observation(self.env_class.observation_names())
+        observation_type = Observation(self.env_class(self.match_server_args["config"]).observation_names())
 
         # App blocks until the server has ended
         app = Node(server_app, server_port=port, Types=[Player, ServerState])
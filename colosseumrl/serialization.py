@@ -0,0 +1,118 @@
+""" Fast serialization of game states, built on pickle protocol 5 out-of-band buffers.
+
+Pickling a numpy array normally copies its data into the pickle stream, and unpickling copies it out again.
+With protocol 5 the array data is handed out as separate buffers instead: serialize writes the small pickle stream
+and the raw array buffers one after the other into a single frame, and deserialize rebuilds the arrays as views of
+that frame, without copying their data. A read-only frame is copied once first, so the arrays are always writable.
+
+Frame layout, little endian, every section starts at a multiple of 8 bytes:
+    magic (4s) | number of buffers (I) | stream length (Q) | buffer lengths (Q each) | pickle stream | buffers...
+
+Objects without array data are written as a plain pickle stream. Objects the standard pickler cannot handle, such
+as lambdas, fall back to dill. Data serialized with dill.dumps by older versions is still read by deserialize.
+dill is only imported when the standard pickler fails.
+"""
+
+import pickle
+import struct
+from typing import List, Union
+
+MAGIC = b"CRL5"
+ALIGNMENT = 8
+
+_HEADER = struct.Struct("<4sIQ")
+_LENGTH = struct.Struct("<Q")
+
+Buffer = Union[bytes, bytearray, memoryview]
+
+
+def _padding(length: int) -> bytes:
+    return bytes(-length % ALIGNMENT)
+
+
+def serialize(obj: object) -> bytes:
+    """ Serialize an object, writing its numpy arrays as raw buffers.
+
+    Parameters
+    ----------
+    obj : object
+        The object to serialize, usually a game state.
+
+    Returns
+    -------
+    bytes
+        The serialized object, read it back with deserialize.
+    """
+    buffers: List[pickle.PickleBuffer] = []
+    try:
+        stream = pickle.dumps(obj, protocol=5, buffer_callback=buffers.append)
+    except (pickle.PicklingError, AttributeError, TypeError):
+        import dill
+        buffers.clear()
+        stream = dill.dumps(obj, protocol=5, buffer_callback=buffers.append)
+
+    if len(buffers) == 0:
+        return stream
+
+    raw_buffers = [buffer.raw() for buffer in buffers]
+
+    parts = [_HEADER.pack(MAGIC, len(raw_buffers), len(stream))]
+    parts.extend(_LENGTH.pack(raw.nbytes) for raw in raw_buffers)
+    parts.append(stream)
+    parts.append(_padding(len(stream)))
+    for raw in raw_buffers:
+        parts.append(raw)
+        parts.append(_padding(raw.nbytes))
+
+    # The array data is copied once, straight into the output
+    return b"".join(parts)
+
+
+def deserialize(data: Buffer) -> object:
+    """ Read back an object written by serialize, or by dill.dumps.
+
+    Numpy arrays are views of data if data is writable, for example a bytearray. Read-only data, such as the bytes
+    clients receive from the server, is copied once into a bytearray first, so the arrays are always writable and
+    states can be modified in place with make_move.
+
+    Parameters
+    ----------
+    data : Union[bytes, bytearray, memoryview]
+        The serialized object.
+
+    Returns
+    -------
+    object
+        The deserialized object.
+    """
+    view = memoryview(data)
+    if view[:len(MAGIC)] != MAGIC:
+        return _loads(view)
+
+    if view.readonly:
+        view = memoryview(bytearray(view))
+
+    _, num_buffers, stream_length = _HEADER.unpack_from(view)
+    offset = _HEADER.size
+
+    lengths = struct.unpack_from("<{}Q".format(num_buffers), view, offset)
+    offset += _LENGTH.size * num_buffers
+
+    stream = view[offset:offset + stream_length]
+    offset += stream_length + len(_padding(stream_length))
+
+    buffers = []
+    for length in lengths:
+        buffers.append(view[offset:offset + length])
+        offset += length + len(_padding(length))
+
+    return _loads(stream, buffers)
+
+
+def _loads(stream: Buffer, buffers: List[Buffer] = None) -> object:
+    try:
+        return pickle.loads(stream, buffers=buffers)
+    except (pickle.UnpicklingError, ImportError, AttributeError):
+        # Streams written by dill can reference names that only dill knows how to load
+        import dill
+        return dill.loads(stream, buffers=buffers)
@@ -0,0 +1,297 @@
+""" Compact on-disk trajectory datasets for offline RL and imitation learning.
+
+A dataset is a directory of fixed dtype numpy columns, split into chunks of chunk_size steps:
+
+    meta.json                       observation shapes and dtypes, action dtype and the length of every chunk
+    chunk_00000/<observation>.npy   one file per observation name, (steps, *observation_shape)
+    chunk_00000/actions.npy         (steps,) integer actions, -1 for the empty action, or fixed width action strings
+    chunk_00000/rewards.npy         (steps,) float32
+    chunk_00000/dones.npy           (steps,) bool, True for the steps that ended a game
+    chunk_00000/players.npy         (steps,) int8, the player that acted
+    chunk_00001/...
+
+Every step is one action of one player. TrajectoryWriter fills one chunk in memory and writes it out when it is full.
+TrajectoryDataset memory-maps the chunks, so sampling a minibatch only reads the rows it needs.
+
+Any environment loop can stream into a dataset through RecordingEnvironment, which records every next_state call:
+wrap the environment of any loop, such as colosseumrl.Arena.play_game, or call record on an RllibWrapper.
+"""
+
+import json
+import os
+from typing import Dict, List, NamedTuple, Sequence, Union
+
+import numpy as np
+
+from .BaseEnvironment import BaseEnvironment
+
+META_FILE = "meta.json"
+COLUMNS = ("actions", "rewards", "dones", "players")
+COLUMN_DTYPES = {"rewards": np.float32, "dones": np.bool_, "players": np.int8}
+
+# Width of string actions, for environments without integer actions
+DEFAULT_ACTION_LENGTH = 64
+
+
+def _chunk_directory(path: str, chunk: int) -> str:
+    return os.path.join(path, "chunk_{:05d}".format(chunk))
+
+
+class TrajectoryBatch(NamedTuple):
+    """ A set of steps, every array has the number of steps as its leading dimension. """
+    observations: Dict[str, np.ndarray]
+    actions: np.ndarray
+    rewards: np.ndarray
+    dones: np.ndarray
+    players: np.ndarray
+
+
+class TrajectoryWriter:
+    """ Appends steps to a dataset directory, one chunk at a time. """
+
+    def __init__(self, path: str, observation_shape: Dict[str, tuple], observation_dtypes: Dict[str, np.dtype],
+                 action_dtype: np.dtype = np.int64, chunk_size: int = 65536):
+        """ Create a new dataset, or continue an existing one with the same layout.
+
+        Parameters
+        ----------
+        path : str
+            Directory of the dataset.
+        observation_shape : Dict[str, tuple]
+            Shape of every observation, as in BaseEnvironment.observation_shape.
+        observation_dtypes : Dict[str, np.dtype]
+            Dtype of every observation.
+        action_dtype : np.dtype
+            An integer dtype for integer actions, or a string dtype such as "<U64" for action strings.
+        chunk_size : int
+            Number of steps per chunk.
+        """
+        self.path = path
+        self.observation_shape = {name: tuple(shape) for name, shape in observation_shape.items()}
+        self.observation_dtypes = {name: np.dtype(observation_dtypes[name]) for name in self.observation_shape}
+        self.action_dtype = np.dtype(action_dtype)
+        self.chunk_size = chunk_size
+
+        self.chunks: List[int] = []
+        if os.path.exists(os.path.join(path, META_FILE)):
+            self._continue(TrajectoryDataset.read_meta(path))
+        os.makedirs(path, exist_ok=True)
+
+        self._columns = {name: np.empty((chunk_size,) + shape, self.observation_dtypes[name])
+                         for name, shape in self.observation_shape.items()}
+        self._columns["actions"] = np.empty(chunk_size, self.action_dtype)
+        for name, dtype in COLUMN_DTYPES.items():
+            self._columns[name] = np.empty(chunk_size, dtype)
+        self._size = 0
+
+    @classmethod
+    def for_environment(cls, path: str, environment: BaseEnvironment, chunk_size: int = 65536) -> "TrajectoryWriter":
+        """ Create a dataset with the observation layout and action type of an environment.
+
+        Observation dtypes are taken from the observations of a new game.
+        """
+        state, players = environment.new_state()
+        observation = environment.state_to_observation(state, players[0] if len(players) > 0 else 0)
+        observation_dtypes = {name: np.asarray(observation[name]).dtype for name in environment.observation_names()}
+
+        action_dtype = np.int64 if environment.action_space_size is not None else "<U{}".format(DEFAULT_ACTION_LENGTH)
+        return cls(path, environment.observation_shape, observation_dtypes, action_dtype, chunk_size)
+
+    def _continue(self, meta: dict):
+        if meta["observation_shape"] != {name: list(shape) for name, shape in self.observation_shape.items()}:
+            raise ValueError("Dataset {} has different observation shapes".format(self.path))
+        self.chunks = list(meta["chunks"])
+
+    def __len__(self) -> int:
+        return sum(self.chunks) + self._size
+
+    def __enter__(self) -> "TrajectoryWriter":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def observation_buffers(self) -> Dict[str, np.ndarray]:
+        """ Views of the next row of every observation column.
+
+        Fill them, for example with BaseEnvironment.write_observation, then call append without an observation.
+        """
+        row = self._size
+        return {name: self._columns[name][row:row + 1].reshape(shape) for name, shape in self.observation_shape.items()}
+
+    def append(self, action: Union[str, int], reward: float, done: bool, player: int,
+               observation: Dict[str, np.ndarray] = None):
+        """ Add one step.
+
+        Parameters
+        ----------
+        action : Union[str, int]
+            The action taken. For integer datasets, the empty action is stored as -1.
+        reward : float
+            The reward of the acting player.
+        done : bool
+            Whether this step ended the game.
+        player : int
+            The acting player.
+        observation : Dict[str, np.ndarray]
+            The observation the action was taken from. Leave it out if it was written into observation_buffers.
+        """
+        row = self._size
+        columns = self._columns
+        if observation is not None:
+            for name in self.observation_shape:
+                columns[name][row] = observation[name]
+
+        columns["actions"][row] = -1 if action == "" and self.action_dtype.kind in "iu" else action
+        columns["rewards"][row] = reward
+        columns["dones"][row] = done
+        columns["players"][row] = player
+
+        self._size += 1
+        if self._size == self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """ Write the steps held in memory as a new chunk. """
+        if self._size == 0:
+            return
+
+        directory = _chunk_directory(self.path, len(self.chunks))
+        os.makedirs(directory, exist_ok=True)
+        for name, column in self._columns.items():
+            np.save(os.path.join(directory, name + ".npy"), column[:self._size])
+
+        self.chunks.append(self._size)
+        self._size = 0
+        self._write_meta()
+
+    def _write_meta(self):
+        meta = {"observation_shape": {name: list(shape) for name, shape in self.observation_shape.items()},
+                "observation_dtypes": {name: dtype.str for name, dtype in self.observation_dtypes.items()},
+                "action_dtype": self.action_dtype.str,
+                "chunk_size": self.chunk_size,
+                "chunks": self.chunks}
+
+        # Written to a temporary file first, so readers never see a partial meta file
+        temporary_file = os.path.join(self.path, META_FILE + ".tmp")
+        with open(temporary_file, "w") as file:
+            json.dump(meta, file)
+        os.replace(temporary_file, os.path.join(self.path, META_FILE))
+
+    def close(self):
+        """ Write the remaining steps. """
+        self.flush()
+        self._write_meta()
+
+
+class TrajectoryDataset:
+    """ Read only, memory-mapped view of a dataset written by TrajectoryWriter. """
+
+    def __init__(self, path: str):
+        """ Open a dataset. Only the meta file is read, chunks are memory-mapped when first accessed. """
+        self.path = path
+        meta = self.read_meta(path)
+
+        self.observation_shape = {name: tuple(shape) for name, shape in meta["observation_shape"].items()}
+        self.observation_dtypes = {name: np.dtype(dtype) for name, dtype in meta["observation_dtypes"].items()}
+        self.action_dtype = np.dtype(meta["action_dtype"])
+        self.chunk_offsets = np.concatenate(([0], np.cumsum(meta["chunks"], dtype=np.int64)))
+
+        self._chunks: Dict[int, Dict[str, np.ndarray]] = {}
+
+    @staticmethod
+    def read_meta(path: str) -> dict:
+        with open(os.path.join(path, META_FILE)) as file:
+            return json.load(file)
+
+    def __len__(self) -> int:
+        return int(self.chunk_offsets[-1])
+
+    @property
+    def num_chunks(self) -> int:
+        return len(self.chunk_offsets) - 1
+
+    def chunk(self, chunk: int) -> Dict[str, np.ndarray]:
+        """ Memory maps of every column of a chunk. """
+        if chunk not in self._chunks:
+            directory = _chunk_directory(self.path, chunk)
+            names = list(self.observation_shape) + list(COLUMNS)
+            self._chunks[chunk] = {name: np.load(os.path.join(directory, name + ".npy"), mmap_mode="r")
+                                   for name in names}
+        return self._chunks[chunk]
+
+    def get(self, indices: Union[Sequence[int], np.ndarray]) -> TrajectoryBatch:
+        """ Gather steps by their global index, in the given order.
+
+        Only the requested rows are read from disk, one fancy index per chunk that holds some of them.
+        """
+        indices = np.asarray(indices, np.int64)
+        if np.any(indices < 0) or np.any(indices >= len(self)):
+            raise IndexError("Step indices must be in [0, {})".format(len(self)))
+
+        columns = {name: np.empty((len(indices),) + shape, self.observation_dtypes[name])
+                   for name, shape in self.observation_shape.items()}
+        columns["actions"] = np.empty(len(indices), self.action_dtype)
+        for name, dtype in COLUMN_DTYPES.items():
+            columns[name] = np.empty(len(indices), dtype)
+
+        chunk_ids = np.searchsorted(self.chunk_offsets, indices, side="right") - 1
+        for chunk in np.unique(chunk_ids):
+            mask = chunk_ids == chunk
+            rows = indices[mask] - self.chunk_offsets[chunk]
+            for name, column in self.chunk(int(chunk)).items():
+                columns[name][mask] = column[rows]
+
+        observations = {name: columns.pop(name) for name in self.observation_shape}
+        return TrajectoryBatch(observations=observations, **columns)
+
+    def slice(self, start: int, stop: int) -> TrajectoryBatch:
+        """ Consecutive steps [start, stop). """
+        return self.get(np.arange(start, stop))
+
+    def sample(self, batch_size: int, random_state: np.random.RandomState = None) -> TrajectoryBatch:
+        """ Uniformly random minibatch of steps, with replacement. """
+        random_state = np.random if random_state is None else random_state
+        return self.get(random_state.randint(0, len(self), batch_size))
+
+
+class RecordingEnvironment:
+    """ Wrapper that records every step of next_state into a TrajectoryWriter.
+
+    Every other attribute is forwarded to the wrapped environment, so the wrapper can be used in place of it.
+    The observation of every acting player is taken before the step. When a single player acts, it is written with
+    write_observation straight into the writer.
+    """
+
+    def __init__(self, environment: BaseEnvironment, writer: TrajectoryWriter):
+        self.environment = environment
+        self.writer = writer
+        self._integer_actions = writer.action_dtype.kind in "iu"
+
+    def __getattr__(self, name: str):
+        if name == "environment":
+            raise AttributeError(name)
+        return getattr(self.environment, name)
+
+    def next_state(self, state: object, players: [int], actions: [str]):
+        environment = self.environment
+        writer = self.writer
+
+        # Observations must be taken before the step, but rewards are only known after it
+        if len(players) == 1:
+            environment.write_observation(state, players[0], writer.observation_buffers())
+            observations = [None]
+        else:
+            observations = [environment.state_to_observation(state, player) for player in players]
+
+        new_state, new_players, rewards, terminal, winners = environment.next_state(state, players, actions)
+
+        # Some environments give a reward to every acting player, others to every player
+        per_acting_player = len(rewards) == len(players)
+        for i, (player, action, observation) in enumerate(zip(players, actions, observations)):
+            if self._integer_actions and action != "":
+                action = environment.action_to_index(action)
+            reward = rewards[i] if per_acting_player else rewards[player]
+            writer.append(action, float(reward), bool(terminal), int(player), observation)
+
+        return new_state, new_players, rewards, terminal, winners
@@ -0,0 +1,52 @@
+""" Zobrist hashing for grid game states.
+
+Every (cell, value) pair of a board gets a fixed random 64 bit key, and the hash of a board is the XOR of the keys of
+its cells. Two different boards collide with probability 2^-64, and placing or removing a piece changes the hash by a
+single XOR, so search agents can update it incrementally.
+"""
+
+from typing import Tuple
+
+import numpy as np
+
+
+class ZobristTable:
+    """ Random keys for every cell and value of one board geometry. """
+
+    def __init__(self, board_shape: Tuple[int, ...], num_values: int, offset: int = 0, seed: int = 0):
+        """ Draw the keys of a board.
+
+        Parameters
+        ----------
+        board_shape : Tuple[int, ...]
+            Shape of the board.
+        num_values : int
+            Number of distinct cell values, empty cells included.
+        offset : int
+            Added to a cell value to get its key index, for example 1 for boards where empty cells are -1.
+            The value with key index 0 is the empty cell and does not change the hash.
+        seed : int
+            Seed of the keys. Hashes are only comparable between tables with the same seed.
+        """
+        self.board_shape = tuple(board_shape)
+        self.num_cells = int(np.prod(self.board_shape))
+        self.offset = offset
+
+        self.keys = np.random.RandomState(seed).randint(0, 2 ** 64, (self.num_cells, num_values), dtype=np.uint64)
+        self.keys[:, 0] = 0
+
+        self._cells = np.arange(self.num_cells)
+
+    @staticmethod
+    def extra_keys(shape: Tuple[int, ...], seed: int) -> np.ndarray:
+        """ Additional random keys, for the parts of a state that are not on the board. """
+        return np.random.RandomState(seed).randint(0, 2 ** 64, shape, dtype=np.uint64)
+
+    def hash(self, board: np.ndarray) -> int:
+        """ Zobrist hash of a whole board. """
+        keys = self.keys[self._cells, board.ravel() + self.offset]
+        return int(np.bitwise_xor.reduce(keys))
+
+    def key(self, cell: int, value: int) -> int:
+        """ Key of a single flat cell index and value. XOR it into a hash to place or remove that value. """
+        return int(self.keys[cell, value + self.offset])
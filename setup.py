@@ -50,9 +50,12 @@ setup(
     cmdclass=cmdclass,
     ext_modules=ext_modules,
     install_requires=requirements,
+    python_requires=">=3.8",
     classifiers=[
-        "Programming Language :: Python :: 3.6",
-        "Programming Language :: Python :: 3.7",
+        "Programming Language :: Python :: 3.8",
+        "Programming Language :: Python :: 3.9",
+        "Programming Language :: Python :: 3.10",
+        "Programming Language :: Python :: 3.11",
         "License :: OSI Approved :: MIT License",
         "Operating System :: OS Independent",
     ],